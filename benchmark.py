@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+import get_site
+import play_by_play
+from day_trawler import day_scores, parse_scoreboard
+from fetch_planner import FetchPlanner, PAGES
+from full_ranking import _ppp_est
+from page_cache import PageCache
+
+CORPUS : str = "benchmark_pages.sqlite"
+RESULTS : str = "benchmark_results.json"
+REPEAT : int = 3 # every game is parsed this many times and the fastest run is kept
+# The play_by_play functions timed on their own, in the order scrape_game runs them
+STAGES : List[str] = [
+    "_build_lineups", "_event_sorter", "_event_packer", "_poss_former", "_shot_splitter",
+    "_game_seconds", "_score_split", "_fix_glitch", "_is_garbage", "expand_lineups"
+]
+
+
+'''
+Offline benchmarks for the parsers, run on a corpus of saved stats.ncaa.org pages. The
+corpus is just a PageCache file, so the cache of any scrape run with NCAA_CACHE set works
+as one, or "record" fills one for a range of days. Everything is read out of the corpus up
+front and handed straight to the parsers, and get_site is put in offline mode on the
+corpus so nothing can reach the network by accident. Runs work on a copy of the corpus,
+reading pages marks them used in the cache and the corpus itself shouldn't change.
+
+benchmark_pages.sqlite is the corpus run uses by default. Its pages are made up in the
+site's layout by tests/site_pages.py, two days of men's and women's games with every kind
+of game below in them, so it only shows how the parsers do on pages like these, a
+recorded corpus is still the one to trust for real numbers.
+
+    python benchmark.py record benchmark_pages.sqlite 2024-12-07 2024-12-08 --sports MBB WBB
+    python benchmark.py run benchmark_pages.sqlite --out new.json
+    python benchmark.py compare old.json new.json
+
+Games are tagged by what makes them parse differently: men's or women's (from the
+scoreboards in the corpus), old format play by play, and overtime, and games per second
+is reported for each tag too. A useful corpus has a few of each, old format games are
+the ones from before 2020 or so
+'''
+class Corpus:
+    def __init__(self, path : str):
+        cache : PageCache = PageCache(path, ttl=float("inf"))
+        self.games : Dict[int, Dict[str, str]] = {} # game id -> {page name: html}
+        self.boards : List[Tuple[str, int, date, str]] = [] # sport code, division, day, html
+        self.sports : Dict[int, str] = {}
+        for url in cache.urls():
+            parts = urlsplit(url)
+            path : List[str] = parts.path.strip("/").split("/")
+            if parts.path.endswith("livestream_scoreboards"):
+                query : Dict[str, List[str]] = parse_qs(parts.query)
+                day : date = datetime.strptime(query["game_date"][0], "%m/%d/%Y").date()
+                self.boards.append((query["sport_code"][0], int(query["division"][0]), day, cache.get(url)))
+            elif len(path) == 3 and path[0] == "contests" and path[2] in PAGES:
+                self.games.setdefault(int(path[1]), {})[path[2]] = cache.get(url)
+        cache.close()
+        for sport, division, day, page in self.boards:
+            scores : pd.DataFrame = parse_scoreboard(page, day, division)
+            if len(scores):
+                for game_id in scores["Game_id"].dropna():
+                    self.sports[int(game_id)] = sport
+
+    # men, women or unknown, plus old_format and overtime when they apply
+    def tags(self, game_id : int) -> List[str]:
+        sport : str = self.sports.get(game_id)
+        tags : List[str] = [{"MBB": "men", "WBB": "women"}.get(sport, "unknown")]
+        if "play_by_play" not in self.games[game_id]:
+            return tags
+        periods : List[pd.DataFrame] = _planner(game_id, self.games[game_id]).tables(game_id, "play_by_play")[3:]
+        if len(periods) and len(periods[0]) and "-" in str(periods[0]["Score"].iloc[0]):
+            tags.append("old_format")
+        if len(periods) > (4 if sport == "WBB" else 2):
+            tags.append("overtime")
+        return tags
+
+
+# A planner that already has every page of the game, so parsing never downloads anything
+def _planner(game_id : int, pages : Dict[str, str]) -> FetchPlanner:
+    planner : FetchPlanner = FetchPlanner(keep=1)
+    for name, page in pages.items():
+        planner.add(game_id, name, page)
+    return planner
+
+
+# Fastest of REPEAT runs of work() in seconds, and whether it was turned down with the
+# ValueError the scraper takes as "not available" (that still costs what it took to find
+# out, so it's timed). Anything else is raised, CacheMiss for a page the corpus lacks too
+def _best(work : Callable[[], Any]) -> Tuple[float, bool]:
+    best : float = float("inf")
+    rejected : bool = False
+    for _ in range(REPEAT):
+        start : float = time.perf_counter()
+        try:
+            work()
+        except ValueError:
+            rejected = True
+        best = min(best, time.perf_counter() - start)
+    return best, rejected
+
+
+# times are what _best returned for each game or page
+def _rate(times : List[Tuple[float, bool]], unit : str) -> Dict[str, float]:
+    seconds : float = sum(best for best, _ in times)
+    return {unit: len(times), "rejected": sum(rejected for _, rejected in times), "seconds": round(seconds, 6),
+            f"{unit}_per_second": round(len(times) / seconds, 3) if seconds else None}
+
+
+def _summary(times : List[float]) -> Dict[str, float]:
+    ms : np.ndarray = np.array(times) * 1000
+    return {"calls": len(times), "total_ms": round(float(ms.sum()), 3), "mean_ms": round(float(ms.mean()), 4),
+            "p50_ms": round(float(np.percentile(ms, 50)), 4), "p90_ms": round(float(np.percentile(ms, 90)), 4),
+            "max_ms": round(float(ms.max()), 4)}
+
+
+'''
+Swaps each stage in play_by_play for a wrapper that adds up its time, runs scrape_game
+on the game and puts the stages back. Every repeat is timed on its own and the fastest
+one is kept per stage, so one slow run doesn't skew a stage
+'''
+def _stage_times(game_id : int, pages : Dict[str, str]) -> Dict[str, float]:
+    spent : Dict[str, float] = {}
+    originals : Dict[str, Callable] = {name: getattr(play_by_play, name) for name in STAGES}
+
+    def timed(name : str, function : Callable) -> Callable:
+        @wraps(function)
+        def run(*args, **kwargs):
+            start : float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                spent[name] = spent.get(name, 0) + time.perf_counter() - start
+        return run
+
+    best : Dict[str, float] = {}
+    try:
+        for name, function in originals.items():
+            setattr(play_by_play, name, timed(name, function))
+        for _ in range(REPEAT):
+            spent.clear()
+            planner : FetchPlanner = _planner(game_id, pages)
+            start : float = time.perf_counter()
+            planner.tables(game_id, "play_by_play")
+            spent["read_html"] = time.perf_counter() - start
+            try:
+                play_by_play.scrape_game(game_id, planner=planner)
+            except ValueError:
+                pass # turned down, the stages it got through still count
+            for name, seconds in spent.items():
+                best[name] = min(best.get(name, float("inf")), seconds)
+    finally:
+        for name, function in originals.items():
+            setattr(play_by_play, name, function)
+    return best
+
+
+# A missing or empty corpus is an error, not a run that times nothing
+def run(path : str) -> Dict[str, Any]:
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No corpus at {path}, record one or use {CORPUS}")
+    with tempfile.TemporaryDirectory() as scratch:
+        copy : str = shutil.copy(path, scratch)
+        corpus : Corpus = Corpus(copy)
+        if not any("play_by_play" in pages for pages in corpus.games.values()):
+            raise ValueError(f"Corpus {path} has no play by play pages to time")
+        return _run(path, corpus, copy)
+
+
+# run on the copy of the corpus at copy, path is only reported
+def _run(path : str, corpus : Corpus, copy : str) -> Dict[str, Any]:
+    get_site.enable_cache(copy, ttl=float("inf"), offline=True)
+    try:
+        stages : Dict[str, List[float]] = {}
+        full : Dict[int, Tuple[float, bool]] = {}
+        possessions : Dict[int, Tuple[float, bool]] = {}
+        box_scores : Dict[int, Tuple[float, bool]] = {}
+        tags : Dict[int, List[str]] = {}
+        for game_id, pages in sorted(corpus.games.items()):
+            if "team_stats" in pages:
+                box_scores[game_id] = _best(lambda: _ppp_est(game_id, _planner(game_id, pages)))
+            if "play_by_play" not in pages:
+                continue
+            tags[game_id] = corpus.tags(game_id)
+            full[game_id] = _best(lambda: play_by_play.scrape_game(game_id, planner=_planner(game_id, pages)))
+            possessions[game_id] = _best(lambda: play_by_play.scrape_game(
+                game_id, planner=_planner(game_id, pages), mode="possessions"))
+            if "old_format" in tags[game_id]:
+                continue # these stop right after read_html
+            for name, seconds in _stage_times(game_id, pages).items():
+                stages.setdefault(name, []).append(seconds)
+        board_times : List[Tuple[float, bool]] = [_best(lambda: parse_scoreboard(page, day, division))
+                                     for _, division, day, page in corpus.boards]
+    finally:
+        get_site.disable_cache()
+
+    by_tag : Dict[str, Dict[str, float]] = {}
+    for tag in sorted({tag for found in tags.values() for tag in found}):
+        chosen : List[int] = [game_id for game_id, found in tags.items() if tag in found]
+        by_tag[tag] = _rate([full[game_id] for game_id in chosen], "games")
+    return {
+        "meta": {"when": datetime.now().isoformat(timespec="seconds"), "corpus": path, "repeat": REPEAT,
+                 "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                 "machine": platform.machine()},
+        "corpus": {"games": len(corpus.games), "scoreboards": len(corpus.boards),
+                   "tags": {tag: rate["games"] for tag, rate in by_tag.items()}},
+        "end_to_end": {
+            "scrape_game": _rate(list(full.values()), "games"),
+            "scrape_game_possessions": _rate(list(possessions.values()), "games"),
+            "ppp_est": _rate(list(box_scores.values()), "games"),
+            "parse_scoreboard": _rate(board_times, "pages")
+        },
+        "by_tag": by_tag,
+        "stages": {name: _summary(stages[name]) for name in ["read_html"] + STAGES if name in stages}
+    }
+
+
+'''
+Old against new for every rate and every stage's median, > 1 means new is faster. A rate
+where the two runs turned down a different number of games or pages also gets a
+.rejected entry, how many more the new run turned down. A speedup that comes with
+more rejections is probably a parser that gives up early, not a faster one
+'''
+def compare(old : Dict[str, Any], new : Dict[str, Any]) -> Dict[str, float]:
+    ratios : Dict[str, float] = {}
+    for group in ["end_to_end", "by_tag"]:
+        for name, rate in new.get(group, {}).items():
+            before : Dict[str, float] = old.get(group, {}).get(name, {})
+            key : str = next(key for key in rate if key.endswith("_per_second"))
+            if before.get(key) and rate.get(key):
+                ratios[f"{group}.{name}"] = round(rate[key] / before[key], 3)
+            if rate.get("rejected", 0) != before.get("rejected", 0):
+                ratios[f"{group}.{name}.rejected"] = rate.get("rejected", 0) - before.get("rejected", 0)
+    for name, summary in new.get("stages", {}).items():
+        before = old.get("stages", {}).get(name)
+        if before and summary["p50_ms"]:
+            ratios[f"stages.{name}"] = round(before["p50_ms"] / summary["p50_ms"], 3)
+    return ratios
+
+
+'''
+Fills a corpus from the site: every scoreboard from start to end for each sport and
+division, and every page of the games on them (games_per_board caps how many). Pages
+already in the corpus aren't downloaded again, so an interrupted record can be rerun
+'''
+def record(path : str, start : date, end : date, sports : List[str], divisions : List[int],
+           games_per_board : int = 0) -> None:
+    get_site.enable_cache(path, ttl=float("inf"))
+    try:
+        while start <= end:
+            for sport in sports:
+                for division in divisions:
+                    print(start, sport, division)
+                    scores : pd.DataFrame = day_scores(start, sport, division)
+                    game_ids : List[int] = [] if scores.empty else [int(game_id) for game_id in scores["Game_id"].dropna()]
+                    if games_per_board:
+                        game_ids = game_ids[:games_per_board]
+                    for game_id in game_ids:
+                        planner : FetchPlanner = FetchPlanner(keep=1)
+                        for name in PAGES:
+                            planner.page(game_id, name)
+                        get_site.polite_sleep()
+            start += timedelta(days=1)
+    finally:
+        get_site.disable_cache()
+
+
+def _day(text : str) -> date:
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+if __name__ == '__main__':
+    parser : argparse.ArgumentParser = argparse.ArgumentParser(description="Offline parser benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="time the parsers on a corpus")
+    run_parser.add_argument("corpus", nargs="?", default=CORPUS)
+    run_parser.add_argument("--out", default=RESULTS)
+    record_parser = commands.add_parser("record", help="download pages into a corpus")
+    record_parser.add_argument("corpus")
+    record_parser.add_argument("start", type=_day)
+    record_parser.add_argument("end", type=_day)
+    record_parser.add_argument("--sports", nargs="+", default=["MBB", "WBB"])
+    record_parser.add_argument("--divisions", nargs="+", type=int, default=[1, 2, 3])
+    record_parser.add_argument("--games", type=int, default=0, help="most games kept per scoreboard")
+    compare_parser = commands.add_parser("compare", help="speedups of one results file over another")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.corpus, args.start, args.end, args.sports, args.divisions, args.games)
+    elif args.command == "run":
+        results : Dict[str, Any] = run(args.corpus)
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+        print(json.dumps(results["end_to_end"], indent=2))
+    else:
+        with open(args.old) as old_file, open(args.new) as new_file:
+            print(json.dumps(compare(json.load(old_file), json.load(new_file)), indent=2))
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+# The dictionary each text column's values go in, players share one across all their columns
+KINDS : Dict[str, str] = {
+    "Time": "time", "Event": "event", "Event_2": "event", "Player": "player", "Player_2": "player",
+    "Possession": "team", "Shot_Type": "shot",
+    **{f"{side}_{n}": "player" for side in ["Away", "Home"] for n in range(1, 6)}
+}
+
+# The text columns that are plain strings in a scraped game (missing is NaN), the rest hold pd.NA
+STRINGS : List[str] = ["Time", "Event", "Player"] + [f"{side}_{n}" for side in ["Away", "Home"] for n in range(1, 6)]
+
+# numbers: (compact type, type in a scraped game). object is a column of python values and pd.NA
+NUMBERS : Dict[str, Tuple[str, str]] = {
+    "Period": ("int8", "int64"),
+    "Seconds": ("float32", "object"),
+    "Away_Score": ("Int16", "Int64"),
+    "Home_Score": ("Int16", "Int64"),
+    "Poss_Count": ("int16", "int64"),
+    "Shot_Value": ("Int8", "object"),
+    "Id": ("int32", "int64")
+}
+
+# True/False/pd.NA flags, kept as 1/0/<NA>
+FLAGS : List[str] = ["Made", "is_Transition", "is_Paint", "2nd_Chance"]
+
+SECONDS_PRECISION : int = 2 # what _game_seconds rounds to, float32 gets it back exactly
+
+
+'''
+Every distinct player, event, team, shot type and clock reading seen so far in a season,
+in the order they showed up. Compact games store their text columns as categoricals over
+these lists, so a name is held once for the whole season and each row only keeps a code.
+Values are only ever appended, so codes given out earlier stay good as the lists grow
+'''
+class SeasonDictionary:
+    def __init__(self):
+        self.values : Dict[str, List[str]] = {kind: [] for kind in set(KINDS.values())}
+        self.known : Dict[str, Dict[str, int]] = {kind: {} for kind in self.values}
+        self.dtypes : Dict[str, pd.CategoricalDtype] = {}
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self.values.values())
+
+    # The categorical type of a kind as of now
+    def dtype(self, kind : str) -> pd.CategoricalDtype:
+        if kind not in self.dtypes:
+            self.dtypes[kind] = pd.CategoricalDtype(pd.Index(self.values[kind], dtype=object))
+        return self.dtypes[kind]
+
+    def _learn(self, kind : str, column : pd.Series) -> None:
+        known : Dict[str, int] = self.known[kind]
+        for value in column.dropna().unique():
+            if value not in known:
+                known[value] = len(known)
+                self.values[kind].append(value)
+                self.dtypes.pop(kind, None)
+
+    def encode(self, kind : str, column : pd.Series) -> pd.Series:
+        self._learn(kind, column)
+        return column.astype(object).astype(self.dtype(kind))
+
+
+'''
+A scraped game (either mode, with or without a lineup registry) in the compact schema:
+text columns become categoricals over the season dictionary, flags nullable int8, the
+clock float32 and the small counts int8/int16. Columns it doesn't know are left alone.
+About a fifth of the memory of the scraped frame, and from_compact gives that frame back
+exactly
+'''
+def to_compact(game : pd.DataFrame, dictionary : SeasonDictionary) -> pd.DataFrame:
+    compact : pd.DataFrame = game.copy(deep=False)
+    for column in game.columns:
+        if column in KINDS:
+            compact[column] = dictionary.encode(KINDS[column], game[column])
+        elif column in FLAGS:
+            compact[column] = game[column].astype("boolean").astype("Int8")
+        elif column in NUMBERS:
+            numbers : pd.Series = game[column]
+            if NUMBERS[column][1] == "object":
+                numbers = pd.to_numeric(numbers.astype(object).where(numbers.notna(), np.nan))
+            compact[column] = numbers.astype(NUMBERS[column][0])
+    return compact
+
+
+# Back to the types scrape_game returns
+def from_compact(compact : pd.DataFrame) -> pd.DataFrame:
+    game : pd.DataFrame = compact.copy(deep=False)
+    for column in compact.columns:
+        if column in KINDS:
+            if column in STRINGS:
+                game[column] = compact[column].astype("str")
+            else:
+                values : pd.Series = compact[column].astype(object)
+                game[column] = values.where(values.notna(), pd.NA)
+        elif column in FLAGS:
+            game[column] = compact[column].astype("boolean").astype(object)
+        elif column == "Seconds":
+            seconds : np.ndarray = np.round(compact[column].to_numpy(dtype=np.float64), SECONDS_PRECISION)
+            game[column] = pd.Series(seconds, index=compact.index).astype(object)
+        elif column in NUMBERS:
+            game[column] = compact[column].astype(NUMBERS[column][1])
+    return game
+
+
+# Stacks compact games into one frame. Games compacted before the dictionary last grew have
+# fewer categories, they're all moved to the current ones first so the columns stay categorical
+def concat_compact(games : List[pd.DataFrame], dictionary : SeasonDictionary) -> pd.DataFrame:
+    current : List[pd.DataFrame] = []
+    for game in games:
+        game = game.copy(deep=False)
+        for column in game.columns:
+            if column in KINDS:
+                game[column] = game[column].cat.set_categories(dictionary.dtype(KINDS[column]).categories)
+        current.append(game)
+    return pd.concat(current, ignore_index=True)
@@ -0,0 +1,135 @@
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+import pandas as pd
+from get_site import get_site, site_url
+import metrics
+
+KEEP : int = 16 # games whose pages are held in memory at once
+
+# Every page a game has, by the name the rest of the code asks for it with
+PAGES : Dict[str, str] = {
+    "play_by_play": "/contests/{}/play_by_play",
+    "individual_stats": "/contests/{}/individual_stats",
+    "team_stats": "/contests/{}/team_stats"
+}
+
+# The pages each output is built from. "ppp" only falls back to team_stats when the
+# play by play can't be used, so that one is fetched when it's asked for, not up front.
+# It skips lineups (scrape_game's possessions mode) so it never needs individual_stats
+NEEDS : Dict[str, List[str]] = {
+    "game": ["play_by_play", "individual_stats"],
+    "ppp": ["play_by_play"],
+    "box_score": ["team_stats"]
+}
+
+
+'''
+Keeps track of everything downloaded for the games of one run, so no page is fetched
+twice and no page is run through read_html twice, whoever asks for it. Pages and tables
+are held for the last KEEP games touched, finished outputs (like a game's ppps) until
+forget is called for their games, which is what catches a game listed under two divisions
+of a day. Safe to share between threads, two threads asking for the same page wait on one
+download. The lock for a page, table or output is only dropped once what it guards is
+stored, so whoever comes after finds it there instead of doing the work again
+'''
+class FetchPlanner:
+    def __init__(self, keep : int = KEEP):
+        self.keep = keep
+        self.games : OrderedDict = OrderedDict() # game id -> {page name: html}
+        self.tables_by_page : Dict[Tuple[int, str], List[pd.DataFrame]] = {}
+        self.outputs : Dict[Tuple[int, str], Any] = {}
+        self.used : Dict[Tuple[int, str], List[str]] = {} # pages the game had once the output was built
+        self.fetched = 0
+        self.avoided = 0
+        self.parsed = 0
+        self.lock = threading.Lock()
+        self.busy : Dict[Hashable, threading.Lock] = {}
+
+    # one lock per page/output so only one thread does the work for it
+    def _busy(self, key : Hashable) -> threading.Lock:
+        with self.lock:
+            return self.busy.setdefault(key, threading.Lock())
+
+    def _held(self, game_id : int) -> Dict[str, str]:
+        with self.lock:
+            pages : Dict[str, str] = self.games.setdefault(game_id, {})
+            self.games.move_to_end(game_id)
+            while len(self.games) > self.keep:
+                old, _ = self.games.popitem(last=False)
+                for name in PAGES:
+                    self.tables_by_page.pop((old, name), None)
+            return pages
+
+    def page(self, game_id : int, name : str) -> str:
+        pages : Dict[str, str] = self._held(game_id)
+        key : Tuple[int, str] = (game_id, name)
+        with self._busy(key):
+            with self.lock:
+                if name in pages:
+                    self.avoided += 1
+                    return pages[name]
+            page : str = get_site(site_url(PAGES[name].format(game_id))).getvalue()
+            with self.lock:
+                pages[name] = page
+                self.fetched += 1
+                self.busy.pop(key, None)
+            return page
+
+    # Hands the planner a page that was downloaded somewhere else
+    def add(self, game_id : int, name : str, page : str) -> None:
+        pages : Dict[str, str] = self._held(game_id)
+        with self.lock:
+            pages[name] = page
+
+    # Every page an output needs, for a fetch stage that downloads ahead of parsing
+    def pages(self, game_id : int, output : str) -> Dict[str, str]:
+        return {name: self.page(game_id, name) for name in NEEDS[output]}
+
+    # read_html of a page, parsed once and shared. Callers get copies since
+    # the parsers add columns to the tables they're given
+    def tables(self, game_id : int, name : str) -> List[pd.DataFrame]:
+        key : Tuple[int, str] = (game_id, name)
+        page : str = self.page(game_id, name)
+        with self._busy((key, "tables")):
+            found : List[pd.DataFrame] = self.tables_by_page.get(key)
+            if found is None:
+                with metrics.timer("read_html", page=name):
+                    found = pd.read_html(io.StringIO(page))
+                with self.lock:
+                    self.tables_by_page[key] = found
+                    self.parsed += 1
+                    self.busy.pop((key, "tables"), None)
+        return [table.copy() for table in found]
+
+    '''
+    Builds an output with make(), or hands back the one already built for this game. A
+    repeat counts every page the first build had to go through as avoided. Exceptions
+    aren't kept, the next caller just tries again
+    '''
+    def output(self, game_id : int, output : str, make : Callable[[], Any]) -> Any:
+        key : Tuple[int, str] = (game_id, output)
+        with self._busy(key):
+            if key in self.outputs:
+                with self.lock:
+                    self.avoided += len(self.used[key])
+                return self.outputs[key]
+            result : Any = make()
+            with self.lock:
+                self.outputs[key] = result
+                self.used[key] = list(self.games.get(game_id, {}))
+                self.busy.pop(key, None)
+            return result
+
+    # Drops the outputs of games that can't come up again, like the ones of a finished day
+    def forget(self, game_ids : List[int]) -> None:
+        with self.lock:
+            for game_id in game_ids:
+                for output in NEEDS:
+                    self.outputs.pop((game_id, output), None)
+                    self.used.pop((game_id, output), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"fetched": self.fetched, "avoided": self.avoided, "parsed": self.parsed}
@@ -1,9 +1,20 @@
+import os
+import numpy as np
 import pandas as pd
 from day_trawler import day_scores
-from play_by_play import scrape_game
+from play_by_play import scrape_game, parse_game
 from datetime import timedelta, date, datetime
-from get_site import get_site, SLEEP_DELAY
-import time
+from get_site import set_rate_limit, rate_limited, polite_sleep
+from rank_engine import Schedule, solve, solve_incremental, ROUND_PRECISION
+from game_store import GameStore, season_name, season_of
+from team_days import TeamDays, open_days
+from pipeline import Pipeline
+from fetch_planner import FetchPlanner
+from journal import GameJournal
+from play_store import PlayStore, encode_game
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Tuple, List, Dict
 
 
@@ -14,100 +25,43 @@ if date.today().month < 11:
 else:
     SEASON_START : date = date(date.today().year, 11, 1)
     SEASON_END: date = date(date.today().year + 1, 4, 8)
-ROUND_PRECISION = 4
-
-def _average(games: List[float]) -> float:
-    total: float = 0
-    for game in games:
-        total += game
-    return round(total / len(games), ROUND_PRECISION)
 
 
 # Removes all the duplicate games caused by divisional crossover, and removes any games
-# not within the range provided
-def _filter_games(file : str, start : date, end: date, division : int) -> pd.DataFrame:
-    games: pd.DataFrame = pd.read_csv(file)
-    games.dropna(subset=['Game_id'], inplace=True) # drop games that didn't happen
-    games.dropna(subset=['Home_id'], inplace=True) #drop non NCAA opponents
-    games.dropna(subset=['Away_id'], inplace=True)
-    games.drop_duplicates(subset=['Game_id'], keep=False, inplace=True) #isolates divisions
-    games = games[games['Division'] == division]
-    games['Date'] = pd.to_datetime(games['Date']).dt.date
-    games = games[(games['Date'] >= start) & (games['Date'] <= end)]
-    games.reset_index(drop=True)
-    return games
-
-
-class Team:
-    def __init__(self, name):
-        self.name = name
-        self.opponents = []
-        self.o_ppp = []
-        self.d_ppp = []
-        self.adj_o = []
-        self.adj_d = []
-        self.locs = []
-        self.ids = []
-
-def _rank_them(games: pd.DataFrame) -> pd.DataFrame:
-    league : Dict[int, Team] = {}
-    for index, row in games.iterrows():
-        if pd.isna(row["Home_ppp"]):
-            continue # band aid fix till I figure out whats going on here
-        away : int = row["Away_id"]
-        home : int = row["Home_id"]
-        if away not in league:
-            league[away] = Team(row["Away_Team"])
-        if home not in league:
-            league[home] = Team(row["Home_Team"])
-        league[home].o_ppp.append(row["Home_ppp"])
-        league[home].d_ppp.append(row["Away_ppp"])
-        league[home].adj_o.append(row["Home_ppp"])
-        league[home].adj_d.append(row["Away_ppp"])
-        league[home].opponents.append(row["Away_id"])
-        league[home].ids.append(row["Game_id"])
-        league[away].d_ppp.append(row["Home_ppp"])
-        league[away].o_ppp.append(row["Away_ppp"])
-        league[away].opponents.append(row["Home_id"])
-        league[away].adj_d.append(row["Home_ppp"])
-        league[away].adj_o.append(row["Away_ppp"])
-        league[away].ids.append(row["Game_id"])
-        if row["Home_Team"] == row["Location"]:
-            league[home].locs.append("Home")
-            league[away].locs.append("Away")
-        else:
-            league[home].locs.append("Neutral")
-            league[away].locs.append("Neutral")
-
-    for _ in range(10):
-        for team_id in league:
-            for i in range(len(league[team_id].opponents)):
-                loc_adj : float = 1 # adjust for home field advantage
-                if league[team_id].locs[i] == 'Home':
-                    loc_adj = 1.014
-                elif league[team_id].locs[i] == 'Away':
-                    loc_adj = .986
-                opp_id: int = league[team_id].opponents[i]
-                j: int = league[opp_id].ids.index(league[team_id].ids[i])
-                for _ in range(10):
-                    league[team_id].adj_o[i] = league[team_id].o_ppp[i] / (_average(league[opp_id].adj_d) * loc_adj)
-                    league[team_id].adj_d[i] = league[team_id].d_ppp[i] / (_average(league[opp_id].adj_o) * (2 - loc_adj))
-                    league[opp_id].adj_o[j] = league[opp_id].o_ppp[j] / (_average(league[team_id].adj_d) * (2 - loc_adj))
-                    league[opp_id].adj_d[j] = league[opp_id].d_ppp[j] / (_average(league[team_id].adj_o) * loc_adj)
-    results : pd.DataFrame = pd.DataFrame()
-    for i, team in enumerate(league):
-        results.at[i, "Team"] = league[team].name
-        results.at[i, "ADJO"] = _average(league[team].adj_o)
-        results.at[i, "ADJD"] = _average(league[team].adj_d)
-        results.at[i, "ADJ_EM"] = round(results.at[i, "ADJO"] - results.at[i, "ADJD"], ROUND_PRECISION)
-    results = results.sort_values(by='ADJ_EM', ascending=False)
-    return results.reset_index(drop=True)
-
-
-
-def _ppp_est(game_id: int) -> Tuple[float, float]:
-    url: str = f"https://stats.ncaa.org/contests/{game_id}/team_stats"
-    stats: pd.DataFrame = pd.read_html(get_site(url))[3]
+# not within the range provided. All of it is pushed down to the store so only the
+# partitions for this division and date range are read
+def _filter_games(store : GameStore, start : date, end: date, division : int) -> pd.DataFrame:
+    return store.read(start=start, end=end, division=division, ranked_only=True)
+
+
+# state_file holds the last converged ratings, when given the solve is warm started from them
+def _rank_them(games: pd.DataFrame, state_file : str = "") -> pd.DataFrame:
+    return _rank_schedule(Schedule.from_games(games), state_file)
+
+
+def _rank_schedule(schedule : Schedule, state_file : str = "") -> pd.DataFrame:
+    if state_file:
+        return solve_incremental(schedule, state_file).to_frame()
+    return solve(schedule).to_frame()
+
+
+# Same as _rank_them(_filter_games(...)), but the games come out of the season's TeamDays
+# (see team_days.py) so moving the range only slices arrays instead of reading the store.
+# A range that runs into another season still goes through the store
+def _rank_range(store : GameStore, season : str, start : date, end : date, division : int,
+                state_file : str = "") -> pd.DataFrame:
+    if season_of(start) != season or season_of(end) != season:
+        return _rank_them(_filter_games(store, start, end, division), state_file)
+    days : TeamDays = open_days(store, season, division)
+    return _rank_schedule(days.schedule(start, end), state_file)
+
+
+
+@metrics.timed("ppp_est")
+def _ppp_est(game_id: int, planner : FetchPlanner = None) -> Tuple[float, float]:
+    if planner is None:
+        planner = FetchPlanner(keep=1)
+    stats: pd.DataFrame = planner.tables(game_id, "team_stats")[3]
     home: str = list(stats.columns)[2]
     away: str = list(stats.columns)[1]
     col = list(stats.columns)[0]
@@ -135,61 +89,270 @@ def _ppp_est(game_id: int) -> Tuple[float, float]:
 
 
 
-# we save all the results to a csv here so if scraping is interrupted
-# we can resume where you left off
-def _all_games(start : date, end : date, file : str, w : bool = False) -> None:
+# Works out the ppps for a single game, NaN if the play by play can't be had. Polite
+# scraping sleeps after every request, the concurrent scraper leaves the pacing to
+# the rate limiter in get_site instead. With a play store the whole game is parsed
+# and kept there under day, the ppps come out the same
+def _game_ppp(game_id : int, polite : bool = True, planner : FetchPlanner = None,
+              plays : PlayStore = None, day : date = None) -> Tuple[float, float]:
+    try:
+        game: pd.DataFrame = scrape_game(game_id, planner=planner, mode="possessions" if plays is None else "full")
+    except ValueError:
+        print(game_id, "not available")
+        metrics.count("games", source="unavailable")
+        return np.nan, np.nan
+
+    if game.empty:
+        if polite:
+            polite_sleep()
+        ppps: Tuple[float, float] = _ppp_est(game_id, planner)
+        metrics.count("games", source="box_score")
+    else:
+        if plays is not None:
+            plays.write_game(day, game)
+        ppps = _ppp_from_game(game)
+        metrics.count("games", source="play_by_play")
+    if polite:
+        polite_sleep()
+    return ppps
+
+
+# Points per possession for both teams, only counting up to where garbage time starts
+def _ppp_from_game(game : pd.DataFrame) -> Tuple[float, float]:
+    if game["is_Garbage_Time"].any():
+        cutoff_index = game[game["is_Garbage_Time"] == True].index[0]
+        game = game.loc[:cutoff_index]
+    poss: int = game["Poss_Count"].iloc[-1] // 2
+    return (round((game["Home_Score"].iloc[-1] / poss), ROUND_PRECISION),
+            round((game["Away_Score"].iloc[-1] / poss), ROUND_PRECISION))
+
+
+# The pipeline's parse stage, runs in a worker process on pages the fetch stage already
+# downloaded. None means there was no usable play by play and the box score is needed
+def _parse_ppp(game_id : int, pages : Dict[str, str]) -> Tuple[float, float]:
+    try:
+        game: pd.DataFrame = parse_game(game_id, pages, mode="possessions")
+    except ValueError:
+        print(game_id, "not available")
+        return np.nan, np.nan
+    if game.empty:
+        return None
+    return _ppp_from_game(game)
+
+
+# Same for a run keeping a play store: (ppps, encode_game of the whole game). The game
+# goes back as bytes, the main process writes them without parsing anything
+def _parse_plays(game_id : int, pages : Dict[str, str]) -> Tuple[Tuple[float, float], bytes]:
+    try:
+        game: pd.DataFrame = parse_game(game_id, pages)
+    except ValueError:
+        print(game_id, "not available")
+        return (np.nan, np.nan), None
+    if game.empty:
+        return None, None
+    return _ppp_from_game(game), encode_game(game)
+
+
+
+
+def _add_ppps(day : pd.DataFrame, ppps : Dict[int, Tuple[float, float]]) -> pd.DataFrame:
+    found : List[Tuple[float, float]] = [ppps.get(game_id, (np.nan, np.nan)) for game_id in day["Game_id"]]
+    day["Home_ppp"] = [ppp[0] for ppp in found]
+    day["Away_ppp"] = [ppp[1] for ppp in found]
+    return day
+
+
+# A game's ppps out of the journal if an earlier run already got them, otherwise scraped
+# and journaled before moving on. A game listed twice in one run is only built once
+def _journaled_ppp(game_id : int, planner : FetchPlanner, journal : GameJournal,
+                   polite : bool = True, plays : PlayStore = None, day : date = None) -> Tuple[float, float]:
+    def make() -> Tuple[float, float]:
+        ppps : Tuple[float, float] = journal.ppp(game_id)
+        if ppps is None:
+            ppps = _game_ppp(game_id, polite, planner, plays, day)
+            journal.add_game(game_id, ppps)
+        return ppps
+    return planner.output(game_id, "ppp", make)
+
+
+# The scoreboards of every division for each sport on a day, {sport code: [frames]}
+def _boards(day_date : date, sports : List[str], pool : ThreadPoolExecutor = None) -> Dict[str, List[pd.DataFrame]]:
+    wanted : List[Tuple[str, int]] = [(sport, n) for sport in sports for n in [1, 2, 3]]
+    if pool:
+        found : List[pd.DataFrame] = list(pool.map(lambda board: day_scores(day_date, board[0], division=board[1]), wanted))
+    else:
+        found = []
+        for sport, n in wanted:
+            found.append(day_scores(day_date, sport, division=n))
+            if found[-1].empty:
+                polite_sleep()
+    boards : Dict[str, List[pd.DataFrame]] = {sport: [] for sport in sports}
+    for (sport, _), day in zip(wanted, found):
+        if not day.empty:
+            boards[sport].append(day)
+    return boards
+
+
+# Every game on a sport's boards once, a game listed under two divisions shows up twice
+def _board_games(days : List[pd.DataFrame]) -> List[int]:
+    return list(dict.fromkeys(game_id for day in days for game_id in day["Game_id"] if not pd.isna(game_id)))
+
+
+# One day of every division of every sport, one game at a time with a sleep between every
+# request. A game listed under two divisions is only scraped the first time
+def _scrape_day(day_date : date, planner : FetchPlanner, journals : Dict[str, GameJournal],
+                plays : Dict[str, PlayStore]) -> Dict[str, List[pd.DataFrame]]:
+    boards : Dict[str, List[pd.DataFrame]] = _boards(day_date, list(journals))
+    for sport, days in boards.items():
+        ppps : Dict[int, Tuple[float, float]] = {
+            game_id: _journaled_ppp(game_id, planner, journals[sport], plays=plays.get(sport), day=day_date)
+            for game_id in _board_games(days)}
+        boards[sport] = [_add_ppps(day, ppps) for day in days]
+    return boards
+
+
+# Same day, but the scoreboards and then the games are fetched on a thread pool. Pacing
+# comes from the token bucket in get_site, and a game listed under two divisions is
+# only scraped once
+def _scrape_day_concurrent(day_date : date, pool : ThreadPoolExecutor, planner : FetchPlanner,
+                           journals : Dict[str, GameJournal], plays : Dict[str, PlayStore]) -> Dict[str, List[pd.DataFrame]]:
+    boards : Dict[str, List[pd.DataFrame]] = _boards(day_date, list(journals), pool)
+    games : List[Tuple[str, int]] = [(sport, game_id) for sport, days in boards.items() for game_id in _board_games(days)]
+    ppps : Dict[int, Tuple[float, float]] = dict(zip([game_id for _, game_id in games], pool.map(
+        lambda game: _journaled_ppp(game[1], planner, journals[game[0]], polite=False,
+                                    plays=plays.get(game[0]), day=day_date), games)))
+    return {sport: [_add_ppps(day, ppps) for day in days] for sport, days in boards.items()}
+
+
+# Scrapes with the fetch/parse/write pipeline: workers threads download pages, processes
+# worker processes parse them and days are journaled in order as their games come in.
+# Games the journals already have never enter the pipeline. Sports with a play store get
+# their games parsed in full and written there
+def _pipeline_games(start : date, end : date, workers : int, processes : int, planner : FetchPlanner,
+                    journals : Dict[str, GameJournal], plays : Dict[str, PlayStore], starts : Dict[str, date]) -> None:
+    sport_of : Dict[int, str] = {} # which journal a game goes in
+    day_of : Dict[int, date] = {} # and which day it's stored under in the play store
+
+    def plan(day_date : date) -> Tuple[Dict[str, List[pd.DataFrame]], List[int]]:
+        boards : Dict[str, List[pd.DataFrame]] = _boards(day_date, list(_sports_on(day_date, journals, starts)))
+        game_ids : List[int] = []
+        for sport, days in boards.items():
+            for game_id in _board_games(days):
+                if journals[sport].ppp(game_id) is None and game_id not in sport_of:
+                    sport_of[game_id] = sport
+                    day_of[game_id] = day_date
+                    game_ids.append(game_id)
+        return boards, game_ids
+
+    def write(day_date : date, boards : Dict[str, List[pd.DataFrame]], ppps : Dict[int, Tuple[float, float]]) -> None:
+        for sport, days in boards.items():
+            found : Dict[int, Tuple[float, float]] = {game_id: journals[sport].ppp(game_id) for game_id in _board_games(days)}
+            found.update(ppps)
+            journals[sport].finish_day(day_date, [_add_ppps(day, found) for day in days])
+        metrics.count("days")
+
+    # parsing ran in another process, only the box score fallback is left for here.
+    # The worker processes' metrics stay in those processes, so games are counted here
+    def finish(game_id : int, ppps : Tuple[float, float]) -> Tuple[float, float]:
+        day_date : date = day_of.pop(game_id)
+        if plays:
+            ppps, payload = ppps
+            if payload is not None and sport_of[game_id] in plays:
+                plays[sport_of[game_id]].write_encoded(day_date, game_id, payload)
+        if ppps is None:
+            metrics.count("games", source="box_score")
+            ppps = _ppp_est(game_id, planner)
+        else:
+            metrics.count("games", source="unavailable" if np.isnan(ppps[0]) else "play_by_play")
+        journals[sport_of.pop(game_id)].add_game(game_id, ppps)
+        return ppps
+
+    if not rate_limited():
+        set_rate_limit()
+    if plays:
+        # one kind of parse for every game, so with a play store every sport's games are parsed in full
+        fetch, parse = partial(planner.pages, output="game"), _parse_plays
+    else:
+        fetch, parse = partial(planner.pages, output="ppp"), _parse_ppp
+    Pipeline(plan, fetch, parse, finish, write, fetchers=workers or 4, processes=processes).run(start, end)
+
+
+'''
+Scrapes every division of each sport in stores ({sport code: GameStore}) in one pass. A
+day's six scoreboards (for both sports) are read together and every game on them is
+scraped once, then each day goes to every store that lists it. Every finished game and
+day goes into that store's journal (see journal.py) as soon as it's done, so if scraping
+is interrupted we can resume where you left off without scraping any finished game
+again, and days go on into the stores in the background.
+workers > 0 scrapes concurrently, processes > 0 also moves the parsing to that many
+processes, the stores come out the same either way.
+Every page goes through one FetchPlanner so none is downloaded twice in a run, and games
+a store already has from start on are never scraped again.
+Sports given a PlayStore in plays have every play by play parsed in full and kept there
+(see play_store.py), which also needs each game's individual stats page.
+starts can give a sport a later first day than start, its boards aren't read before that
+'''
+def _season_games(start : date, end : date, stores : Dict[str, GameStore], workers : int = 0,
+                  processes : int = 0, plays : Dict[str, PlayStore] = None, starts : Dict[str, date] = None) -> None:
+    plays = plays or {}
+    starts = starts or {}
+    planner : FetchPlanner = FetchPlanner()
+    journals : Dict[str, GameJournal] = {}
+    pool : ThreadPoolExecutor = None
+    try:
+        for sport, store in stores.items():
+            journals[sport] = GameJournal(store)
+            journals[sport].remember(store.read(start=start))
+        # finished before the crash, in the stores now
+        while all(start in journal.recovered for journal in journals.values()):
+            start += timedelta(days=1)
+        if processes:
+            _pipeline_games(start, end, workers, processes, planner, journals, plays, starts)
+            return
+        if workers:
+            if not rate_limited():
+                set_rate_limit()
+            pool = ThreadPoolExecutor(max_workers=workers)
+        while start < end + timedelta(days=1):
+            print(start)
+            sports : Dict[str, GameJournal] = _sports_on(start, journals, starts)
+            with metrics.timer("scrape_day"):
+                if pool:
+                    boards : Dict[str, List[pd.DataFrame]] = _scrape_day_concurrent(start, pool, planner, sports, plays)
+                else:
+                    boards = _scrape_day(start, planner, sports, plays)
+            for sport, days in boards.items():
+                journals[sport].finish_day(start, days)
+                planner.forget(_board_games(days)) # in the journal now, which catches them from here on
+            metrics.count("days")
+            start += timedelta(days=1)
+            if not pool:
+                polite_sleep()
+    finally:
+        if pool:
+            pool.shutdown()
+        for journal in journals.values():
+            journal.close()
+        _report(planner)
+
+
+# The journals of the sports being scraped on a day
+def _sports_on(day : date, journals : Dict[str, GameJournal], starts : Dict[str, date]) -> Dict[str, GameJournal]:
+    return {sport: journal for sport, journal in journals.items() if day >= starts.get(sport, day)}
+
+
+# One sport's season into one store
+def _all_games(start : date, end : date, store : GameStore, w : bool = False, workers : int = 0,
+               processes : int = 0, plays : PlayStore = None) -> None:
     sport_code : str = "MBB"
     if w:
         sport_code = "WBB"
-    try:
-        all_games: pd.DataFrame = pd.read_csv(file)
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        all_games: pd.DataFrame = pd.DataFrame()
-    index: int = len(all_games)
-
-    while start < end + timedelta(days=1):
-        print(start)
-        for n in [1, 2, 3]:
-            day: pd.DataFrame = day_scores(start, sport_code, division=n)
-            if day.empty:
-                time.sleep(SLEEP_DELAY)
-                continue
-            all_games = pd.concat([all_games, day], ignore_index=True)
-            for i, game_id in enumerate(day["Game_id"]):
-                if pd.isna(game_id):
-                    index += 1
-                    continue
-                if game_id == 5729377:
-                    i = i
-                all_games.at[index, "Home_Team"] = day["Home_Team"][i]
-                all_games.at[index, "Away_Team"] = day["Away_Team"][i]
-                try:
-                    game: pd.DataFrame = scrape_game(game_id)
-                except ValueError:
-                    print(game_id, "not available")
-                    index += 1
-                    continue
-
-                if game.empty:
-                    time.sleep(SLEEP_DELAY)
-                    ppps: Tuple[float, float] = _ppp_est(game_id)
-                    all_games.at[index, "Home_ppp"] = ppps[0]
-                    all_games.at[index, "Away_ppp"] = ppps[1]
-                    all_games.at[index, "Division"] = n
-                    index += 1
-                    time.sleep(SLEEP_DELAY)
-                    continue
-                if game["is_Garbage_Time"].any():
-                    cutoff_index = game[game["is_Garbage_Time"] == True].index[0]
-                    game = game.loc[:cutoff_index]
-                poss: int = game["Poss_Count"].iloc[-1] // 2
-                all_games.at[index, "Home_ppp"] = round((game["Home_Score"].iloc[-1] / poss), ROUND_PRECISION)
-                all_games.at[index, "Away_ppp"] = round((game["Away_Score"].iloc[-1] / poss), ROUND_PRECISION)
-                index += 1
-                time.sleep(SLEEP_DELAY)
-        start += timedelta(days=1)
-        time.sleep(SLEEP_DELAY)
-        all_games.to_csv(file, index=False)
+    _season_games(start, end, {sport_code: store}, workers, processes, {sport_code: plays} if plays else None)
+
+
+def _report(planner : FetchPlanner) -> None:
+    stats : Dict[str, int] = planner.stats()
+    print(f"{stats['fetched']} game pages fetched, {stats['avoided']} fetches avoided")
 
 
 
@@ -203,6 +366,25 @@ Arguments taken:
     Women: A simple bool to rank women's basketball. Will create a new database file for this 
     ranking, if you want to do something crazy like a cross gendered rankings, just merge the files
     
+    incremental: Saves the converged ratings in the working directory
+    (ratings_m_yyyy-yyyy_d1_from_yyyymmdd.npz, one per division and start date) and starts the
+    next ranking from them. When the daily job only adds a night of games this only needs a few
+    iterations instead of a full solve. Results are the same either way, so it's off by default
+    
+    workers: Scrape with this many threads instead of one request at a time. Requests are paced
+    by the rate limit in get_site (set_rate_limit) rather than a sleep after each one
+    
+    processes: Parse the play by plays in this many processes while the workers keep downloading
+    (see pipeline.py). Mostly worth it when pages come out of the page cache
+    
+    metrics_file: Keeps request counts, bytes, sleep time and how long every stage takes
+    (network, parsing, writing days) in this file while scraping, as json or as prometheus text
+    if it ends in .prom (see metrics.py). Setting NCAA_METRICS does the same
+
+    plays: Also keeps every play by play parsed in full (lineups, possessions, shots, garbage time)
+    in plays_m or plays_w, one file per game (see play_store.py), so player and lineup work can
+    load them later without scraping again. Costs one more page per game and a slower parse
+    
     start/end: A string in the format "mm/dd/yyyy" that gives the start/end inclusive of the 
     ranking range. To simplify ease of use, this program will scrape the entire season up to 
     the current date/season end no matter what. This will take forever, so feel free to change 
@@ -210,7 +392,9 @@ Arguments taken:
     and I find it's a lot better to just gather all the data needed to rank any arbitrary date range
      
 '''
-def every_rank(division : int = 1, women : bool = False, start : str = "", end : str = "") -> pd.DataFrame:
+def every_rank(division : int = 1, women : bool = False, start : str = "", end : str = "",
+               incremental : bool = False, workers : int = 0, processes : int = 0,
+               metrics_file : str = "", plays : bool = False) -> pd.DataFrame:
 
     # Sanity check on division
     if not (0 < division < 4):
@@ -241,19 +425,28 @@ def every_rank(division : int = 1, women : bool = False, start : str = "", end :
 
 
 
+    gender : str = "m"
     if women:
-        file = f"games_w_{year}-{year + 1}.csv"
+        gender = "w"
+    season : str = season_name(year)
+    store : GameStore = GameStore(f"games_{gender}")
+    file : str = f"games_{gender}_{season}.csv" # the old progress file, moved into the store if found
+    state_file : str = ""
+    if incremental:
+        # not keyed by the end, that's the part the daily job moves forward
+        state_file = f"ratings_{gender}_{season}_d{division}_from_{start_date:%Y%m%d}.npz"
+
+    if store.last_date(season) is None and os.path.exists(file):
+        print(f"Moving {file} into the game store at {store.root}, it can be exported back with export_csv\n")
+        store.import_csv(file)
+
+    last_day : date = store.last_date(season)
+    if last_day is not None:
+        scraping_start = last_day + timedelta(days=1)
+        print(f"Progress found and resuming where left off. If you wanted to restart the progress"
+              f" please delete {store.root}/Season={season}\n")
     else:
-        file = f"games_m_{year}-{year + 1}.csv"
-
-    try:
-        temp_games = pd.read_csv(file)
-        scraping_start = datetime.strptime(temp_games['Date'].iloc[-1], "%Y-%m-%d").date()
-        scraping_start += timedelta(days=1)
-        print(f"Progress file found and resuming where left off. If you wanted to restart the progress"
-              f" please delete the contents of {file}, or provide a new file\n")
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        print("File empty, creating new dataset using this file...")
+        print(f"No saved games for {season}, creating a new dataset in {store.root}...")
         print("Constructing this dataset will take awhile, up to 8 hours depending on season length, and connection speed")
         print("It is likely to fail at some point, but progress willl be saved. Follow the directions given in case of error\n")
         scraping_start = date(year, 11, 1)
@@ -274,8 +467,7 @@ def every_rank(division : int = 1, women : bool = False, start : str = "", end :
     # up to the order of games, its fine.
     if scraping_start > end_date:
         print("Dataset already completed for this timespan, running algorithm...\n")
-        games: pd.DataFrame = _filter_games(file, start_date, end_date, division)
-        return _rank_them(games)
+        return _rank_range(store, season, start_date, end_date, division, state_file)
 
     if scraping_start < start_date:
         print("The provided start date is currently past the planned date to start gathering date.")
@@ -284,17 +476,61 @@ def every_rank(division : int = 1, women : bool = False, start : str = "", end :
         print("but it will not be used considered when ranking.")
 
 
+    if metrics_file:
+        metrics.enable(metrics_file)
     try:
-        _all_games(scraping_start, end_date, file, women)
+        _all_games(scraping_start, end_date, store, women, workers, processes,
+                   PlayStore(f"plays_{gender}") if plays else None)
     except Exception as e:
         print(e)
-        print(f"Connection error at {datetime.now()}, the progress has been saved within {file}")
+        print(f"Connection error at {datetime.now()}, the progress has been saved within {store.root}")
         print("If you have been given a 'Max tries succeeded' message, give the server at least an hour to recover, or change your wifi.")
         print("Once you restart just use the same arguments, and scraping will begin where you left off\n")
         exit(1)
+    finally:
+        if metrics_file:
+            metrics.disable()
     print("Dataset completed, running algorithm...")
-    games: pd.DataFrame = _filter_games(file, start_date, end_date, division)
-    return _rank_them(games)
+    return _rank_range(store, season, start_date, end_date, division, state_file)
+
+
+'''
+Scrapes a season of men's and women's games in every division in one pass, into the same
+games_m and games_w stores every_rank reads. The six scoreboards of a day are read together
+and every game is scraped once however many of them list it, so the whole dataset costs
+about what one gender used to. Each store resumes from the day after its own last one, and
+games a store already has are never scraped again.
+    season: the year the season starts in (2024 for 2024-2025), defaults to the current one
+    workers, processes, metrics_file, plays: same as every_rank
+'''
+def every_season(season : int = 0, workers : int = 0, processes : int = 0, metrics_file : str = "",
+                 plays : bool = False) -> None:
+    year : int = season or SEASON_START.year
+    stores : Dict[str, GameStore] = {"MBB": GameStore("games_m"), "WBB": GameStore("games_w")}
+    play_stores : Dict[str, PlayStore] = {"MBB": PlayStore("plays_m"), "WBB": PlayStore("plays_w")} if plays else None
+    starts : Dict[str, date] = {}
+    for sport, store in stores.items():
+        last_day : date = store.last_date(season_name(year))
+        starts[sport] = last_day + timedelta(days=1) if last_day else date(year, 11, 1)
+    scraping_start : date = min(starts.values())
+    end_date : date = min(date(year + 1, 4, 8), date.today() - timedelta(days=1))
+    if scraping_start > end_date:
+        print("Dataset already completed for this season")
+        return
+
+    if metrics_file:
+        metrics.enable(metrics_file)
+    try:
+        _season_games(scraping_start, end_date, stores, workers, processes, play_stores, starts)
+    except Exception as e:
+        print(e)
+        print(f"Connection error at {datetime.now()}, the progress has been saved within games_m and games_w")
+        print("Once you restart just use the same arguments, and scraping will begin where you left off\n")
+        exit(1)
+    finally:
+        if metrics_file:
+            metrics.disable()
+    print("Season completed")
 
 
 if __name__ == '__main__':
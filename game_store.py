@@ -0,0 +1,193 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datetime import date
+from typing import Dict, List, Optional
+
+
+# Order the columns have always had in the games csv
+COLUMNS : List[str] = [
+    'Date', 'Time', 'Event', 'Division', 'Status', 'Attendance', 'Location', 'Away_Seed', 'Away_Team',
+    'Away_Score', 'Home_Seed', 'Home_Team', 'Home_Score', 'Away_Wins', 'Away_Losses', 'Home_Wins',
+    'Home_Losses', 'Away_id', 'Home_id', 'Game_id', 'Home_ppp', 'Away_ppp'
+]
+
+# Season, Date and Division live in the directory names, so the files only hold the rest.
+# Crossover marks games that were listed under more than one division that day
+PARTITIONING : ds.Partitioning = ds.partitioning(pa.schema([
+    ("Season", pa.string()),
+    ("Date", pa.date32()),
+    ("Division", pa.int8())
+]), flavor="hive")
+
+FILE_SCHEMA : pa.Schema = pa.schema([
+    ("Time", pa.string()),
+    ("Event", pa.string()),
+    ("Status", pa.string()),
+    ("Attendance", pa.int32()),
+    ("Location", pa.string()),
+    ("Away_Seed", pa.int8()),
+    ("Away_Team", pa.string()),
+    ("Away_Score", pa.int16()),
+    ("Home_Seed", pa.int8()),
+    ("Home_Team", pa.string()),
+    ("Home_Score", pa.int16()),
+    ("Away_Wins", pa.int16()),
+    ("Away_Losses", pa.int16()),
+    ("Home_Wins", pa.int16()),
+    ("Home_Losses", pa.int16()),
+    ("Away_id", pa.int64()),
+    ("Home_id", pa.int64()),
+    ("Game_id", pa.int64()),
+    ("Home_ppp", pa.float64()),
+    ("Away_ppp", pa.float64()),
+    ("Crossover", pa.bool_())
+])
+
+_PANDAS_TYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.bool_(): pd.BooleanDtype()
+}
+
+
+# Casts every column to its type in FILE_SCHEMA, whatever pandas happened to infer for it
+def _to_table(rows : pd.DataFrame) -> pa.Table:
+    arrays : List[pa.Array] = []
+    for field in FILE_SCHEMA:
+        column : pd.Series = rows[field.name]
+        if pa.types.is_integer(field.type):
+            column = pd.to_numeric(column, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            column = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif pa.types.is_boolean(field.type):
+            column = column.astype("boolean")
+        else:
+            column = column.astype(object).where(column.notna(), None)
+        arrays.append(pa.array(column, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=FILE_SCHEMA)
+
+
+def season_name(year : int) -> str:
+    return f"{year}-{year + 1}"
+
+
+# Same rule as every_rank, games before November belong to the season that started the year before
+def season_of(day : date) -> str:
+    if day.month < 11:
+        return season_name(day.year - 1)
+    return season_name(day.year)
+
+
+'''
+Columnar replacement for the games csv. Every (season, date, division) gets its own parquet
+file under root/Season=.../Date=.../Division=.../ so adding a day only writes that day's
+files, and reads only open the partitions that match the filters. The csv can still be
+produced with export_csv
+'''
+class GameStore:
+    def __init__(self, root : str):
+        self.root = root
+
+    def _partition(self, season : str, day : date, division : int) -> str:
+        return os.path.join(self.root, f"Season={season}", f"Date={day.isoformat()}", f"Division={division}")
+
+    # Writes one day of scoreboards (one frame per division), replacing that day if it was already there
+    def write_day(self, day : date, games : List[pd.DataFrame]) -> None:
+        games = [division for division in games if not division.empty]
+        if not games:
+            return
+        all_games : pd.DataFrame = pd.concat(games, ignore_index=True)
+        for column in COLUMNS:
+            if column not in all_games:
+                all_games[column] = pd.NA
+        # same rule the csv used, a rankable game listed twice belongs to neither division
+        ranked : pd.Series = all_games[["Game_id", "Home_id", "Away_id"]].notna().all(axis=1)
+        all_games["Crossover"] = ranked & all_games["Game_id"].where(ranked).duplicated(keep=False)
+        for division, rows in all_games.groupby("Division", sort=True):
+            self._write(self._partition(season_of(day), day, int(division)), rows)
+
+    def _write(self, directory : str, rows : pd.DataFrame) -> None:
+        os.makedirs(directory, exist_ok=True)
+        # write then rename so a crash never leaves half a file behind
+        temp : str = os.path.join(directory, ".part-0.parquet.tmp")
+        pq.write_table(_to_table(rows), temp)
+        os.replace(temp, os.path.join(directory, "part-0.parquet"))
+
+    def _dataset(self) -> Optional[ds.Dataset]:
+        if not os.path.isdir(self.root):
+            return None
+        dataset : ds.Dataset = ds.dataset(self.root, format="parquet", partitioning=PARTITIONING)
+        # a store that so far only has its journal in it
+        return dataset if dataset.files else None
+
+    # Only needs to list directories, no files are opened
+    def last_date(self, season : str) -> Optional[date]:
+        season_dir : str = os.path.join(self.root, f"Season={season}")
+        if not os.path.isdir(season_dir):
+            return None
+        days : List[str] = [name.split("=", 1)[1] for name in os.listdir(season_dir)
+                            if name.startswith("Date=") and
+                            os.listdir(os.path.join(season_dir, name))]
+        if not days:
+            return None
+        return date.fromisoformat(max(days))
+
+    # When each day of a division was last written, {day: mtime in ns}. Also just a listing
+    def day_stamps(self, season : str, division : int) -> Dict[date, int]:
+        season_dir : str = os.path.join(self.root, f"Season={season}")
+        stamps : Dict[date, int] = {}
+        if not os.path.isdir(season_dir):
+            return stamps
+        for name in os.listdir(season_dir):
+            if not name.startswith("Date="):
+                continue
+            file : str = os.path.join(season_dir, name, f"Division={division}", "part-0.parquet")
+            if os.path.exists(file):
+                stamps[date.fromisoformat(name.split("=", 1)[1])] = os.stat(file).st_mtime_ns
+        return stamps
+
+    '''
+    Reads games back with the given filters pushed down, partitions that can't match are
+    never opened. ranked_only keeps just what the ranking can use: games that happened,
+    between two NCAA teams, and that weren't divisional crossovers
+    '''
+    def read(self, season : str = None, start : date = None, end : date = None, division : int = None,
+             ranked_only : bool = False) -> pd.DataFrame:
+        dataset : ds.Dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=COLUMNS)
+        conditions : List[ds.Expression] = []
+        if season is not None:
+            conditions.append(ds.field("Season") == season)
+        if start is not None:
+            conditions.append(ds.field("Date") >= start)
+        if end is not None:
+            conditions.append(ds.field("Date") <= end)
+        if division is not None:
+            conditions.append(ds.field("Division") == division)
+        if ranked_only:
+            conditions.append(ds.field("Game_id").is_valid() & ds.field("Home_id").is_valid() &
+                              ds.field("Away_id").is_valid() & ~ds.field("Crossover"))
+        condition : ds.Expression = None
+        for part in conditions:
+            condition = part if condition is None else condition & part
+        table : pa.Table = dataset.to_table(filter=condition)
+        games : pd.DataFrame = table.to_pandas(types_mapper=_PANDAS_TYPES.get)
+        games = games.sort_values(["Date", "Division"], kind="stable")
+        games["Division"] = games["Division"].astype(int)
+        return games[COLUMNS].reset_index(drop=True)
+
+    # Loads an old style games csv into the store
+    def import_csv(self, file : str) -> None:
+        games : pd.DataFrame = pd.read_csv(file)
+        games['Date'] = pd.to_datetime(games['Date']).dt.date
+        for day, rows in games.groupby("Date", sort=True):
+            self.write_day(day, [rows[rows["Division"] == n] for n in [1, 2, 3]])
+
+    def export_csv(self, file : str, season : str = None) -> None:
+        self.read(season).to_csv(file, index=False)
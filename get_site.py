@@ -1,10 +1,150 @@
 from io import StringIO
 import io
+import os
 import requests
+import threading
 import time
 import sys
+from datetime import date, datetime, timedelta
+from typing import Dict
+from urllib.parse import urlsplit, parse_qs
+from requests.adapters import HTTPAdapter
+from page_cache import PageCache, CacheMiss, MAX_BYTES, TTL
+import metrics
 
 SLEEP_DELAY : int = 3
+# Point this at a local server to test scraping without touching stats.ncaa.org
+BASE_URL : str = os.environ.get("NCAA_BASE_URL", "https://stats.ncaa.org")
+# Rate limited scraping stays at the old pace, one request every SLEEP_DELAY seconds across
+# every worker. Workers only help with the time spent waiting on responses, not the rate
+RATE : float = 1 / SLEEP_DELAY # requests per second across every worker when rate limited
+BURST : int = 1
+PER_HOST : int = 2 # default for the most requests allowed in flight to one host
+POOL_SIZE : int = 16
+
+
+def site_url(path : str) -> str:
+    return BASE_URL + path
+
+
+# Classic token bucket, tokens refill at rate per second up to burst. Every request
+# takes a token, and waits for the next one to refill if the bucket is empty
+class TokenBucket:
+    def __init__(self, rate : float, burst : int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now : float = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait : float = (1 - self.tokens) / self.rate
+            metrics.count("sleep_seconds", wait, reason="rate_limit")
+            time.sleep(wait)
+
+
+# One session for everything so connections get reused instead of
+# a new handshake for every page
+_session : requests.Session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+_session.mount("http://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+_limiter : TokenBucket = None
+_per_host : int = PER_HOST # what set_rate_limit was last given
+_host_slots : Dict[str, threading.BoundedSemaphore] = {}
+_slots_lock : threading.Lock = threading.Lock()
+_cache : PageCache = None
+_offline : bool = False
+_local : threading.local = threading.local() # network requests made by each thread since it last slept
+
+
+'''
+Turns on rate limiting for every get_site call. This is what the concurrent scraper uses
+instead of sleeping after every request, the bucket keeps the average rate polite and
+per_host bounds how many requests are open to the site at once. rate=0 turns it back off
+'''
+def set_rate_limit(rate : float = RATE, burst : int = BURST, per_host : int = PER_HOST) -> None:
+    global _limiter, _per_host
+    with _slots_lock:
+        _limiter = TokenBucket(rate, burst) if rate > 0 else None
+        _per_host = per_host
+        _host_slots.clear()
+
+
+def rate_limited() -> bool:
+    return _limiter is not None
+
+
+def _host_slot(url : str) -> threading.BoundedSemaphore:
+    host : str = urlsplit(url).netloc
+    with _slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_per_host)
+        return _host_slots[host]
+
+
+'''
+Puts a PageCache under get_site so every page is only downloaded once. With offline=True
+the network is never touched, the scrape is replayed from the cache and any page that
+isn't in it raises CacheMiss. Setting NCAA_CACHE (and NCAA_OFFLINE=1) does the same on import
+'''
+def enable_cache(path : str = "page_cache.sqlite", max_bytes : int = MAX_BYTES, ttl : float = TTL,
+                 offline : bool = False) -> PageCache:
+    global _cache, _offline
+    _cache = PageCache(path, max_bytes, ttl)
+    _offline = offline
+    return _cache
+
+
+def disable_cache() -> None:
+    global _cache, _offline
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+    _offline = False
+
+
+# Box scores are only ever requested for finished games, so those pages never change.
+# Scoreboards are final once the day is over, give it a day for late corrections
+def _is_final(url : str) -> bool:
+    parts = urlsplit(url)
+    if parts.path.endswith("livestream_scoreboards"):
+        day = parse_qs(parts.query).get("game_date")
+        if not day:
+            return False
+        return datetime.strptime(day[0], "%m/%d/%Y").date() < date.today() - timedelta(days=1)
+    return parts.path.startswith("/contests/")
+
+
+# Sleeps between requests, but only if this thread actually went to the site since the
+# last sleep. Pages coming out of the cache don't need any politeness
+def polite_sleep() -> None:
+    if getattr(_local, "requests", 0):
+        _local.requests = 0
+        metrics.count("sleep_seconds", SLEEP_DELAY, reason="polite")
+        time.sleep(SLEEP_DELAY)
+
+
+def _request(url : str, headers : Dict[str, str]) -> requests.Response:
+    _local.requests = getattr(_local, "requests", 0) + 1
+    if _limiter is not None:
+        _limiter.acquire()
+        with _host_slot(url), metrics.timer("request"):
+            response : requests.Response = _session.get(url, headers=headers)
+    else:
+        with metrics.timer("request"):
+            response = _session.get(url, headers=headers)
+    metrics.count("requests", status=response.status_code)
+    metrics.count("bytes", len(response.content))
+    return response
+
 
 def get_site(url : str) -> io.StringIO:
     headers_list = [
@@ -25,19 +165,35 @@ def get_site(url : str) -> io.StringIO:
         }
     ]
 
+    if _cache is not None:
+        page = _cache.get(url)
+        if page is not None:
+            metrics.count("cache_hits")
+            return StringIO(page)
+        metrics.count("cache_misses")
+        if _offline:
+            raise CacheMiss(url)
+
     max_retries = 5
     for attempt in range(max_retries):
         # Use a different header for each attempt
         headers = headers_list[attempt % len(headers_list)]
-        response = requests.get(url, headers=headers)
+        response = _request(url, headers)
 
             # Check if the response is successful (status code 200)
         if response.status_code == 200:
+            if _cache is not None:
+                _cache.put(url, response.text, _is_final(url))
             return StringIO(response.text)
         else:
+            metrics.count("retries")
+            metrics.count("sleep_seconds", SLEEP_DELAY, reason="retry")
             time.sleep(SLEEP_DELAY)
     else:
+        metrics.count("failed_pages")
         print("Failed after maximum retries.")
         sys.exit(1)
 
 
+if os.environ.get("NCAA_CACHE"):
+    enable_cache(os.environ["NCAA_CACHE"], offline=os.environ.get("NCAA_OFFLINE") == "1")
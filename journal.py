@@ -0,0 +1,185 @@
+import json
+import os
+import queue
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from game_store import GameStore
+import metrics
+
+FILE : str = "_journal.jsonl" # the store's dataset skips files starting with _
+
+
+# json for the odd types a scoreboard frame holds
+def _plain(value : Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return str(value)
+
+
+def _frame_record(frame : pd.DataFrame) -> Dict[str, Any]:
+    rows : List[List[Any]] = frame.astype(object).where(frame.notna(), None).values.tolist()
+    return {"columns": list(frame.columns), "rows": rows}
+
+
+def _record_frame(record : Dict[str, Any]) -> pd.DataFrame:
+    frame : pd.DataFrame = pd.DataFrame(record["rows"], columns=record["columns"])
+    if "Date" in frame:
+        frame["Date"] = [date.fromisoformat(day) if isinstance(day, str) else day for day in frame["Date"]]
+    return frame
+
+
+'''
+Append only log of a scrape in progress, kept next to the store. Every finished game is
+one line ({"game": id, "ppp": [home, away]}) and every finished day one more with that
+day's scoreboards, and each line is fsynced before the scraper moves on, so a crash loses
+at most the game that was being parsed. Opening the journal replays it: days that were
+finished but never made it into the store are written there right away, and the games are
+kept so the scraper can skip them by Game_id, whatever day it restarts on.
+
+Finished days go to the store on a background thread, in order. After each batch the
+journal is rewritten without the days that are in the store now and without their games,
+so it only ever holds the day being scraped and whatever is waiting to be written
+'''
+class GameJournal:
+    def __init__(self, store : GameStore, path : str = ""):
+        self.store = store
+        self.path = path or os.path.join(store.root, FILE)
+        self.lock = threading.Lock()
+        self.ppps : Dict[int, Tuple[float, float]] = {}
+        self.lines : List[Tuple[str, Any, bytes]] = [] # ("game", id, line) or ("day", day, line), in file order
+        self.recovered : List[date] = []
+        self.pending : queue.Queue = queue.Queue()
+        self.error : BaseException = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        days : List[Tuple[date, List[pd.DataFrame]]] = self._replay()
+        for day, frames in days:
+            self.store.write_day(day, frames)
+            self.recovered.append(day)
+        if days:
+            self._drop(days)
+        self.file = open(self.path, "ab")
+        self.compactor : threading.Thread = threading.Thread(target=self._compact, daemon=True)
+        self.compactor.start()
+
+    # Reads every whole line back, a torn last line from a crash mid write is cut off
+    def _replay(self) -> List[Tuple[date, List[pd.DataFrame]]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as file:
+            data : bytes = file.read()
+        days : List[Tuple[date, List[pd.DataFrame]]] = []
+        good : int = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn line")
+                record : Dict[str, Any] = json.loads(line)
+            except ValueError:
+                break
+            good += len(line)
+            if "game" in record:
+                self.ppps[record["game"]] = tuple(np.nan if ppp is None else ppp for ppp in record["ppp"])
+                self.lines.append(("game", record["game"], line))
+            else:
+                day : date = date.fromisoformat(record["day"])
+                days.append((day, [_record_frame(frame) for frame in record["frames"]]))
+                self.lines.append(("day", day, line))
+        if good < len(data):
+            print(f"Cutting off {len(data) - good} bytes of a half written record at the end of {self.path}")
+            with open(self.path, "r+b") as file:
+                file.truncate(good)
+        return days
+
+    def _append(self, kind : str, key : Any, record : Dict[str, Any]) -> None:
+        if self.error is not None:
+            raise self.error
+        line : bytes = (json.dumps(record, default=_plain) + "\n").encode("utf-8")
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.lines.append((kind, key, line))
+
+    # ppps of a game already in the journal, None if it still has to be scraped
+    def ppp(self, game_id : int) -> Optional[Tuple[float, float]]:
+        return self.ppps.get(game_id)
+
+    # Games the store already has, skipped like journaled ones. They're safe in the store,
+    # so they're only kept in memory and never written to the journal
+    def remember(self, games : pd.DataFrame) -> None:
+        games = games.dropna(subset=["Game_id"])
+        for game_id, home, away in zip(games["Game_id"].astype(int), games["Home_ppp"], games["Away_ppp"]):
+            self.ppps.setdefault(game_id, (float(home) if pd.notna(home) else np.nan,
+                                           float(away) if pd.notna(away) else np.nan))
+
+    def add_game(self, game_id : int, ppps : Tuple[float, float]) -> None:
+        game_id = int(game_id)
+        ppps = tuple(float(ppp) for ppp in ppps)
+        self._append("game", game_id, {"game": game_id, "ppp": [None if np.isnan(ppp) else ppp for ppp in ppps]})
+        self.ppps[game_id] = ppps
+
+    # The day is safe once this returns, it's written to the store in the background
+    def finish_day(self, day : date, frames : List[pd.DataFrame]) -> None:
+        self._append("day", day, {"day": day.isoformat(), "frames": [_frame_record(frame) for frame in frames]})
+        self.pending.put((day, frames))
+
+    def _compact(self) -> None:
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            batch : List[Tuple[date, List[pd.DataFrame]]] = [item]
+            while not self.pending.empty():
+                item = self.pending.get()
+                if item is None:
+                    self.pending.put(None) # finish the batch, then stop
+                    break
+                batch.append(item)
+            try:
+                for day, frames in batch:
+                    with metrics.timer("write_day"):
+                        self.store.write_day(day, frames)
+                self._drop(batch)
+            except BaseException as e:
+                self.error = e
+                return
+
+    # Rewrites the journal without the given days and their games, they're in the store now
+    def _drop(self, days : List[Tuple[date, List[pd.DataFrame]]]) -> None:
+        done : Set[date] = {day for day, _ in days}
+        games : Set[int] = set()
+        for _, frames in days:
+            for frame in frames:
+                if "Game_id" in frame:
+                    games.update(int(game_id) for game_id in frame["Game_id"].dropna())
+        with self.lock:
+            self.lines = [(kind, key, line) for kind, key, line in self.lines
+                          if not (kind == "day" and key in done) and not (kind == "game" and key in games)]
+            temp : str = self.path + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(b"".join(line for _, _, line in self.lines))
+                file.flush()
+                os.fsync(file.fileno())
+            appending = getattr(self, "file", None) # not open yet during recovery
+            if appending is not None:
+                appending.close()
+            os.replace(temp, self.path)
+            if appending is not None:
+                self.file = open(self.path, "ab")
+
+    # Waits for every finished day to be in the store
+    def close(self) -> None:
+        self.pending.put(None)
+        self.compactor.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from itertools import combinations
+from typing import Dict, List, Union
+from lineups import LineupRegistry
+from rank_engine import ROUND_PRECISION
+
+SIDES : List[str] = ["Away", "Home"]
+STATS : List[str] = ["Seconds", "Poss_For", "Poss_Against", "Pts_For", "Pts_Against"]
+
+
+# Which team each game's away and home columns are, for games with the ten name columns.
+# Possession on a scoring row is the team that scored, so it's whoever most often had
+# the ball when that side's score went up
+def _side_teams(games : pd.DataFrame, first : np.ndarray) -> Dict[str, pd.Series]:
+    teams : Dict[str, pd.Series] = {}
+    for side in SIDES:
+        score : np.ndarray = games[f"{side}_Score"].to_numpy(dtype=np.float64, na_value=np.nan)
+        went_up : np.ndarray = np.diff(score, prepend=0) > 0
+        went_up[first] = False
+        scorers : pd.DataFrame = games.loc[went_up, ["Id", "Possession"]].dropna()
+        counts : pd.Series = scorers.value_counts() # most common first
+        top : pd.DataFrame = counts.reset_index().drop_duplicates("Id")
+        teams[side] = top.set_index("Id")["Possession"].astype(object)
+    return teams
+
+
+'''
+Lineup ids for games that have the ten name columns (from scrape_game without a registry,
+or the play store), interned into registry the same way _build_lineups does: players by
+(team, name), a unit by its players in name order. A lineup only goes through the registry
+on the rows where it changes, the rows after it just repeat its id.
+Lineups that aren't full are -1
+'''
+def intern_lineups(games : pd.DataFrame, registry : LineupRegistry) -> pd.DataFrame:
+    first : np.ndarray = _game_starts(games)
+    teams : Dict[str, pd.Series] = _side_teams(games, first)
+    game_id : np.ndarray = games["Id"].to_numpy(dtype=np.int64)
+    ids : Dict[str, np.ndarray] = {}
+    for side in SIDES:
+        columns : List[str] = [f"{side}_{n}" for n in range(1, 6)]
+        codes : np.ndarray = np.column_stack([pd.factorize(games[column])[0] for column in columns])
+        changed : np.ndarray = first.copy()
+        changed[1:] |= (codes[1:] != codes[:-1]).any(axis=1)
+        starts : np.ndarray = np.flatnonzero(changed)
+        names : np.ndarray = games[columns].iloc[starts].astype(object).to_numpy()
+        found : List[int] = []
+        for row, on_court in zip(starts, names.tolist()):
+            if all(isinstance(name, str) for name in on_court):
+                found.append(registry.lineup(teams[side].get(game_id[row], ""), sorted(on_court)))
+            else:
+                found.append(-1)
+        ids[side] = np.array(found, dtype=np.int64)[np.cumsum(changed) - 1]
+    lineups : pd.DataFrame = games.drop(columns=[f"{side}_{n}" for side in SIDES for n in range(1, 6)])
+    lineups["Away_Lineup"] = ids["Away"]
+    lineups["Home_Lineup"] = ids["Home"]
+    return lineups
+
+
+def _game_starts(games : pd.DataFrame) -> np.ndarray:
+    game_id : np.ndarray = games["Id"].to_numpy(dtype=np.int64)
+    first : np.ndarray = np.ones(len(game_id), dtype=bool)
+    first[1:] = game_id[1:] != game_id[:-1]
+    return first
+
+
+'''
+Every row of every game split in two, once for each side's lineup: the seconds until the
+next row, points scored and allowed on the row, and whether a possession for or against
+started on it. Possessions start where Poss_Count goes up and belong to whoever
+Possession says has the ball. Rows are lined up (lineup, game, stats...) so any grouping
+after this is plain sums. Each also has the lineup across from it, whether it's the home
+side and its stint, the run of rows where neither lineup changed (numbered over all games)
+'''
+def _side_rows(games : pd.DataFrame, registry : LineupRegistry, garbage_time : bool) -> pd.DataFrame:
+    n : int = len(games)
+    first : np.ndarray = _game_starts(games)
+    last : np.ndarray = np.append(first[1:], True)
+    game_id : np.ndarray = games["Id"].to_numpy(dtype=np.int64)
+
+    points : Dict[str, np.ndarray] = {}
+    for side in SIDES:
+        score : np.ndarray = games[f"{side}_Score"].to_numpy(dtype=np.float64, na_value=np.nan)
+        score = pd.Series(score).ffill().fillna(0).to_numpy()
+        points[side] = np.diff(score, prepend=0)
+        points[side][first] = score[first]
+    seconds : np.ndarray = games["Seconds"].to_numpy(dtype=np.float64, na_value=np.nan)
+    elapsed : np.ndarray = np.append(np.diff(seconds), 0)
+    elapsed[last] = 0
+    elapsed = np.nan_to_num(elapsed).clip(min=0)
+    count : np.ndarray = games["Poss_Count"].to_numpy(dtype=np.int64)
+    started : np.ndarray = np.diff(count, prepend=0) > 0
+    started[first] = count[first] > 0
+
+    # the team of a lineup is the team of its players, the same names Possession uses
+    lineup : Dict[str, np.ndarray] = {side: games[f"{side}_Lineup"].to_numpy(dtype=np.int64) for side in SIDES}
+    team_names : np.ndarray = np.array(registry.player_teams + [None], dtype=object)
+    players : Dict[str, np.ndarray] = {side: registry.players_of(lineup[side].clip(min=0)) for side in SIDES}
+    team : Dict[str, np.ndarray] = {side: np.where(lineup[side] >= 0, team_names[players[side][:, 0]], None)
+                                    for side in SIDES}
+    possession : np.ndarray = games["Possession"].astype(object).fillna("").to_numpy()
+    has_ball : Dict[str, np.ndarray] = {side: started & (possession == team[side]) for side in SIDES}
+
+    stint : np.ndarray = first.copy()
+    for side in SIDES:
+        stint[1:] |= lineup[side][1:] != lineup[side][:-1]
+    stint = np.cumsum(stint) - 1
+
+    keep : np.ndarray = np.ones(n, dtype=bool)
+    if not garbage_time:
+        keep = ~games["is_Garbage_Time"].astype(bool).to_numpy()
+    rows : List[pd.DataFrame] = []
+    for side, other in zip(SIDES, SIDES[::-1]):
+        rows.append(pd.DataFrame({
+            "Lineup": lineup[side][keep], "Opponent": lineup[other][keep], "Game": game_id[keep],
+            "Stint": stint[keep], "Home": side == "Home", "Seconds": elapsed[keep],
+            "Poss_For": has_ball[side][keep].astype(np.int64), "Poss_Against": has_ball[other][keep].astype(np.int64),
+            "Pts_For": points[side][keep], "Pts_Against": points[other][keep]
+        }))
+    found : pd.DataFrame = pd.concat(rows, ignore_index=True)
+    return found[found["Lineup"] >= 0]
+
+
+'''
+Points per possession for and against, possessions and minutes of every unit of size
+players (5 for full lineups, 2 or 3 for the combinations inside them) over any number of
+scraped games. Games can have Away_Lineup/Home_Lineup from a registry shared by the season
+(pass it in) or the ten name columns, which are interned into one first. Only full five
+man lineups count, the smaller units come out of them. garbage_time=False leaves out every
+row marked is_Garbage_Time, min_poss drops units with fewer possessions than that (for
+plus against).
+Everything is summed per (lineup, game) first, which a season has a few hundred thousand
+of, and only those are split into their combinations and summed again
+'''
+def lineup_stats(games : Union[pd.DataFrame, List[pd.DataFrame]], registry : LineupRegistry = None,
+                 size : int = 5, garbage_time : bool = True, min_poss : int = 0) -> pd.DataFrame:
+    if not 1 <= size <= 5:
+        raise ValueError(f"Units have 1 to 5 players, not {size}")
+    if isinstance(games, list):
+        games = pd.concat(games, ignore_index=True)
+    games = games.reset_index(drop=True)
+    if registry is None:
+        registry = LineupRegistry()
+    if "Away_Lineup" not in games:
+        games = intern_lineups(games, registry)
+
+    rows : pd.DataFrame = _side_rows(games, registry, garbage_time)
+    per_game : pd.DataFrame = rows.groupby(["Lineup", "Game"], sort=False)[STATS].sum().reset_index()
+    players : np.ndarray = registry.players_of(per_game["Lineup"].to_numpy())
+    full : np.ndarray = (players >= 0).all(axis=1)
+    per_game, players = per_game[full].reset_index(drop=True), np.sort(players[full], axis=1)
+
+    # every (lineup, game) once for each combination of size of its players
+    picks : np.ndarray = np.array(list(combinations(range(5), size)), dtype=np.int64)
+    keys : List[str] = [f"Player_{n}" for n in range(1, size + 1)]
+    units : pd.DataFrame = pd.DataFrame(players[:, picks].reshape(-1, size), columns=keys)
+    units["Game"] = np.repeat(per_game["Game"].to_numpy(), len(picks))
+    for stat in STATS:
+        units[stat] = np.repeat(per_game[stat].to_numpy(), len(picks))
+    units = units.groupby(keys + ["Game"], sort=False)[STATS].sum().reset_index()
+    results : pd.DataFrame = units.groupby(keys, sort=False).agg(
+        Games=("Game", "size"), **{stat: (stat, "sum") for stat in STATS}).reset_index()
+    results = results[results["Poss_For"] + results["Poss_Against"] >= max(min_poss, 1)]
+
+    player_names : np.ndarray = np.array(registry.player_names, dtype=object)
+    team_names : np.ndarray = np.array(registry.player_teams, dtype=object)
+    results.insert(0, "Team", team_names[results["Player_1"].to_numpy()])
+    for key in keys:
+        results[key] = player_names[results[key].to_numpy()]
+    results["Minutes"] = np.round(results.pop("Seconds") / 60, 2)
+    for stat in ["Poss_For", "Poss_Against", "Pts_For", "Pts_Against"]:
+        results[stat] = results[stat].astype(np.int64)
+    results["PPP_For"] = np.round(results["Pts_For"] / results["Poss_For"].replace(0, np.nan), ROUND_PRECISION)
+    results["PPP_Against"] = np.round(results["Pts_Against"] / results["Poss_Against"].replace(0, np.nan), ROUND_PRECISION)
+    results["Net"] = np.round(results["PPP_For"] - results["PPP_Against"], ROUND_PRECISION)
+    results = results.sort_values(["Minutes", "Team"], ascending=[False, True], kind="stable")
+    return results.reset_index(drop=True)
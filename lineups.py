@@ -0,0 +1,73 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence, Tuple
+
+# dtype pandas gives a column of names, so expanded lineups look like they were built from lists
+NAME_DTYPE = pd.Series(["name"]).dtype
+
+
+'''
+Interns players and lineups as small ints so a game doesn't need ten string columns
+to say who was on the floor. Players are keyed by (team, name) since names repeat
+across schools. A lineup is the tuple of player ids in the order it's shown, full
+lineups are always put in position order by _order_players so every five man unit
+maps to one id. One registry can be shared by every game of a season, which makes
+lineup ids comparable between games and group bys on them cheap
+'''
+class LineupRegistry:
+    def __init__(self):
+        self.players : Dict[Tuple[str, str], int] = {}
+        self.player_names : List[str] = []
+        self.player_teams : List[str] = []
+        self.lineups : Dict[Tuple[int, ...], int] = {}
+        self.lineup_players : List[Tuple[int, ...]] = []
+        self.lock = threading.Lock()
+
+    def player(self, team : str, name : str) -> int:
+        key : Tuple[str, str] = (team, name)
+        found = self.players.get(key)
+        if found is not None:
+            return found
+        with self.lock:
+            if key not in self.players:
+                self.players[key] = len(self.player_names)
+                self.player_names.append(name)
+                self.player_teams.append(team)
+            return self.players[key]
+
+    def lineup(self, team : str, on_court : Sequence[str]) -> int:
+        key : Tuple[int, ...] = tuple(self.player(team, name) for name in on_court)
+        found = self.lineups.get(key)
+        if found is not None:
+            return found
+        with self.lock:
+            if key not in self.lineups:
+                self.lineups[key] = len(self.lineup_players)
+                self.lineup_players.append(key)
+            return self.lineups[key]
+
+    # (lineups, 5) array of player ids, -1 where a lineup wasn't full
+    def players_of(self, lineup_ids : np.ndarray) -> np.ndarray:
+        ids : np.ndarray = np.asarray(lineup_ids, dtype=np.int64)
+        unique, inverse = np.unique(ids, return_inverse=True)
+        table : np.ndarray = np.full((len(unique), 5), -1, dtype=np.int64)
+        for row, lineup in enumerate(unique):
+            players : Tuple[int, ...] = self.lineup_players[lineup]
+            table[row, :len(players)] = players[:5]
+        return table[inverse]
+
+    # Back to the name columns (Away_1 ... Away_5 for prefix "Away"). Every distinct
+    # lineup is expanded once and then repeated for the rows that have it. Lineups
+    # over five players don't fit, _build_lineups never lets those through
+    def names(self, lineup_ids : np.ndarray, prefix : str) -> pd.DataFrame:
+        columns : List[str] = [f"{prefix}_{n}" for n in range(1, 6)]
+        unique, inverse = np.unique(np.asarray(lineup_ids, dtype=np.int64), return_inverse=True)
+        table : np.ndarray = np.full((len(unique), 5), None, dtype=object) # lineups that aren't full are padded
+        for row, lineup in enumerate(unique):
+            players : Tuple[int, ...] = self.lineup_players[lineup]
+            table[row, :len(players)] = [self.player_names[player] for player in players]
+        return pd.DataFrame(table[inverse], columns=columns).astype(NAME_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.lineup_players)
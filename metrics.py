@@ -0,0 +1,212 @@
+import atexit
+import bisect
+import json
+import multiprocessing
+import os
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS : Tuple[float, ...] = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+INTERVAL : float = 10.0 # seconds between rewrites of the metrics file
+PREFIX : str = "ncaa_" # prometheus metric names start with this
+
+ENABLED : bool = False
+_lock : threading.Lock = threading.Lock()
+_counters : Dict[str, float] = {}
+_histograms : Dict[str, "Histogram"] = {}
+_path : str = ""
+_prometheus : bool = False
+_stop : threading.Event = threading.Event()
+_writer : threading.Thread = None
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets : List[int] = [0] * (len(BUCKETS) + 1) # the last one is everything above
+        self.count = 0
+        self.total = 0.0
+        self.low = float("inf")
+        self.high = 0.0
+
+    def add(self, seconds : float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.low = min(self.low, seconds)
+        self.high = max(self.high, seconds)
+
+
+# name{label="value",...}, labels in sorted order so the same series is always one key
+def _key(name : str, labels : Dict[str, object]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{labels[label]}"' for label in sorted(labels)) + "}"
+
+
+def count(name : str, value : float = 1, **labels) -> None:
+    if not ENABLED:
+        return
+    key : str = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name : str, seconds : float, **labels) -> None:
+    if not ENABLED:
+        return
+    key : str = _key(name, labels)
+    with _lock:
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].add(seconds)
+
+
+class _Timer:
+    def __init__(self, name : str, labels : Dict[str, object]):
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoTimer:
+    def __enter__(self) -> "_NoTimer":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NO_TIMER : _NoTimer = _NoTimer()
+
+
+# with timer("stage"): ... adds the time spent in the block to the stage's histogram
+def timer(name : str, **labels):
+    if not ENABLED:
+        return _NO_TIMER
+    return _Timer(name, labels)
+
+
+# Decorator version of timer, the check for ENABLED happens on every call so functions
+# decorated at import still get timed once metrics are turned on
+def timed(name : str) -> Callable:
+    def decorate(function : Callable) -> Callable:
+        @wraps(function)
+        def run(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start : float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return run
+    return decorate
+
+
+def snapshot() -> Dict[str, Dict]:
+    with _lock:
+        histograms : Dict[str, Dict] = {
+            key: {"count": found.count, "sum": round(found.total, 6),
+                  "min": round(found.low, 6) if found.count else None, "max": round(found.high, 6),
+                  "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], found.buckets))}
+            for key, found in _histograms.items()}
+        return {"time": time.time(), "counters": dict(_counters), "histograms": histograms}
+
+
+# Prometheus text format. Histogram buckets there are cumulative, they're stored per bucket
+def to_prometheus(state : Dict[str, Dict] = None) -> str:
+    state = state or snapshot()
+    lines : List[str] = []
+    for key, value in sorted(state["counters"].items()):
+        lines.append(f"{PREFIX}{key} {value}")
+    for key, found in sorted(state["histograms"].items()):
+        name, _, labels = key.partition("{")
+        labels = labels.rstrip("}")
+        total : int = 0
+        for bound, hits in found["buckets"].items():
+            total += hits
+            bucket_labels : str = ",".join(part for part in [labels, f'le="{bound}"'] if part)
+            lines.append(f"{PREFIX}{name}_seconds_bucket{{{bucket_labels}}} {total}")
+        suffix : str = "{" + labels + "}" if labels else ""
+        lines.append(f"{PREFIX}{name}_seconds_sum{suffix} {found['sum']}")
+        lines.append(f"{PREFIX}{name}_seconds_count{suffix} {found['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# Written to a temp file and swapped in, so whoever reads it never sees half a file
+def write() -> None:
+    if not _path:
+        return
+    state : Dict[str, Dict] = snapshot()
+    text : str = to_prometheus(state) if _prometheus else json.dumps(state, indent=2)
+    temp : str = f"{_path}.{os.getpid()}.tmp" # one per process, two never swap in the same file
+    with open(temp, "w") as file:
+        file.write(text)
+    os.replace(temp, _path)
+
+
+def _write_loop(interval : float) -> None:
+    while not _stop.wait(interval):
+        write()
+
+
+'''
+Starts collecting. Everything recorded goes to path every interval seconds while the run
+goes on and once more when disable is called, as prometheus text if path ends in .prom or
+prometheus=True, json otherwise. Without a path nothing is written, snapshot() still works.
+Setting NCAA_METRICS to a path does the same on import, in the main process only: spawned
+workers import this module again and would otherwise overwrite the run's file with their
+own nearly empty counters
+'''
+def enable(path : str = "", prometheus : bool = None, interval : float = INTERVAL) -> None:
+    global ENABLED, _path, _prometheus, _writer
+    disable()
+    _path = path
+    _prometheus = path.endswith(".prom") if prometheus is None else prometheus
+    ENABLED = True
+    if path:
+        _stop.clear()
+        _writer = threading.Thread(target=_write_loop, args=(interval,), daemon=True)
+        _writer.start()
+
+
+def disable() -> None:
+    global ENABLED, _writer
+    if not ENABLED:
+        return
+    ENABLED = False
+    if _writer is not None:
+        _stop.set()
+        _writer.join()
+        _writer = None
+    write()
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+atexit.register(disable) # last write of a run that never turned metrics off
+
+
+# A spawned worker imports the main module (and so this one) before parent_process() is set,
+# but it's already been renamed by then
+def _main_process() -> bool:
+    return multiprocessing.parent_process() is None and multiprocessing.current_process().name == "MainProcess"
+
+
+if os.environ.get("NCAA_METRICS") and _main_process():
+    enable(os.environ["NCAA_METRICS"])
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+MAX_BYTES : int = 2 * 1024 ** 3 # compressed size the cache is allowed to grow to
+TTL : float = 6 * 60 * 60 # pages that can still change are refetched after this many seconds
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+'''
+Disk cache for raw pages, keyed by url. Pages are zlib compressed and kept in a single
+sqlite file along with their size, when they were fetched and when they were last used.
+Final pages (finished games, scoreboards of past days) never go stale, everything else
+is only served for ttl seconds. Once the cache is over max_bytes the least recently
+used pages are dropped until it fits again
+'''
+class PageCache:
+    def __init__(self, path : str = "page_cache.sqlite", max_bytes : int = MAX_BYTES, ttl : float = TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, body BLOB NOT NULL, "
+                        "size INTEGER NOT NULL, fetched REAL NOT NULL, used REAL NOT NULL, "
+                        "final INTEGER NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+        self.db.commit()
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url : str) -> Optional[str]:
+        now : float = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT body, fetched, final FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None or (not row[2] and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE pages SET used = ? WHERE url = ?", (now, url))
+            self.db.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, url : str, page : str, final : bool = False) -> None:
+        body : bytes = zlib.compress(page.encode("utf-8"))
+        now : float = time.time()
+        with self.lock:
+            old = self.db.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            if old:
+                self.size -= old[0]
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                            (url, body, len(body), now, now, int(final)))
+            self.size += len(body)
+            self._evict()
+            self.db.commit()
+
+    # drops least recently used pages till the cache fits, lock must be held
+    def _evict(self) -> None:
+        while self.size > self.max_bytes:
+            rows = self.db.execute("SELECT url, size FROM pages ORDER BY used LIMIT 64").fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.size -= size
+                if self.size <= self.max_bytes:
+                    break
+
+    # deletes every page that has gone stale, returns how many there were
+    def expire(self) -> int:
+        with self.lock:
+            cutoff : float = time.time() - self.ttl
+            rows = self.db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM pages "
+                                   "WHERE final = 0 AND fetched < ?", (cutoff,)).fetchone()
+            self.db.execute("DELETE FROM pages WHERE final = 0 AND fetched < ?", (cutoff,))
+            self.db.commit()
+            self.size -= rows[0]
+            return rows[1]
+
+    # every url in the cache, fresh or not
+    def urls(self) -> List[str]:
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT url FROM pages ORDER BY url")]
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            pages : int = self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"pages": pages, "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+DEPTH : int = 32 # how many items each queue holds before the stage feeding it waits
+_DONE = object() # end of stream marker passed down the queues
+
+
+class _Stopped(Exception):
+    pass
+
+
+'''
+Three stage pipeline for scraping a range of days:
+    fetch:  fetchers threads download the raw pages of every game (network bound)
+    parse:  a process pool turns those pages into results (cpu bound, pandas)
+    write:  the calling thread collects the results and commits one day at a time
+Every stage hands off through a bounded queue, so a slow stage holds the ones before
+it back instead of piling up pages in memory. One more thread reads the scoreboards
+and announces each day to the writer before its games go out, and days are written
+strictly in order so an interrupted run can resume from the last one. The pool spawns
+fresh interpreters rather than forking, since the other stages are busy holding
+locks (sessions, the page cache) when it starts.
+
+The work itself comes from the caller:
+    plan(day) -> (boards, keys)          scoreboards for the day and the games in them
+    fetch(key) -> pages                  runs on the fetcher threads
+    parse(key, pages) -> result          runs in the process pool, has to be picklable
+    finish(key, result) -> result        runs on the writer, fixes up results if needed
+    write(day, boards, results) -> None  commits a day, results is {key: result}
+'''
+class Pipeline:
+    def __init__(self, plan : Callable, fetch : Callable, parse : Callable, finish : Callable,
+                 write : Callable, fetchers : int = 4, processes : int = 0, depth : int = DEPTH):
+        self.plan = plan
+        self.fetch = fetch
+        self.parse = parse
+        self.finish = finish
+        self.write = write
+        self.fetchers = fetchers
+        self.processes = processes or os.cpu_count() or 1
+        self.depth = depth
+        self.stop = threading.Event()
+        self.fetch_q : queue.Queue = queue.Queue(depth)
+        self.parse_q : queue.Queue = queue.Queue(depth)
+        self.done_q : queue.Queue = queue.Queue(depth)
+        self.slots : threading.BoundedSemaphore = threading.BoundedSemaphore(depth)
+
+    # put that gives up once the pipeline is stopping, so no stage can hang on a full queue
+    def _put(self, q : queue.Queue, item : Any) -> None:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def _get(self, q : queue.Queue) -> Any:
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Stopped()
+
+    def _fail(self, error : Exception) -> None:
+        try:
+            self._put(self.done_q, ("error", error))
+        except _Stopped:
+            pass
+        self.stop.set()
+
+    def _plan_days(self, start : date, end : date) -> None:
+        try:
+            while start < end + timedelta(days=1):
+                print(start)
+                boards, keys = self.plan(start)
+                self._put(self.done_q, ("day", start, boards, keys))
+                for key in keys:
+                    self._put(self.fetch_q, (start, key))
+                start += timedelta(days=1)
+            for _ in range(self.fetchers):
+                self._put(self.fetch_q, _DONE)
+        except _Stopped:
+            pass
+        except BaseException as e: # SystemExit from get_site too, or the writer would wait forever
+            self._fail(e)
+
+    def _fetch_pages(self) -> None:
+        try:
+            while True:
+                item = self._get(self.fetch_q)
+                if item is _DONE:
+                    self._put(self.parse_q, _DONE)
+                    return
+                day, key = item
+                self._put(self.parse_q, (day, key, self.fetch(key)))
+        except _Stopped:
+            pass
+        except BaseException as e: # SystemExit from get_site too, or the writer would wait forever
+            self._fail(e)
+
+    def _parse_pages(self, pool : ProcessPoolExecutor) -> None:
+        try:
+            finished : int = 0
+            while finished < self.fetchers:
+                item = self._get(self.parse_q)
+                if item is _DONE:
+                    finished += 1
+                    continue
+                day, key, pages = item
+                # at most depth games are in the pool at once
+                while not self.slots.acquire(timeout=0.1):
+                    if self.stop.is_set():
+                        raise _Stopped()
+                future : Future = pool.submit(self.parse, key, pages)
+                future.add_done_callback(lambda done, day=day, key=key: self._parsed(day, key, done))
+            for _ in range(self.depth):
+                while not self.slots.acquire(timeout=0.1):
+                    if self.stop.is_set():
+                        raise _Stopped()
+            self._put(self.done_q, ("end",))
+        except _Stopped:
+            pass
+        except BaseException as e: # SystemExit from get_site too, or the writer would wait forever
+            self._fail(e)
+
+    # the slot is only given back once the result is queued, so "end" can't overtake it
+    def _parsed(self, day : date, key : Hashable, future : Future) -> None:
+        try:
+            if future.exception() is not None:
+                self._fail(future.exception())
+            else:
+                self._put(self.done_q, ("game", day, key, future.result()))
+        except _Stopped:
+            pass
+        finally:
+            self.slots.release()
+
+    def run(self, start : date, end : date) -> None:
+        days : List[Tuple[date, Any, List[Hashable]]] = [] # announced but not written yet, in order
+        results : Dict[Tuple[date, Hashable], Any] = {}
+        pool : ProcessPoolExecutor = ProcessPoolExecutor(max_workers=self.processes,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+        threads : List[threading.Thread] = [threading.Thread(target=self._plan_days, args=(start, end), daemon=True)]
+        threads += [threading.Thread(target=self._fetch_pages, daemon=True) for _ in range(self.fetchers)]
+        threads.append(threading.Thread(target=self._parse_pages, args=(pool,), daemon=True))
+        try:
+            for thread in threads:
+                thread.start()
+            ended : bool = False
+            while not ended or days:
+                if not ended:
+                    message = self.done_q.get()
+                    if message[0] == "error":
+                        raise message[1]
+                    if message[0] == "day":
+                        days.append(message[1:])
+                    elif message[0] == "game":
+                        _, day, key, result = message
+                        results[(day, key)] = self.finish(key, result)
+                    else:
+                        ended = True
+                # write every day at the front whose games are all in
+                while days and all((days[0][0], key) in results for key in days[0][2]):
+                    day, boards, keys = days.pop(0)
+                    self.write(day, boards, {key: results.pop((day, key)) for key in keys})
+                if ended and days:
+                    raise RuntimeError(f"Pipeline ended without results for {days[0][0]}")
+        finally:
+            self.stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            for thread in threads:
+                thread.join()
@@ -1,162 +1,144 @@
-import io
-
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Tuple
-import copy
-from get_site import get_site
+from fetch_planner import FetchPlanner
+from lineups import LineupRegistry
+from compact_schema import SeasonDictionary, to_compact
+import metrics
 
 pd.set_option('display.max_rows', None)
 
 
+# Splits the "away-home" score strings into two columns. Events that don't change the
+# score don't have a dash, and just carry the last score forward
 def _score_split(game : pd.DataFrame) -> pd.DataFrame:
-    game["Away_Score"] = pd.NA
-    game["Home_Score"] = pd.NA
+    score : pd.Series = game["Score"]
+    scored : np.ndarray = score.str.contains("-", regex=False).to_numpy(dtype=bool, copy=True)
+    split : pd.DataFrame = score.str.split("-", n=2, expand=True).reindex(columns=[0, 1])
+    away : np.ndarray = pd.to_numeric(split[0].where(scored), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    home : np.ndarray = pd.to_numeric(split[1].where(scored), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    if len(game):
+        scored[0] = True
+        away[0] = home[0] = 0
+    # every row takes the score of the last row that had one
+    last : np.ndarray = np.maximum.accumulate(np.where(scored, np.arange(len(game)), 0))
+    game["Away_Score"] = pd.array(away[last], dtype="Int64")
+    game["Home_Score"] = pd.array(home[last], dtype="Int64")
+
+    # bandaid fix to a rare phenomenon where the logs are wrong and messes up
+    # score sorting, the final score is the last one that wasn't behind the
+    # biggest score seen so far
     big_a : int = 0
     big_h : int = 0
-    i : int = 0
-    for i, score in enumerate(game["Score"]):
-        nums : List[int] = score.split("-")
-        if i == 0:
-            game.at[i, "Away_Score"] = 0
-            game.at[i, "Home_Score"] = 0
-        elif len(nums) == 1:
-            game.at[i, "Away_Score"] = game.at[i - 1, "Away_Score"]
-            game.at[i, "Home_Score"] = game.at[i - 1, "Home_Score"]
-        else:
-            if int(nums[0]) > big_a or int(nums[1]) > big_h:
-                big_a = int(nums[0])
-                big_h = int(nums[1])
-            game.at[i, "Away_Score"] = nums[0]
-            game.at[i, "Home_Score"] = nums[1]
-    game['Home_Score'] = pd.to_numeric(game['Home_Score'], errors='coerce').astype("Int64")
-    game["Away_Score"] = pd.to_numeric(game['Away_Score'], errors='coerce').astype('Int64')
-    game.at[i, "Home_Score"] = big_h
-    game.at[i, "Away_Score"] = big_a # bandaid fix to a rare phenomenon where the logs
-                                     # are wrong and messes up score sorting
+    for a, h in zip(away[1:][scored[1:]].tolist(), home[1:][scored[1:]].tolist()):
+        if a > big_a or h > big_h:
+            big_a = int(a)
+            big_h = int(h)
+    game.at[len(game) - 1, "Home_Score"] = big_h
+    game.at[len(game) - 1, "Away_Score"] = big_a
     return game
 
 
-
-def _time_to_seconds(time_str : str) -> float:
-    minutes, seconds, milliseconds = time_str.split(':')
-    total_seconds = int(minutes) * 60 + int(seconds) + int(milliseconds) / 100
-    return total_seconds
+# "mm:ss:cc" clock strings to seconds left in the period
+def _time_to_seconds(times : pd.Series) -> np.ndarray:
+    clock : np.ndarray = times.str.split(":", expand=True).astype(np.int64).to_numpy()
+    return clock[:, 0] * 60 + clock[:, 1] + clock[:, 2] / 100
 
 
 def _game_seconds(game: pd.DataFrame, w : bool = False) -> pd.DataFrame:
     period_length: float = 1200.00
     if w:
         period_length = 480.00
-    game["Seconds"] = pd.NA
-    for i, time in enumerate(game["Time"]):
-        current_time : float = _time_to_seconds(time)
-        elapsed : float = period_length - current_time
-        #obnoxiously nesting but just adding elapsed time
-        # and accounting for arbitrary amount of overtime periods
-        if game.at[i, "Period"] > 1 and not w:
-            elapsed += 1200
-            if game.at[i, "Period"] == 3:
-                elapsed += 1200
-            for _ in range(game.at[i, "Period"] - 3):
-                elapsed += 300
-        elif w:
-            for n in range(game.at[i, "Period"] - 1):
-                if n == 6:
-                    break
-            for _ in range(game.at[i, "Period"] - 5):
-                elapsed += 300
-        game.at[i, "Seconds"] = round(elapsed, 2)
-
+    period : np.ndarray = game["Period"].to_numpy(dtype=np.int64)
+    elapsed : np.ndarray = period_length - _time_to_seconds(game["Time"])
+    # adding up the time of the periods already played, accounting
+    # for an arbitrary amount of overtime periods
+    if not w:
+        elapsed += np.where(period > 1, 1200, 0)
+        elapsed += np.where(period == 3, 1200, 0)
+        elapsed += 300 * np.maximum(period - 3, 0)
+    else:
+        elapsed += 300 * np.maximum(period - 5, 0)
+    game["Seconds"] = pd.Series(np.round(elapsed, 2), index=game.index).astype(object)
+    return game
 
 
-    return game
+# object column holding values where mask is set and NA everywhere else
+def _masked(values : pd.Series, mask : pd.Series) -> pd.Series:
+    return values.astype(object).where(mask, pd.NA)
 
 
 # Shots are tagged with a lot of data, it's better if these are split up
 # to bool columns, NA if it's not a shot
 def _shot_splitter(game: pd.DataFrame) -> pd.DataFrame:
-    # find every shot modifier
-    game['Shot_Value'] = pd.NA
-    game['Shot_Type'] = pd.NA
-    game['Made'] = pd.NA
-    game['is_Transition'] = pd.NA
-    game['is_Paint'] = pd.NA
-    game['2nd_Chance'] = pd.NA
-    for i, event in enumerate(game['Event']):
-        # split up every non-free throw shot
-        if len(event.split('pt')) > 1:
-            game.at[i, "Shot_Value"] = int(event.split('pt')[0])
-            game.at[i, "Shot_Type"] = event.split()[1]
-            if event.split()[-1] == 'made':
-                game.at[i, "Made"] = True
-            else:
-                game.at[i, "Made"] = False
-            if 'fastbbreak' in event or 'fromturnover' in event:
-                game.at[i, "is_Transition"] = True
-            else:
-                game.at[i, "is_Transition"] = False
-            if 'pointsinthepaint' in event:
-                game.at[i, "is_Paint"] = True
-            else:
-                game.at[i, "is_Paint"] = False
-            if '2nd' in event:
-                game.at[i, "2nd_Chance"] = True
-            else:
-                game.at[i, "2nd_Chance"] = False
-        else:
-            if 'freethrow' in event:
-                game.at[i, "Shot_Value"] = 1
-                if 'fromturnover' in event:
-                    game.at[i, "is_Transition"] = True
-                else:
-                    game.at[i, "is_Transition"] = False
-                if "made" in event:
-                    game.at[i, "Made"] = True
-                else:
-                    game.at[i, "Made"] = False
-
-
+    events : pd.Series = game['Event']
+    shot : pd.Series = events.str.contains('pt', regex=False)
+    free_throw : pd.Series = ~shot & events.str.contains('freethrow', regex=False)
+    attempt : pd.Series = shot | free_throw
+    words : pd.Series = events.str.split()
+
+    value : pd.Series = pd.to_numeric(events.str.split('pt', n=1).str[0].where(shot), errors='coerce')
+    game['Shot_Value'] = _masked(value.where(shot, 1).astype("Int64"), attempt)
+    game['Shot_Type'] = _masked(words.str[1], shot)
+    made : pd.Series = (words.str[-1] == 'made').where(shot, events.str.contains('made', regex=False))
+    game['Made'] = _masked(made.astype(bool), attempt)
+    transition : pd.Series = events.str.contains('fromturnover', regex=False)
+    transition = transition | (shot & events.str.contains('fastbbreak', regex=False))
+    game['is_Transition'] = _masked(transition, attempt)
+    game['is_Paint'] = _masked(events.str.contains('pointsinthepaint', regex=False), shot)
+    game['2nd_Chance'] = _masked(events.str.contains('2nd', regex=False), shot)
     return game
 
 #creates a column that tracks which team has possession and another
-# to count the total possessions
+# to count the total possessions. The team that acted on each event comes from
+# the Side column _build_lineups keeps, so every row is decided in one pass
 def _poss_former(game : pd.DataFrame, teams : List[str]) -> pd.DataFrame:
-    game["Possession"] = pd.NA
-    game["Poss_Count"] = 0
-    poss : int = 0
-    team : bool = False #indexes teams
-    new_half : bool = False # Stops double increments
-    for i, player in enumerate(game["Player"][1:]):
-        if "-" not in game["Score"][i + 1]:
-            game.at[i + 1, "Poss_Count"] = poss
-            game.at[i + 1, "Possession"] = teams[team]
-            if "end" in game["Score"][i + 1]:
-                poss += 1 #for new halves
-                new_half = True
-            continue #skips all the non-events
-        if player == "Team":
-            if "defensive" in game["Event"][i + 1]:
-                team = not team
-                poss += 1
-            game.at[i + 1, "Possession"] = teams[team]
-            game.at[i + 1, "Poss_Count"] = poss
-            continue
-        row: List = game.iloc[i + 1].tolist()
-        col: int = row.index(player)
-        if col < 7:
-            team = False
-        else:
-            team = True
-        game.at[i + 1, "Possession"] = teams[team]
-        if pd.isna(game["Possession"][i]) or teams[team] != game["Possession"][i]:
-            if not new_half:
-                poss += 1
-        if new_half:
-            new_half = False
-        game.at[i + 1, "Poss_Count"] = poss
+    n : int = len(game)
+    rows : np.ndarray = np.arange(n)
+    score : pd.Series = game["Score"].astype(str)
+    player : np.ndarray = game["Player"].to_numpy(dtype=object)
+    later : np.ndarray = rows > 0 # the first row is never looked at
+    scored : np.ndarray = score.str.contains("-", regex=False).to_numpy(dtype=bool) & later
+    ends : np.ndarray = ~scored & score.str.contains("end", regex=False).to_numpy(dtype=bool) & later
+    by_team : np.ndarray = scored & (player == "Team")
+    flips : np.ndarray = by_team & game["Event"].astype(str).str.contains("defensive", regex=False).to_numpy(dtype=bool)
+    acted : np.ndarray = scored & ~by_team
+
+    # who has the ball after each row: the side of the last player who acted,
+    # flipped once for every team defensive rebound since then
+    flip_count : np.ndarray = np.cumsum(flips)
+    last_act : np.ndarray = np.maximum.accumulate(np.where(acted, rows, -1))
+    side : np.ndarray = game["Side"].to_numpy(dtype=np.int64)
+    held : np.ndarray = np.where(last_act >= 0, side[last_act.clip(min=0)], 0)
+    held ^= (flip_count - np.where(last_act >= 0, flip_count[last_act.clip(min=0)], 0)) & 1
+    names : np.ndarray = np.array(teams, dtype=object)[held]
+
+    # a player acting for a different team than the row before starts a possession,
+    # unless a period just ended since that already counted it
+    changed : np.ndarray = np.ones(n, dtype=bool)
+    changed[2:] = names[2:] != names[1:-1]
+    last_end : np.ndarray = np.maximum.accumulate(np.where(ends, rows, -1))
+    new_half : np.ndarray = np.zeros(n, dtype=bool)
+    new_half[1:] = last_end[:-1] > np.maximum.accumulate(np.where(acted, rows, -1))[:-1]
+    counted : np.ndarray = flips | (acted & changed & ~new_half)
+    poss : np.ndarray = np.cumsum(counted)
+    poss[1:] += np.cumsum(ends)[:-1] # period ends count from the row after
+
+    possession : np.ndarray = names.copy()
+    if n:
+        possession[0] = pd.NA
+        poss[0] = 0
+    game["Possession"] = pd.Series(possession, index=game.index, dtype=object)
+    game["Poss_Count"] = poss
+    return game
 
 
-    return game
+# Where each possession starts, plus the number of rows at the end. Possession k
+# is game.iloc[starts[k]:starts[k + 1]], so per possession work never rescans the game
+def possession_index(game : pd.DataFrame) -> np.ndarray:
+    count : np.ndarray = game["Poss_Count"].to_numpy(dtype=np.int64)
+    starts : np.ndarray = np.flatnonzero(np.diff(count, prepend=-1) != 0)
+    return np.append(starts, len(count))
 
 
 #The game is more readable if assists, and fouls are counted as
@@ -194,79 +176,130 @@ def _event_packer(game : pd.DataFrame) -> pd.DataFrame:
     game.reset_index(drop=True, inplace=True)
     return game
 
-# The events are often out of order, this needs to be fixed to do possession analysis
-def _event_sorter(game: pd.DataFrame) -> pd.DataFrame:
-    priorities = [
-        "game start",
-        "period start",
-        "jumpball startperiod",
-        "jumpball lost",
-        "jumpball won",
-        "assist",
-        "jumpball",
-        "steal",
-        "turnover ",
-        "foul ",
-        "foulon",
-        "block",
-        "tipin",
-        "2pt",
-        "3pt",
-        "1of2",
-        "1of3",
-        "rebound",
-        "2of3",
-        "1of1",
-        "2of2",
-        "3of3",
-        "timeout",
-        "end"
-    ]
-    new_order : List[int] = []
-
-    # Find all events that happen at the same time and sort them according
-    # to priorites. Then add the indices to the new order and rearrange the df
-    # accordingly
-    for i, time in enumerate(game["Time"]):
-        if i < len(new_order): #compensate for moving ahead in for loop
-            continue
-        same_times: List[int] = [i]
-        index: int = i + 1
-        for subsequent in game["Time"][i + 1:]:
-            if time != subsequent:
+
+# The rows _event_packer would delete, deleted without building Player_2 and Event_2,
+# along with its Player fix. The packer itself is used for the rare games it treats
+# differently: the last row being packed grows the frame, and rows without an event
+def _packed_rows_dropped(game : pd.DataFrame) -> pd.DataFrame:
+    events : pd.Series = game["Event"]
+    packed : np.ndarray = (events.str.contains("assist", regex=False) | events.str.contains("foul ", regex=False)
+                           | events.str.contains("steal", regex=False) | (events == " block")
+                           | (events == " jumpball lost")).to_numpy(dtype=bool)
+    if len(game) == 0 or packed[-1] or events.isna().any():
+        return _event_packer(game)
+    game.loc[events == " foulon", "Event"] = "fouled"
+    game = game[~packed].reset_index(drop=True)
+    events = game["Event"]
+    if events.iloc[-1] == "fouled":
+        return _event_packer(game)
+    # fouls that go with the 2pt shot right after them
+    shot_foul : np.ndarray = np.zeros(len(game), dtype=bool)
+    shot_foul[:-1] = ((events.to_numpy()[:-1] == "fouled")
+                      & (game["Time"].to_numpy()[:-1] == game["Time"].to_numpy()[1:])
+                      & events.str.contains("2pt", regex=False).to_numpy(dtype=bool)[1:])
+    game.loc[events == game["Player"], "Player"] = pd.NA
+    game = game[~shot_foul].reset_index(drop=True)
+    return game
+
+PRIORITIES : List[str] = [
+    "game start",
+    "period start",
+    "jumpball startperiod",
+    "jumpball lost",
+    "jumpball won",
+    "assist",
+    "jumpball",
+    "steal",
+    "turnover ",
+    "foul ",
+    "foulon",
+    "block",
+    "tipin",
+    "2pt",
+    "3pt",
+    "1of2",
+    "1of3",
+    "rebound",
+    "2of3",
+    "1of1",
+    "2of2",
+    "3of3",
+    "timeout",
+    "end"
+]
+_priority_codes : Dict[str, int] = {} # every event text seen so far and its place in PRIORITIES
+
+
+# Where an event goes among events at the same time, -1 if it isn't in PRIORITIES.
+# Each distinct event text is only matched once and then looked up
+def _priority(event : str) -> int:
+    code = _priority_codes.get(event)
+    if code is not None:
+        return code
+    code = -1
+    if event == " block": #due to how they write out the event we need to make an exception here
+        code = 0
+    elif isinstance(event, str):
+        for j, priority in enumerate(PRIORITIES):
+            if priority in event:
+                # this looks really stupid but trust me the reason
+                # it exists is even more stupid than this
+                code = 18 if j == 12 else j
                 break
-            same_times.append(index)
-            index += 1
-        if len(same_times) == 1:
-            new_order.append(same_times[0])
-            continue
-        tup_list: List[Tuple[int, int]] = []
-        # creates tups of the priority order, and index, then sorts by order
-        # adds the indices to the new_order list
-        for spot in same_times:
-            event : str = game["Event"][spot]
-            for j, priority in enumerate(priorities):
-                if event == " block": #due to how they write out the event we need to make an exception here
-                    tup: Tuple[int, int] = (0, spot)
-                    tup_list.append(tup)
-                    break
-                if priority in event:
-                    # this looks really stupid but trust me the reason
-                    # it exists is even more stupid than this
-                    if j == 12:
-                        j = 18
-                    tup : Tuple [int, int] = (j, spot)
-                    tup_list.append(tup)
-                    break
-        tup_list.sort()
-        for tupl in tup_list:
-            new_order.append(tupl[1])
+    _priority_codes[event] = code
+    return code
+
 
+# The events are often out of order, this needs to be fixed to do possession analysis.
+# Events at the same time are sorted by priority, events in those groups that don't
+# match a priority are dropped, and a lone event is always kept
+def _event_sorter(game: pd.DataFrame) -> pd.DataFrame:
+    times : np.ndarray = game["Time"].to_numpy(dtype=object)
+    n : int = len(times)
+    if n == 0:
+        return game
+    events, unique = pd.factorize(game["Event"], use_na_sentinel=False)
+    codes : np.ndarray = np.array([_priority(event) for event in unique], dtype=np.int64)[events]
+    starts : np.ndarray = np.ones(n, dtype=bool)
+    starts[1:] = times[1:] != times[:-1]
+    group : np.ndarray = np.cumsum(starts)
+    size : np.ndarray = np.bincount(group)[group]
+
+    if ((size > 1) & (codes < 0)).any():
+        new_order : np.ndarray = _dropping_order(codes, np.flatnonzero(starts), n)
+    else:
+        new_order = np.lexsort((codes, group))
     game = game.iloc[new_order]
     game.reset_index(drop=True, inplace=True)
     return game
 
 
+'''
+The original sorter walked the rows and skipped any row whose index was below the
+length of the new order so far. Once a group loses an event that length falls behind,
+so the tail of that group gets picked up again as a group of its own. Games with
+unmatched events are rare, so only they go through this walk, one step per group,
+to keep the order exactly as it always was
+'''
+def _dropping_order(codes : np.ndarray, starts : np.ndarray, n : int) -> np.ndarray:
+    run_end : np.ndarray = np.repeat(np.append(starts[1:], n), np.diff(np.append(starts, n)))
+    parts : List[np.ndarray] = []
+    placed : int = 0
+    i : int = 0
+    while i < n:
+        if run_end[i] - i == 1:
+            parts.append(np.array([i]))
+            placed += 1
+        else:
+            spots : np.ndarray = np.arange(i, run_end[i])
+            spots = spots[codes[spots] >= 0]
+            spots = spots[np.argsort(codes[spots], kind="stable")]
+            parts.append(spots)
+            placed += len(spots)
+        i = max(i + 1, placed)
+    return np.concatenate(parts)
+
+
 
 def _get_starters(df : pd.DataFrame) -> List [List[str]]:
     starters : List [List[str]] = [[], []]
@@ -289,9 +322,8 @@ def _get_starters(df : pd.DataFrame) -> List [List[str]]:
     return starters
 
 # Helper Function for sorting players based on position
-def _get_positions(game_id : int) -> Dict[str, str]:
-    url: str = f"https://stats.ncaa.org/contests/{game_id}/individual_stats"
-    dataframes: List[pd.DataFrame] = pd.read_html(get_site(url))
+def _get_positions(game_id : int, planner : FetchPlanner) -> Dict[str, str]:
+    dataframes: List[pd.DataFrame] = planner.tables(game_id, "individual_stats")
     positions : Dict[str, str] = {}
     positions.update(dataframes[3].set_index('Name')['P'].to_dict())
     positions.update(dataframes[4].set_index('Name')['P'].to_dict())
@@ -324,74 +356,111 @@ def _order_players(on_court  : List[str],
     return
 
 
-def _build_lineups(game_id : int, game : pd.DataFrame) -> pd.DataFrame:
-    positions : Dict[str, str] = _get_positions(game_id)
-    starters : List[List[str]]= _get_starters(game)
-    away_lineups : List[List[str]] = []
-    home_lineups : List[List[str]] = []
-    prev : List[str] = starters[0] # whenever the lineup isn't full we add the last instance when it was
-    rows_to_drop : List[int] = [] # Since we'll have lineups at all times, we can drop events with subs to make it easier to read
-    for i, event in enumerate(game[game.columns[1]]):
-        if pd.isna(event):
-            if len(starters[0]) == 5: #reduancy because orders get screwed up on webpage
-                away_lineups.append(copy.deepcopy(starters[0]))
-            else:
-                away_lineups.append(copy.deepcopy(prev))
+'''
+Walks one team's event stream keeping track of who is on the court, and gives back the
+lineup id for every row plus the rows that were substitutions. Until the team first
+has five players after one of its own events, prev is the on court list itself, so
+rows before that show whatever the partial list is at the time. The order only has to
+be redone when a sub changed who is on the court
+'''
+def _lineup_stream(events : pd.Series, on_court : List[str], positions : Dict[str, str],
+                   team : str, registry : LineupRegistry) -> Tuple[np.ndarray, List[int]]:
+    lineups : np.ndarray = np.empty(len(events), dtype=np.int64)
+    rows_to_drop : List[int] = []
+    prev : int = -1 # -1 while prev still points at on_court
+    current : int = registry.lineup(team, on_court)
+    changed : bool = True
+    for i, event in enumerate(events.tolist()):
+        if not isinstance(event, str):
+            lineups[i] = current if len(on_court) == 5 or prev < 0 else prev
             continue
         player : str = event.split(",")[0]
         if "substitution out" in event:
             try:
-                starters[0].remove(player)
-            except ValueError:
-                pass
-            rows_to_drop.append(i)
-        elif "substitution in" in event:
-            starters[0].append(player)
-            rows_to_drop.append(i)
-        if len(starters[0]) == 5:
-            _order_players(starters[0], positions)
-            away_lineups.append(copy.deepcopy(starters[0]))
-            prev = copy.deepcopy(starters[0])
-        elif len(starters[0]) != 5:
-            away_lineups.append(copy.deepcopy(prev))
-
-    prev = starters[1]
-    for i, event in enumerate(game[game.columns[3]]):
-        if pd.isna(event):
-            if len(starters[1]) == 5:
-                home_lineups.append(copy.deepcopy(starters[1]))
-            else:
-                home_lineups.append(copy.deepcopy(prev))
-            continue
-        player: str = event.split(",")[0]
-        if "substitution out" in event:
-            try:
-                starters[1].remove(player)
+                on_court.remove(player)
             except ValueError:
                 pass
             rows_to_drop.append(i)
+            changed = True
         elif "substitution in" in event:
-            starters[1].append(player)
+            on_court.append(player)
             rows_to_drop.append(i)
-        if len(starters[1]) == 5:
-            _order_players(starters[1], positions)
-            home_lineups.append(copy.deepcopy(starters[1]))
-            prev = copy.deepcopy(starters[1])
-        elif len(starters[1]) != 5:
-            home_lineups.append(copy.deepcopy(prev))
-
-    away_lineup_df = pd.DataFrame(away_lineups, columns=["Away_1",
-                                                         "Away_2",
-                                                         "Away_3",
-                                                         "Away_4",
-                                                         "Away_5"])
-    home_lineup_df = pd.DataFrame(home_lineups, columns=["Home_1",
-                                                         "Home_2",
-                                                          "Home_3",
-                                                          "Home_4",
-                                                          "Home_5"])
-
-    game = pd.concat([game, away_lineup_df, home_lineup_df], axis=1)
+            changed = True
+        if len(on_court) == 5:
+            if changed:
+                _order_players(on_court, positions)
+                current = registry.lineup(team, on_court)
+                changed = False
+            lineups[i] = prev = current
+        else:
+            if changed:
+                current = registry.lineup(team, on_court)
+            lineups[i] = current if prev < 0 else prev
+    return lineups, rows_to_drop
+
+
+# Lineups come back as two id columns, Away_Lineup and Home_Lineup, that the
+# registry turns back into names
+def _build_lineups(game_id : int, game : pd.DataFrame, registry : LineupRegistry,
+                   planner : FetchPlanner) -> pd.DataFrame:
+    positions : Dict[str, str] = _get_positions(game_id, planner)
+    starters : List[List[str]]= _get_starters(game)
+    rows_to_drop : List[int] = [] # Since we'll have lineups at all times, we can drop events with subs to make it easier to read
+    for side, column in zip(["Away", "Home"], [game.columns[1], game.columns[3]]):
+        lineups, subs = _lineup_stream(game[column], starters[side == "Home"], positions, column, registry)
+        # the five lineup columns need a full lineup somewhere and never more than five
+        sizes : np.ndarray = np.array([len(registry.lineup_players[lineup]) for lineup in np.unique(lineups)])
+        if len(sizes) and sizes.max() != 5:
+            raise ValueError(f"Lineups for {column} don't fit in five columns, largest has {sizes.max()} players")
+        game[f"{side}_Lineup"] = lineups
+        rows_to_drop += subs
+    return _merge_streams(game, rows_to_drop)
+
+
+'''
+The same walk as _lineup_stream without keeping the lineups, for when only possessions
+are wanted. Gives back the biggest lineup the full walk would have shown (a partial one
+before the team's first full five, five after) and the rows that were substitutions, so
+the possessions path drops the same rows and turns down the same games
+'''
+def _court_sizes(events : pd.Series, on_court : List[str]) -> Tuple[int, List[int]]:
+    rows_to_drop : List[int] = []
+    biggest : int = 0
+    full_seen : bool = False
+    for i, event in enumerate(events.tolist()):
+        if isinstance(event, str):
+            player : str = event.split(",")[0]
+            if "substitution out" in event:
+                try:
+                    on_court.remove(player)
+                except ValueError:
+                    pass
+                rows_to_drop.append(i)
+            elif "substitution in" in event:
+                on_court.append(player)
+                rows_to_drop.append(i)
+            if len(on_court) == 5:
+                full_seen = True
+        biggest = max(biggest, len(on_court) if len(on_court) == 5 or not full_seen else 5)
+    return biggest, rows_to_drop
+
+
+# _build_lineups for the possessions path, no positions and no lineup columns
+def _substitutions(game : pd.DataFrame) -> pd.DataFrame:
+    starters : List[List[str]] = _get_starters(game)
+    rows_to_drop : List[int] = []
+    for side, column in zip(["Away", "Home"], [game.columns[1], game.columns[3]]):
+        biggest, subs = _court_sizes(game[column], starters[side == "Home"])
+        if len(game) and biggest != 5:
+            raise ValueError(f"Lineups for {column} don't fit in five columns, largest has {biggest} players")
+        rows_to_drop += subs
+    return _merge_streams(game, rows_to_drop)
+
+
+# Drops the substitution rows and merges the two team streams into Player and Event
+def _merge_streams(game : pd.DataFrame, rows_to_drop : List[int]) -> pd.DataFrame:
+    # which stream each event came from (0 away, 1 home), possession needs it after they're merged
+    game["Side"] = np.where(game[game.columns[1]].notna(), 0, 1)
     game.drop(rows_to_drop, inplace=True)
     game.reset_index(drop=True, inplace=True)
     # Combine the 2 team streams into one, then split by player and Event delete old streams
@@ -402,6 +471,16 @@ def _build_lineups(game_id : int, game : pd.DataFrame) -> pd.DataFrame:
     return game
 
 
+# Swaps the lineup id columns for the ten name columns
+def expand_lineups(game : pd.DataFrame, registry : LineupRegistry) -> pd.DataFrame:
+    names : List[pd.DataFrame] = [registry.names(game[f"{side}_Lineup"].to_numpy(), side)
+                                  for side in ["Away", "Home"]]
+    for frame in names:
+        frame.index = game.index
+    game = pd.concat([game.drop(columns=["Away_Lineup", "Home_Lineup"])] + names, axis=1)
+    return game
+
+
 # sometimes the scores columns get reversed for some reason, easy fix
 # just use the score table
 def _fix_glitch(table : pd.DataFrame, game : pd.DataFrame) -> pd.DataFrame:
@@ -418,23 +497,65 @@ def _is_garbage(game: pd.DataFrame) -> pd.DataFrame:
     # if a game is overtime, there's no garbage time
     if game["Seconds"].iloc[-1] > 2401:
         return game
-    for i,  secs in enumerate(game['Seconds']):
-        if secs < 1800:
-            continue
-        lead : int = abs(game["Away_Score"][i] - game["Home_Score"][i])
-        # to prevent it from constantly switching back at the edge
-        # the lead needs to be below 10 is we are going to unswitch the
-        # measure
-        if lead > 10 and game["is_Garbage_Time"][i - 1]:
-            game.at[i, "is_Garbage_Time"] = True
-        elif lead > 15 and lead > (((2400 - secs) // 20) + 1):
-            game.at[i, "is_Garbage_Time"] = True
+    secs : np.ndarray = game['Seconds'].to_numpy(dtype=np.float64)
+    lead : np.ndarray = np.abs(game["Away_Score"].to_numpy(dtype=np.int64) -
+                               game["Home_Score"].to_numpy(dtype=np.int64))
+    late : np.ndarray = secs >= 1800
+    starts : np.ndarray = late & (lead > 15) & (lead > ((2400 - secs) // 20) + 1)
+    # to prevent it from constantly switching back at the edge the lead needs to
+    # be below 10 if we are going to unswitch the measure, so once it starts it
+    # holds for as long as the lead stays above 10
+    holds : np.ndarray = late & (lead > 10)
+    rows : np.ndarray = np.arange(len(game))
+    last_start : np.ndarray = np.maximum.accumulate(np.where(starts, rows, -1))
+    last_break : np.ndarray = np.maximum.accumulate(np.where(holds, -1, rows))
+    game["is_Garbage_Time"] = holds & (last_start > last_break)
     return game
 
-def scrape_game(game_id : int) -> pd.DataFrame:
-    url : str = f"https://stats.ncaa.org/contests/{game_id}/play_by_play"
-    site_content : io.StringIO = get_site(url)
-    dataframes: List[pd.DataFrame] = pd.read_html(site_content)
+# Clock, scores and garbage time, the steps both scrape modes end with
+def _finish_game(game_id : int, game : pd.DataFrame, score_table : pd.DataFrame) -> pd.DataFrame:
+    game = _game_seconds(game)
+    game = _score_split(game)
+    game.drop("Score", axis=1, inplace=True)
+    game["Id"] = game_id
+    game = _fix_glitch(score_table, game)
+    return _is_garbage(game)
+
+
+# Columns of a full game, in order
+GAME_COLUMNS : List[str] = [
+    "Period", "Time", "Seconds", "Away_Score", "Home_Score", "Event",
+    "Player", "Player_2", "Event_2", "Possession", "Poss_Count",
+    "Shot_Value", "Shot_Type", "Made", "is_Transition", "is_Paint",
+    "2nd_Chance", "is_Garbage_Time", "Away_1", "Away_2", "Away_3", "Away_4", "Away_5",
+    "Home_1", "Home_2", "Home_3", "Home_4", "Home_5", "Id"
+]
+
+# Columns of a game scraped with mode="possessions"
+POSSESSION_COLUMNS : List[str] = [
+    "Period", "Time", "Seconds", "Away_Score", "Home_Score", "Event", "Player",
+    "Possession", "Poss_Count", "is_Garbage_Time", "Id"
+]
+
+
+# Lineups are kept as ids the whole way through. Without a registry they're expanded to
+# the ten name columns at the end, with one the game keeps Away_Lineup/Home_Lineup ids
+# from that registry instead, which is what season long lineup work should pass in.
+# Pages come through the planner, pass one in to share pages and tables with
+# whatever else is being built for the same games.
+# mode="possessions" only builds what points per possession needs (POSSESSION_COLUMNS):
+# no lineups, so the individual stats page is never fetched, no Player_2/Event_2 and no
+# shot columns. Scores, possessions and garbage time come out the same as the full game.
+# Pass the season's SeasonDictionary as dictionary to get the game in the compact schema
+# (see compact_schema.py), for holding a lot of games in memory
+@metrics.timed("scrape_game")
+def scrape_game(game_id : int, registry : LineupRegistry = None, planner : FetchPlanner = None,
+                mode : str = "full", dictionary : SeasonDictionary = None) -> pd.DataFrame:
+    if mode not in ("full", "possessions"):
+        raise ValueError(f"Unknown scrape mode {mode}")
+    if planner is None:
+        planner = FetchPlanner(keep=1)
+    dataframes: List[pd.DataFrame] = planner.tables(game_id, "play_by_play")
 
     # Add a halves column here because it's easier, even if it is improper
     for i, df in enumerate(dataframes[3:]):
@@ -451,32 +572,40 @@ def scrape_game(game_id : int) -> pd.DataFrame:
         print(f"Play by play for game {game_id} not logged, scraping box score")
         return pd.DataFrame()
     game.reset_index(drop=True, inplace=True)
-    game = _build_lineups(game_id, game)
-    game = _score_split(game)
+    if mode == "possessions":
+        game = _substitutions(game)
+        game = _event_sorter(game)
+        game = _packed_rows_dropped(game)
+        game = _poss_former(game, teams)
+        game = _finish_game(game_id, game, dataframes[1])[POSSESSION_COLUMNS]
+        return game if dictionary is None else to_compact(game, dictionary)
+    compact : bool = registry is not None
+    if not compact:
+        registry = LineupRegistry()
+    game = _build_lineups(game_id, game, registry, planner)
     game = _event_sorter(game)
     game = _event_packer(game)
     game = _poss_former(game, teams)
     game = _shot_splitter(game)
-    game = _game_seconds(game)
-    game = _score_split(game)
-    game.drop("Score", axis=1, inplace=True)
-    game["Id"] = game_id
-    game = _fix_glitch(dataframes[1], game)
-    game = _is_garbage(game)
+    game = _finish_game(game_id, game, dataframes[1])
 
-    desired_order : List[str] = [
-        "Period", "Time", "Seconds", "Away_Score", "Home_Score", "Event",
-        "Player", "Player_2", "Event_2", "Possession", "Poss_Count",
-        "Shot_Value", "Shot_Type", "Made", "is_Transition", "is_Paint",
-        "2nd_Chance", "is_Garbage_Time", "Away_1", "Away_2", "Away_3", "Away_4", "Away_5",
-        "Home_1", "Home_2", "Home_3", "Home_4", "Home_5", "Id"
-    ]
+    desired_order : List[str] = GAME_COLUMNS
+
+    if compact:
+        desired_order = desired_order[:18] + ["Away_Lineup", "Home_Lineup", "Id"]
+    else:
+        game = expand_lineups(game, registry)
 
     # Rearrange columns
     game = game[desired_order]
-    return game
-
-
-
+    return game if dictionary is None else to_compact(game, dictionary)
 
 
+# scrape_game on pages that were already downloaded (page name -> html, see
+# fetch_planner.PAGES). Nothing here touches the network if every page it needs is given
+def parse_game(game_id : int, pages : Dict[str, str], registry : LineupRegistry = None,
+               mode : str = "full", dictionary : SeasonDictionary = None) -> pd.DataFrame:
+    planner : FetchPlanner = FetchPlanner(keep=1)
+    for name, page in pages.items():
+        planner.add(game_id, name, page)
+    return scrape_game(game_id, registry, planner, mode, dictionary)
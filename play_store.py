@@ -0,0 +1,153 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from datetime import date
+from typing import List, Optional
+from compact_schema import SeasonDictionary, to_compact, from_compact, KINDS
+from game_store import GameStore, season_of
+from play_by_play import GAME_COLUMNS
+
+# Season and Date come from the directories like in the game store, Id too since every
+# game is its own file
+PARTITIONING : ds.Partitioning = ds.partitioning(pa.schema([
+    ("Season", pa.string()),
+    ("Date", pa.date32()),
+    ("Id", pa.int64())
+]), flavor="hive")
+
+# The compact schema (see compact_schema.py), text as dictionaries local to each file
+_TEXT : pa.DataType = pa.dictionary(pa.int32(), pa.string())
+FILE_SCHEMA : pa.Schema = pa.schema([
+    ("Period", pa.int8()),
+    ("Time", _TEXT),
+    ("Seconds", pa.float32()),
+    ("Away_Score", pa.int16()),
+    ("Home_Score", pa.int16()),
+    ("Event", _TEXT),
+    ("Player", _TEXT),
+    ("Player_2", _TEXT),
+    ("Event_2", _TEXT),
+    ("Possession", _TEXT),
+    ("Poss_Count", pa.int16()),
+    ("Shot_Value", pa.int8()),
+    ("Shot_Type", _TEXT),
+    ("Made", pa.int8()),
+    ("is_Transition", pa.int8()),
+    ("is_Paint", pa.int8()),
+    ("2nd_Chance", pa.int8()),
+    ("is_Garbage_Time", pa.bool_())
+] + [(f"{side}_{n}", _TEXT) for side in ["Away", "Home"] for n in range(1, 6)])
+
+_PANDAS_TYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int64(): pd.Int64Dtype()
+}
+
+
+# A full game as one arrow ipc file, what ends up on disk. Plain bytes so it can be built
+# in a worker process and written from the main one
+def encode_game(game : pd.DataFrame) -> bytes:
+    if list(game.columns) != GAME_COLUMNS:
+        raise ValueError("Only full games (scrape_game without a registry) go in the play store")
+    compact : pd.DataFrame = to_compact(game, SeasonDictionary())
+    arrays : List[pa.Array] = []
+    for field in FILE_SCHEMA:
+        column : pd.Series = compact[field.name]
+        if field.name in KINDS:
+            codes : np.ndarray = column.cat.codes.to_numpy(dtype=np.int32)
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0),
+                pa.array(column.cat.categories.tolist(), type=pa.string())))
+        else:
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+    sink : io.BytesIO = io.BytesIO()
+    with pa.ipc.new_file(sink, FILE_SCHEMA) as writer:
+        writer.write_table(pa.Table.from_arrays(arrays, schema=FILE_SCHEMA))
+    return sink.getvalue()
+
+
+'''
+Every fully parsed game of a season, so player, lineup and shot work doesn't need the games
+scraped again. Each game is one uncompressed arrow file under
+root/Season=.../Date=.../Id=.../, which is opened memory mapped: a read only touches the
+partitions its filters leave, and only the pages of those files that are actually used
+get loaded, so a team or a week never costs the whole season
+'''
+class PlayStore:
+    def __init__(self, root : str):
+        self.root = root
+
+    def _partition(self, day : date, game_id : int) -> str:
+        return os.path.join(self.root, f"Season={season_of(day)}", f"Date={day.isoformat()}", f"Id={game_id}")
+
+    # payload is what encode_game gave for the game
+    def write_encoded(self, day : date, game_id : int, payload : bytes) -> None:
+        directory : str = self._partition(day, int(game_id))
+        os.makedirs(directory, exist_ok=True)
+        # write then rename so a crash never leaves half a file behind
+        temp : str = os.path.join(directory, ".part-0.arrow.tmp")
+        with open(temp, "wb") as file:
+            file.write(payload)
+        os.replace(temp, os.path.join(directory, "part-0.arrow"))
+
+    def write_game(self, day : date, game : pd.DataFrame) -> None:
+        self.write_encoded(day, int(game["Id"].iloc[0]), encode_game(game))
+
+    # Days of a season with games in the store, from the directory names alone
+    def days(self, season : str) -> List[date]:
+        season_dir : str = os.path.join(self.root, f"Season={season}")
+        if not os.path.isdir(season_dir):
+            return []
+        return sorted(date.fromisoformat(name.split("=", 1)[1]) for name in os.listdir(season_dir)
+                      if name.startswith("Date="))
+
+    # The whole store memory mapped, for going through it with pyarrow directly
+    def dataset(self) -> Optional[ds.Dataset]:
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(os.path.abspath(self.root), format="ipc", partitioning=PARTITIONING,
+                          filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+    '''
+    Games back in the columns scrape_game gives them with a Date column in front, in date
+    and then game order. The filters are pushed down to the partitions, so game_ids and
+    dates never open a file they don't need. With a dictionary the games come back in the
+    compact schema over that dictionary instead
+    '''
+    def read(self, season : str = None, start : date = None, end : date = None, game_ids : List[int] = None,
+             dictionary : SeasonDictionary = None) -> pd.DataFrame:
+        dataset : ds.Dataset = self.dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=["Date"] + GAME_COLUMNS)
+        conditions : List[ds.Expression] = []
+        if season is not None:
+            conditions.append(ds.field("Season") == season)
+        if start is not None:
+            conditions.append(ds.field("Date") >= start)
+        if end is not None:
+            conditions.append(ds.field("Date") <= end)
+        if game_ids is not None:
+            conditions.append(ds.field("Id").isin([int(game_id) for game_id in game_ids]))
+        condition : ds.Expression = None
+        for part in conditions:
+            condition = part if condition is None else condition & part
+        table : pa.Table = dataset.to_table(filter=condition)
+        games : pd.DataFrame = table.to_pandas(types_mapper=_PANDAS_TYPES.get)
+        games = games.sort_values(["Date", "Id"], kind="stable").reset_index(drop=True)
+        games = games[["Date"] + GAME_COLUMNS]
+        if dictionary is not None:
+            return to_compact(games, dictionary)
+        return from_compact(games)
+
+    # Every game one team played in [start, end], the game store says which ones those were
+    def team(self, store : GameStore, team_id : int, season : str = None, start : date = None,
+             end : date = None, dictionary : SeasonDictionary = None) -> pd.DataFrame:
+        games : pd.DataFrame = store.read(season=season, start=start, end=end)
+        played : pd.Series = (games["Home_id"] == team_id) | (games["Away_id"] == team_id)
+        game_ids : List[int] = games.loc[played.fillna(False), "Game_id"].dropna().astype(int).unique().tolist()
+        return self.read(season, start, end, game_ids, dictionary)
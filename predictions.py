@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from datetime import date, timedelta
+from typing import List
+from day_trawler import day_scores
+from get_site import polite_sleep
+from rank_engine import Ratings, HOME_ADJ, ROUND_PRECISION
+
+TEMPO : float = 68.0 # possessions a game when nothing better is known
+MARGIN_SD : float = 11.0 # points, how far real margins land from the predicted one
+
+
+'''
+How many possessions each team's games have. The store only keeps scores and ppps, so a
+game's possessions are worked out as score / ppp for each side and averaged, which runs a
+little high in games with garbage time (the ppps stop counting there, the scores don't).
+Team ids are sorted like Ratings.team_ids
+'''
+class Tempo:
+    def __init__(self, team_ids : np.ndarray, possessions : np.ndarray, average : float):
+        self.team_ids = team_ids
+        self.possessions = possessions
+        self.average = average
+
+
+def tempo(games : pd.DataFrame) -> Tempo:
+    games = games.dropna(subset=["Home_id", "Away_id", "Home_Score", "Away_Score", "Home_ppp", "Away_ppp"])
+    games = games[(games["Home_ppp"] > 0) & (games["Away_ppp"] > 0)]
+    possessions : np.ndarray = (games["Home_Score"].to_numpy(dtype=np.float64) / games["Home_ppp"].to_numpy(dtype=np.float64) +
+                                games["Away_Score"].to_numpy(dtype=np.float64) / games["Away_ppp"].to_numpy(dtype=np.float64)) / 2
+    team_ids, index = np.unique(np.concatenate([games["Home_id"].to_numpy(dtype=np.int64),
+                                                games["Away_id"].to_numpy(dtype=np.int64)]), return_inverse=True)
+    played : np.ndarray = np.bincount(index, minlength=len(team_ids))
+    total : np.ndarray = np.bincount(index, np.concatenate([possessions, possessions]), len(team_ids))
+    average : float = float(possessions.mean()) if len(possessions) else TEMPO
+    return Tempo(team_ids, total / np.maximum(played, 1), average)
+
+
+# Where each id sits in the sorted team_ids, len(team_ids) for teams that aren't there
+def _lookup(team_ids : np.ndarray, ids : pd.Series) -> np.ndarray:
+    wanted : np.ndarray = pd.to_numeric(ids, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    known : np.ndarray = ~np.isnan(wanted)
+    wanted = np.where(known, wanted, -1).astype(np.int64)
+    index : np.ndarray = np.searchsorted(team_ids, wanted).clip(max=max(len(team_ids) - 1, 0))
+    found : np.ndarray = known & (len(team_ids) > 0)
+    if len(team_ids):
+        found &= team_ids[index] == wanted
+    return np.where(found, index, len(team_ids))
+
+
+'''
+Predictions for every game in games (a day_scores frame, or any number of them stacked,
+Upcoming or not) from the ratings, all at once. A side's ppp is the same model the ranker
+fits, its ADJO times the other side's ADJD times the location factor (1.014 at home, .986
+away, 1 on a neutral floor), the possessions are both teams' tempos over the average and
+the win probability treats the margin as normal around the prediction with margin_sd.
+Games with a team that has no rating (non D1 opponents for a D1 ranking) get NaN.
+Adds Pred_Home_ppp, Pred_Away_ppp, Pred_Poss, Pred_Home_Score, Pred_Away_Score,
+Pred_Margin (home minus away) and Home_Win_Prob
+'''
+def predict(games : pd.DataFrame, ratings : Ratings, tempos : Tempo = None,
+            margin_sd : float = MARGIN_SD) -> pd.DataFrame:
+    adj_o : np.ndarray = np.append(ratings.adj_o, np.nan)
+    adj_d : np.ndarray = np.append(ratings.adj_d, np.nan)
+    home : np.ndarray = _lookup(ratings.team_ids, games["Home_id"])
+    away : np.ndarray = _lookup(ratings.team_ids, games["Away_id"])
+    loc : np.ndarray = np.where(games["Home_Team"].eq(games["Location"]).fillna(False).to_numpy(dtype=bool),
+                                HOME_ADJ, 1.0)
+    home_ppp : np.ndarray = adj_o[home] * adj_d[away] * loc
+    away_ppp : np.ndarray = adj_o[away] * adj_d[home] * (2 - loc)
+
+    if tempos is None:
+        possessions : np.ndarray = np.full(len(games), TEMPO)
+    else:
+        pace : np.ndarray = np.append(tempos.possessions, tempos.average)
+        possessions = pace[_lookup(tempos.team_ids, games["Home_id"])] * \
+            pace[_lookup(tempos.team_ids, games["Away_id"])] / tempos.average
+    margin : np.ndarray = (home_ppp - away_ppp) * possessions
+
+    predicted : pd.DataFrame = games.copy()
+    predicted["Pred_Home_ppp"] = np.round(home_ppp, ROUND_PRECISION)
+    predicted["Pred_Away_ppp"] = np.round(away_ppp, ROUND_PRECISION)
+    predicted["Pred_Poss"] = np.round(possessions, 1)
+    predicted["Pred_Home_Score"] = np.round(home_ppp * possessions, 1)
+    predicted["Pred_Away_Score"] = np.round(away_ppp * possessions, 1)
+    predicted["Pred_Margin"] = np.round(margin, 1)
+    predicted["Home_Win_Prob"] = np.round(ndtr(margin / margin_sd), ROUND_PRECISION)
+    return predicted
+
+
+# How far finished games actually landed from predict, in points. A better margin_sd for
+# predict than the default once there's a season of games to look at
+def margin_sd(games : pd.DataFrame, ratings : Ratings, tempos : Tempo = None) -> float:
+    predicted : pd.DataFrame = predict(games, ratings, tempos)
+    actual : np.ndarray = (pd.to_numeric(predicted["Home_Score"], errors="coerce") -
+                           pd.to_numeric(predicted["Away_Score"], errors="coerce")).to_numpy(dtype=np.float64, na_value=np.nan)
+    errors : np.ndarray = actual - (predicted["Pred_Home_Score"] - predicted["Pred_Away_Score"]).to_numpy(dtype=np.float64)
+    errors = errors[~np.isnan(errors)]
+    return float(np.sqrt(np.mean(errors ** 2))) if len(errors) else MARGIN_SD
+
+
+# Every game still to be played between start and end (inclusive) in a division, off the scoreboards
+def upcoming(start : date, end : date, women : bool = False, division : int = 1) -> pd.DataFrame:
+    sport_code : str = "WBB" if women else "MBB"
+    days : List[pd.DataFrame] = []
+    while start <= end:
+        day : pd.DataFrame = day_scores(start, sport_code, division)
+        if not day.empty:
+            days.append(day[day["Status"] == "Upcoming"])
+        start += timedelta(days=1)
+        polite_sleep()
+    if not days:
+        return pd.DataFrame()
+    return pd.concat(days, ignore_index=True)
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+
+
+ROUND_PRECISION : int = 4
+HOME_ADJ : float = 1.014 # away teams get the mirror of this, 2 - 1.014 = .986
+TOLERANCE : float = 1e-6
+MAX_ITERATIONS : int = 500
+
+
+'''
+The schedule is the game table flattened into edge arrays. Every game is stored once
+as a home index, away index, both ppps and the home location factor (1.014 for a true
+home game, 1 for neutral sites). Team indices point into team_ids/names, which are sorted
+by team id so two schedules over the same teams always line up.
+'''
+class Schedule:
+    def __init__(self, team_ids : np.ndarray, names : List[str], home : np.ndarray,
+                 away : np.ndarray, home_ppp : np.ndarray, away_ppp : np.ndarray,
+                 home_loc : np.ndarray):
+        self.team_ids = team_ids
+        self.names = names
+        self.home = home
+        self.away = away
+        self.home_ppp = home_ppp
+        self.away_ppp = away_ppp
+        self.home_loc = home_loc
+
+    @classmethod
+    def from_games(cls, games : pd.DataFrame) -> "Schedule":
+        games = games.dropna(subset=["Home_ppp", "Away_ppp"]) # band aid fix till I figure out whats going on here
+        home_ids : np.ndarray = games["Home_id"].to_numpy(dtype=np.int64)
+        away_ids : np.ndarray = games["Away_id"].to_numpy(dtype=np.int64)
+        team_ids, index = np.unique(np.concatenate([home_ids, away_ids]), return_inverse=True)
+
+        # a team keeps the first name it was listed under, away teams are listed first
+        listed = pd.DataFrame({
+            "id": np.column_stack([away_ids, home_ids]).ravel(),
+            "name": np.column_stack([games["Away_Team"].to_numpy(), games["Home_Team"].to_numpy()]).ravel()
+        })
+        names : pd.Series = listed.drop_duplicates(subset="id").set_index("id")["name"]
+
+        home_loc : np.ndarray = np.where(games["Home_Team"].to_numpy() == games["Location"].to_numpy(),
+                                         HOME_ADJ, 1.0)
+        return cls(team_ids, names.reindex(team_ids).tolist(), index[:len(games)], index[len(games):],
+                   games["Home_ppp"].to_numpy(dtype=np.float64),
+                   games["Away_ppp"].to_numpy(dtype=np.float64), home_loc)
+
+    def __len__(self) -> int:
+        return len(self.home)
+
+
+class Ratings:
+    def __init__(self, team_ids : np.ndarray, names : List[str], adj_o : np.ndarray,
+                 adj_d : np.ndarray, iterations : int = 0):
+        self.team_ids = team_ids
+        self.names = names
+        self.adj_o = adj_o
+        self.adj_d = adj_d
+        self.iterations = iterations
+
+    # Same layout _rank_them has always returned
+    def to_frame(self) -> pd.DataFrame:
+        results : pd.DataFrame = pd.DataFrame({
+            "Team": self.names,
+            "ADJO": np.round(self.adj_o, ROUND_PRECISION),
+            "ADJD": np.round(self.adj_d, ROUND_PRECISION)
+        })
+        results["ADJ_EM"] = np.round(results["ADJO"] - results["ADJD"], ROUND_PRECISION)
+        results = results.sort_values(by='ADJ_EM', ascending=False)
+        return results.reset_index(drop=True)
+
+
+# Ratings are only defined up to a scale, multiplying every offense by k and dividing
+# every defense by k predicts the exact same games. We pin it by making the average
+# offense and average defense (weighted by games played) equal
+def normalize(adj_o : np.ndarray, adj_d : np.ndarray, played : np.ndarray) -> None:
+    scale : float = np.sqrt(np.dot(played, adj_o) / np.dot(played, adj_d))
+    adj_o /= scale
+    adj_d *= scale
+
+
+'''
+Solves for adjusted offense and defense. Each team plays both sides of every game, so the
+edges are doubled into (team, opponent, ppp scored, ppp allowed, location) arrays, and
+one iteration is just two weighted bincounts:
+    ADJO[t] = mean(ppp scored / (ADJD[opp] * loc))
+    ADJD[t] = mean(ppp allowed / (ADJO[opp] * (2 - loc)))
+which is the same adjustment the old per game loops did, done for every game at once.
+Iterates until no rating moves more than tol. A previous Ratings can be passed as start
+to warm start the solve, teams it doesn't know about start from their raw ppp.
+'''
+def solve(schedule : Schedule, tol : float = TOLERANCE, max_iter : int = MAX_ITERATIONS,
+          start : Ratings = None) -> Ratings:
+    n_teams : int = len(schedule.team_ids)
+    team : np.ndarray = np.concatenate([schedule.home, schedule.away])
+    opp : np.ndarray = np.concatenate([schedule.away, schedule.home])
+    scored : np.ndarray = np.concatenate([schedule.home_ppp, schedule.away_ppp])
+    allowed : np.ndarray = np.concatenate([schedule.away_ppp, schedule.home_ppp])
+    loc : np.ndarray = np.concatenate([schedule.home_loc, 2 - schedule.home_loc])
+    played : np.ndarray = np.bincount(team, minlength=n_teams).astype(np.float64)
+    if n_teams == 0:
+        return Ratings(schedule.team_ids, schedule.names, np.empty(0), np.empty(0))
+
+    adj_o : np.ndarray = np.bincount(team, scored, n_teams) / played
+    adj_d : np.ndarray = np.bincount(team, allowed, n_teams) / played
+    if start is not None and len(start.team_ids):
+        # both id arrays are sorted, so matching teams is a binary search
+        known : np.ndarray = np.searchsorted(start.team_ids, schedule.team_ids).clip(max=len(start.team_ids) - 1)
+        found : np.ndarray = start.team_ids[known] == schedule.team_ids
+        adj_o[found] = start.adj_o[known[found]]
+        adj_d[found] = start.adj_d[known[found]]
+    normalize(adj_o, adj_d, played)
+
+    iterations : int = 0
+    while iterations < max_iter:
+        iterations += 1
+        new_o : np.ndarray = np.bincount(team, scored / (adj_d[opp] * loc), n_teams) / played
+        new_d : np.ndarray = np.bincount(team, allowed / (new_o[opp] * (2 - loc)), n_teams) / played
+        normalize(new_o, new_d, played)
+        delta : float = max(np.abs(new_o - adj_o).max(), np.abs(new_d - adj_d).max())
+        adj_o, adj_d = new_o, new_d
+        if delta < tol:
+            break
+    return Ratings(schedule.team_ids, schedule.names, adj_o, adj_d, iterations)
+
+
+# Identifies the exact set of games a schedule was built from, so saved ratings
+# can tell whether they are still current. Game order doesn't matter
+def fingerprint(schedule : Schedule) -> str:
+    games : np.ndarray = np.column_stack([
+        schedule.team_ids[schedule.home].astype(np.float64),
+        schedule.team_ids[schedule.away].astype(np.float64),
+        schedule.home_ppp, schedule.away_ppp, schedule.home_loc
+    ])
+    games = games[np.lexsort(games.T[::-1])]
+    return hashlib.sha1(np.ascontiguousarray(games).tobytes()).hexdigest()
+
+
+def save_ratings(file : str, ratings : Ratings, stamp : str) -> None:
+    np.savez(file, team_ids=ratings.team_ids, names=np.array(ratings.names, dtype=str),
+             adj_o=ratings.adj_o, adj_d=ratings.adj_d, fingerprint=stamp)
+
+
+def load_ratings(file : str) -> Tuple[Ratings, str]:
+    with np.load(file) as saved:
+        ratings : Ratings = Ratings(saved["team_ids"], saved["names"].tolist(),
+                                    saved["adj_o"], saved["adj_d"])
+        return ratings, str(saved["fingerprint"])
+
+
+'''
+Incremental version of solve for the daily job. The last converged ratings are kept in
+file along with the fingerprint of the games they came from. If nothing changed they're
+returned as is, otherwise they're used as the starting point so only the iterations needed
+to take in the new games are run. Since the scale is pinned the answer is the same as a
+cold solve, up to tol.
+'''
+def solve_incremental(schedule : Schedule, file : str, tol : float = TOLERANCE,
+                      max_iter : int = MAX_ITERATIONS) -> Ratings:
+    stamp : str = fingerprint(schedule)
+    start : Ratings = None
+    if os.path.exists(file):
+        try:
+            start, saved_stamp = load_ratings(file)
+        except (OSError, ValueError, KeyError):
+            start, saved_stamp = None, ""  # unreadable state just means a cold start
+        if start is not None and saved_stamp == stamp and \
+                np.array_equal(start.team_ids, schedule.team_ids):
+            return start
+    ratings : Ratings = solve(schedule, tol, max_iter, start)
+    save_ratings(file, ratings, stamp)
+    return ratings
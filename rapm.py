@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator, cg
+from datetime import date
+from typing import Iterator, List, Tuple, Union
+from lineups import LineupRegistry
+from lineup_stats import intern_lineups, _side_rows
+from play_store import PlayStore
+from rank_engine import ROUND_PRECISION
+
+ALPHA : float = 2000.0 # ridge penalty, in possessions. Bigger pulls players with few possessions harder to 0
+TOLERANCE : float = 1e-8 # relative residual the conjugate gradient stops at
+MAX_ITERATIONS : int = 2000
+
+
+'''
+Regularized adjusted plus minus for every player in the registry, split into offense and
+defense. Games are collapsed into stints (runs with the same ten players on the court) and
+every stint gives two rows, one per side with the ball: that side's points per possession,
+weighted by its possessions, explained as
+    league average + offense of the five with the ball + defense of the five without + home
+Every row only has eleven nonzeros, so the players by stints design matrix is kept sparse
+and the ridge system (X'WX + alpha I) b = X'Wy is solved with conjugate gradient without
+ever forming X'WX, memory only grows with the stints. Add each day's games and solve again
+and the solve starts from the last answer, which is most of the way there already.
+ORAPM is points per 100 possessions added on offense, DRAPM points per 100 taken away on
+defense (positive is good for both)
+'''
+class RAPM:
+    def __init__(self, registry : LineupRegistry = None, alpha : float = ALPHA, garbage_time : bool = False):
+        self.registry = registry if registry is not None else LineupRegistry()
+        self.alpha = alpha
+        self.garbage_time = garbage_time
+        # one entry per add_games call, stacked when solving
+        self.offense : List[np.ndarray] = [] # (stints, 5) player ids
+        self.defense : List[np.ndarray] = []
+        self.home : List[np.ndarray] = []
+        self.points : List[np.ndarray] = []
+        self.possessions : List[np.ndarray] = []
+        self.coef : np.ndarray = np.empty(0) # offense of every player, then defense, then home
+        self.iterations : int = 0
+
+    def __len__(self) -> int:
+        return sum(len(points) for points in self.points)
+
+    # Games with registry lineup ids (from the same registry) or the ten name columns
+    def add_games(self, games : Union[pd.DataFrame, List[pd.DataFrame]]) -> None:
+        if isinstance(games, list):
+            games = pd.concat(games, ignore_index=True) if games else pd.DataFrame()
+        if games.empty:
+            return
+        games = games.reset_index(drop=True)
+        if "Away_Lineup" not in games:
+            games = intern_lineups(games, self.registry)
+        rows : pd.DataFrame = _side_rows(games, self.registry, self.garbage_time)
+        rows = rows[rows["Opponent"] >= 0]
+        stints : pd.DataFrame = rows.groupby(["Stint", "Lineup", "Opponent", "Home"], sort=False)[
+            ["Poss_For", "Pts_For"]].sum().reset_index()
+        stints = stints[stints["Poss_For"] > 0]
+        offense : np.ndarray = self.registry.players_of(stints["Lineup"].to_numpy())
+        defense : np.ndarray = self.registry.players_of(stints["Opponent"].to_numpy())
+        full : np.ndarray = (offense >= 0).all(axis=1) & (defense >= 0).all(axis=1)
+        self.offense.append(offense[full])
+        self.defense.append(defense[full])
+        self.home.append(stints["Home"].to_numpy(dtype=np.float64)[full])
+        self.points.append(stints["Pts_For"].to_numpy(dtype=np.float64)[full])
+        self.possessions.append(stints["Poss_For"].to_numpy(dtype=np.float64)[full])
+
+    # Previous coefficients lined up with the current columns, new players start at 0
+    def _start(self, n_players : int) -> np.ndarray:
+        start : np.ndarray = np.zeros(2 * n_players + 1)
+        known : int = (len(self.coef) - 1) // 2
+        if known > 0:
+            start[:known] = self.coef[:known]
+            start[n_players:n_players + known] = self.coef[known:2 * known]
+            start[-1] = self.coef[-1]
+        return start
+
+    def solve(self, tol : float = TOLERANCE, max_iter : int = MAX_ITERATIONS) -> pd.DataFrame:
+        n_players : int = len(self.registry.player_names)
+        offense : np.ndarray = np.concatenate(self.offense) if self.offense else np.empty((0, 5), dtype=np.int64)
+        defense : np.ndarray = np.concatenate(self.defense) if self.defense else np.empty((0, 5), dtype=np.int64)
+        home : np.ndarray = np.concatenate(self.home) if self.home else np.empty(0)
+        points : np.ndarray = np.concatenate(self.points) if self.points else np.empty(0)
+        weight : np.ndarray = np.concatenate(self.possessions) if self.possessions else np.empty(0)
+        stints : int = len(points)
+
+        columns : np.ndarray = np.column_stack([offense, defense + n_players, np.full(stints, 2 * n_players)])
+        values : np.ndarray = np.column_stack([np.ones((stints, 10)), home])
+        design : sp.csr_matrix = sp.csr_matrix((values.ravel(), (np.repeat(np.arange(stints), 11), columns.ravel())),
+                                               shape=(stints, 2 * n_players + 1))
+        average : float = points.sum() / weight.sum() if stints else 0.0
+        target : np.ndarray = points / np.maximum(weight, 1) - average
+
+        system : LinearOperator = LinearOperator(
+            (design.shape[1], design.shape[1]), dtype=np.float64,
+            matvec=lambda coef: design.T @ (weight * (design @ coef)) + self.alpha * coef)
+        # the diagonal of the system, dividing by it evens out players with a lot and a few possessions
+        diagonal : np.ndarray = design.power(2).T @ weight + self.alpha
+        scaling : LinearOperator = LinearOperator(system.shape, dtype=np.float64, matvec=lambda coef: coef / diagonal)
+        steps : List[int] = [0]
+        self.coef, _ = cg(system, design.T @ (weight * target), x0=self._start(n_players), rtol=tol,
+                          maxiter=max_iter, M=scaling, callback=lambda _: steps.__setitem__(0, steps[0] + 1))
+        self.iterations = steps[0]
+        return self.ratings(offense, defense, weight)
+
+    def ratings(self, offense : np.ndarray, defense : np.ndarray, weight : np.ndarray) -> pd.DataFrame:
+        n_players : int = len(self.registry.player_names)
+        o_poss : np.ndarray = np.bincount(offense.ravel(), np.repeat(weight, 5), n_players)
+        d_poss : np.ndarray = np.bincount(defense.ravel(), np.repeat(weight, 5), n_players)
+        results : pd.DataFrame = pd.DataFrame({
+            "Player": self.registry.player_names,
+            "Team": self.registry.player_teams,
+            "O_Poss": o_poss.astype(np.int64),
+            "D_Poss": d_poss.astype(np.int64),
+            "ORAPM": np.round(self.coef[:n_players] * 100, ROUND_PRECISION),
+            "DRAPM": np.round(-self.coef[n_players:2 * n_players] * 100, ROUND_PRECISION)
+        })
+        results["RAPM"] = np.round(results["ORAPM"] + results["DRAPM"], ROUND_PRECISION)
+        results = results[results["O_Poss"] + results["D_Poss"] > 0]
+        results = results.sort_values(by="RAPM", ascending=False)
+        return results.reset_index(drop=True)
+
+    # What playing at home is worth, points per 100 possessions
+    def home_advantage(self) -> float:
+        return float(self.coef[-1] * 100) if len(self.coef) else 0.0
+
+
+'''
+RAPM as of every day of a season in the play store, one (day, ratings) after each day's
+games are added. Every solve is warm started from the day before, and a day's games are
+the only ones read from the store
+'''
+def daily_rapm(plays : PlayStore, season : str, start : date = None, end : date = None,
+               **options) -> Iterator[Tuple[date, pd.DataFrame]]:
+    model : RAPM = RAPM(**options)
+    for day in plays.days(season):
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        model.add_games(plays.read(season, day, day))
+        yield day, model.solve()
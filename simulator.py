@@ -0,0 +1,252 @@
+import multiprocessing
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Union
+from predictions import predict, _lookup, Tempo, MARGIN_SD
+from rank_engine import Ratings, ROUND_PRECISION
+
+SIMULATIONS : int = 100000
+CHUNK : int = 25000 # simulations drawn together, each chunk gets its own seed
+BLOCK : int = 2000 # simulations a season chunk plays at once, draws are games * BLOCK floats
+
+
+'''
+A single elimination bracket as its first round slots, left to right, so slots 0 and 1
+play, the winner meets the winner of 2 and 3 and so on. There are always a power of two
+slots, None is a bye: whoever is across from it goes through without playing. Teams are
+their ids, team_ids is every one of them sorted and slots points into it (a bye points one
+past the end). event is the scoreboard Event its games are played under, which is how
+simulate_bracket tells its finished games from the rest of the season's
+'''
+class Bracket:
+    def __init__(self, slots : List[Optional[int]], event : str = None):
+        if len(slots) < 2 or len(slots) & (len(slots) - 1):
+            raise ValueError(f"A bracket needs a power of two slots, not {len(slots)}")
+        self.team_ids : np.ndarray = np.unique([int(team) for team in slots if team is not None])
+        bye : int = len(self.team_ids)
+        self.slots : np.ndarray = np.array([bye if team is None else np.searchsorted(self.team_ids, int(team))
+                                            for team in slots], dtype=np.int64)
+        self.rounds : int = len(slots).bit_length() - 1
+        self.event = event
+
+    # From nested pairs, [[a, b], [[c, d], e]] has c and d play for the spot against e. Teams
+    # that start deeper in get byes until everyone else has caught up
+    @classmethod
+    def from_tree(cls, tree : Union[list, tuple, int, None], event : str = None) -> "Bracket":
+        def depth(node) -> int:
+            return 1 + max(depth(node[0]), depth(node[1])) if isinstance(node, (list, tuple)) else 0
+
+        def leaves(node, levels : int) -> List[Optional[int]]:
+            if isinstance(node, (list, tuple)):
+                return leaves(node[0], levels - 1) + leaves(node[1], levels - 1)
+            return [node] + [None] * (2 ** levels - 1)
+        return cls(leaves(tree, depth(tree)), event)
+
+    # team_ids best seed first, laid out the usual way (1 v 16, 8 v 9, ...). When there aren't
+    # a power of two of them the missing seeds are byes, so the top seeds skip the first round
+    @classmethod
+    def seeded(cls, team_ids : List[int], event : str = None) -> "Bracket":
+        size : int = 2
+        while size < len(team_ids):
+            size *= 2
+        order : List[int] = [1]
+        while len(order) < size:
+            order = [seed for top in order for seed in (top, 2 * len(order) + 1 - top)]
+        return cls([team_ids[seed - 1] if seed <= len(team_ids) else None for seed in order], event)
+
+
+'''
+The bracket of a tournament off its scoreboard games, every game with Event == event
+(what _event_location pulls out of the scoreboard). Teams are placed by the seeds printed
+next to their names, so every seed from 1 to the last has to be on the games passed in.
+Top seeds with byes only show up once they play, until then build the bracket with
+Bracket.seeded. Events where seeds repeat (the national tournament's regions) can't be
+laid out from the seeds alone, build those with Bracket.from_tree
+'''
+def event_bracket(games : pd.DataFrame, event : str) -> Bracket:
+    played : pd.DataFrame = games[games["Event"] == event]
+    sides : pd.DataFrame = pd.concat([
+        pd.DataFrame({"Team_id": played[f"{side}_id"], "Seed": played[f"{side}_Seed"]}) for side in ["Home", "Away"]
+    ]).dropna().astype(np.int64).drop_duplicates("Team_id")
+    if sides.empty:
+        raise ValueError(f"No seeded games for {event}")
+    if sides["Seed"].duplicated().any():
+        raise ValueError(f"Seeds repeat in {event}, use Bracket.from_tree")
+    missing : List[int] = sorted(set(range(1, sides["Seed"].max() + 1)) - set(sides["Seed"]))
+    if sides["Seed"].min() < 1 or missing:
+        raise ValueError(f"Seeds {missing} of {event} aren't on these games, use Bracket.seeded with the whole field")
+    return Bracket.seeded(sides.sort_values("Seed")["Team_id"].tolist(), event)
+
+
+# Chance the row team beats the column team on a neutral floor, from the same model as
+# predict, with a last row and column for the bye (it never wins, everyone beats it).
+# Unrated teams are a coin flip against anyone
+def _win_matrix(team_ids : np.ndarray, ratings : Ratings, tempos : Tempo, margin_sd : float) -> np.ndarray:
+    n : int = len(team_ids)
+    pairs : pd.DataFrame = pd.DataFrame({
+        "Home_id": np.repeat(team_ids, n), "Away_id": np.tile(team_ids, n),
+        "Home_Team": "", "Location": "Neutral Site"
+    })
+    chances : np.ndarray = predict(pairs, ratings, tempos, margin_sd)["Home_Win_Prob"].to_numpy(dtype=np.float64)
+    wins : np.ndarray = np.ones((n + 1, n + 1), dtype=np.float32)
+    wins[:n, :n] = np.nan_to_num(chances, nan=.5).reshape(n, n)
+    wins[n, :n] = 0
+    return wins
+
+
+# The event's games that are already over, the winner of each beats the loser every time.
+# Two teams only meet once in a bracket, so this can't touch any other game
+def _fix_results(wins : np.ndarray, team_ids : np.ndarray, results : pd.DataFrame, event : str) -> None:
+    finished : pd.DataFrame = results[results["Event"] == event]
+    finished = finished.dropna(subset=["Home_id", "Away_id", "Home_Score", "Away_Score"])
+    finished = finished[finished["Home_Score"] != finished["Away_Score"]]
+    home : np.ndarray = _lookup(team_ids, finished["Home_id"])
+    away : np.ndarray = _lookup(team_ids, finished["Away_id"])
+    home_won : np.ndarray = (finished["Home_Score"] > finished["Away_Score"]).to_numpy(dtype=bool)
+    inside : np.ndarray = (home < len(team_ids)) & (away < len(team_ids))
+    winner : np.ndarray = np.where(home_won, home, away)[inside]
+    loser : np.ndarray = np.where(home_won, away, home)[inside]
+    wins[winner, loser] = 1
+    wins[loser, winner] = 0
+
+
+# Every game of every round for sims brackets at once, field is (sims, teams left). How many
+# times each team was still in after each round
+def _bracket_chunk(slots : np.ndarray, wins : np.ndarray, sims : int, seed : np.random.SeedSequence) -> np.ndarray:
+    rng : np.random.Generator = np.random.default_rng(seed)
+    field : np.ndarray = np.broadcast_to(slots.astype(np.int16 if len(wins) < 2 ** 15 else np.int64), (sims, len(slots)))
+    alive : List[np.ndarray] = []
+    while field.shape[1] > 1:
+        first, second = field[:, 0::2], field[:, 1::2]
+        field = np.where(rng.random(first.shape, dtype=np.float32) < wins[first, second], first, second)
+        alive.append(np.bincount(field.ravel(), minlength=len(wins)))
+    return np.stack(alive)
+
+
+# Remaining games played out sims times, BLOCK at a time. Counts of how many of them each
+# team won, (teams, games + 1)
+def _season_chunk(chances : np.ndarray, home : np.ndarray, away : np.ndarray, n_teams : int, sims : int,
+                  seed : np.random.SeedSequence) -> np.ndarray:
+    rng : np.random.Generator = np.random.default_rng(seed)
+    games : np.ndarray = np.arange(len(chances))
+    ones : np.ndarray = np.ones(len(chances), dtype=np.float32)
+    at_home : sp.csr_matrix = sp.csr_matrix((ones, (home, games)), shape=(n_teams, len(chances)))
+    on_road : sp.csr_matrix = sp.csr_matrix((ones, (away, games)), shape=(n_teams, len(chances)))
+    scheduled : np.ndarray = np.asarray(at_home.sum(axis=1) + on_road.sum(axis=1)).ravel()
+    counts : np.ndarray = np.zeros(n_teams * (len(chances) + 1), dtype=np.int64)
+    offsets : np.ndarray = np.arange(n_teams)[:, None] * (len(chances) + 1)
+    for done in range(0, sims, BLOCK):
+        home_won : np.ndarray = rng.random((len(chances), min(BLOCK, sims - done)), dtype=np.float32) < chances[:, None]
+        won : np.ndarray = at_home @ home_won.astype(np.float32) + on_road @ (~home_won).astype(np.float32)
+        counts += np.bincount((offsets + won.astype(np.int64)).ravel(), minlength=len(counts))
+    counts = counts.reshape(n_teams, len(chances) + 1)
+    # nobody can win more games than they have left, cut the table down to the longest schedule
+    return counts[:, :int(scheduled.max(initial=0)) + 1]
+
+
+'''
+Runs work(*args, sims, seed) over chunks of at most CHUNK simulations and sums what comes
+back. Every chunk's seed is spawned from seed by its position, so the same seed gives the
+same answer whether the chunks run here or across processes (spawned like the scraping
+pipeline's, so it's safe next to threads)
+'''
+def _fan_out(work : Callable, args : tuple, simulations : int, seed : int, processes : int) -> np.ndarray:
+    sizes : List[int] = [min(CHUNK, simulations - done) for done in range(0, simulations, CHUNK)]
+    seeds : List[np.random.SeedSequence] = np.random.SeedSequence(seed).spawn(len(sizes))
+    if processes and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts : List[np.ndarray] = list(pool.map(work, *zip(*[args + (size, chunk_seed)
+                                                                  for size, chunk_seed in zip(sizes, seeds)])))
+    else:
+        parts = [work(*args, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    if not parts:
+        raise ValueError("Needs at least one simulation")
+    width : int = max(part.shape[1] for part in parts)
+    return sum(np.pad(part, ((0, 0), (0, width - part.shape[1]))) for part in parts)
+
+
+def _team_names(team_ids : np.ndarray, ratings : Ratings) -> List[str]:
+    names : np.ndarray = np.array(list(ratings.names) + [""], dtype=object)[_lookup(ratings.team_ids, pd.Series(team_ids))]
+    return [name if name else str(team_id) for team_id, name in zip(team_ids, names)]
+
+
+'''
+Plays the bracket out simulations times and gives each team's chance of reaching every
+round after the first (Round_2, Round_3, ...) and of winning it all (Champion). Every game
+is on a neutral floor with the win chances predict would give, results are finished games
+(day_scores frames) and the ones played in the bracket's event keep their winners. All the brackets play a round
+together, so a round is one gather of win chances and one comparison per slot
+simulations: How many brackets to draw
+seed: Same seed, same answer, however many processes
+processes: Draw the chunks of CHUNK simulations in this many processes, 0 draws them here
+'''
+def simulate_bracket(bracket : Bracket, ratings : Ratings, tempos : Tempo = None, margin_sd : float = MARGIN_SD,
+                     results : pd.DataFrame = None, simulations : int = SIMULATIONS, seed : int = 0,
+                     processes : int = 0) -> pd.DataFrame:
+    wins : np.ndarray = _win_matrix(bracket.team_ids, ratings, tempos, margin_sd)
+    if results is not None and not results.empty:
+        if bracket.event is None:
+            raise ValueError("The bracket needs its event to pick its games out of results")
+        _fix_results(wins, bracket.team_ids, results, bracket.event)
+    alive : np.ndarray = _fan_out(_bracket_chunk, (bracket.slots, wins), simulations, seed, processes)
+    chances : np.ndarray = alive[:, :len(bracket.team_ids)] / simulations
+
+    odds : pd.DataFrame = pd.DataFrame({"Team_id": bracket.team_ids, "Team": _team_names(bracket.team_ids, ratings)})
+    for played in range(1, bracket.rounds):
+        odds[f"Round_{played + 1}"] = np.round(chances[played - 1], ROUND_PRECISION)
+    odds["Champion"] = np.round(chances[-1], ROUND_PRECISION)
+    odds = odds.sort_values("Champion", ascending=False, kind="stable")
+    return odds.reset_index(drop=True)
+
+
+'''
+The rest of a regular season played out simulations times. remaining is every game still
+to be played (upcoming's frame), played the games already finished, which give each team
+its record so far. Each game is drawn with the home team's chance from predict, games with
+a team that has no rating are coin flips. Gives every team's record so far, games left,
+expected final wins and losses and the 5th and 95th percentile of its final wins
+'''
+def simulate_season(remaining : pd.DataFrame, ratings : Ratings, played : pd.DataFrame = None,
+                    tempos : Tempo = None, margin_sd : float = MARGIN_SD, simulations : int = SIMULATIONS,
+                    seed : int = 0, processes : int = 0) -> pd.DataFrame:
+    remaining = remaining.dropna(subset=["Home_id", "Away_id"])
+    played = played if played is not None else remaining.iloc[:0]
+    played = played.dropna(subset=["Home_id", "Away_id", "Home_Score", "Away_Score"])
+    played = played[played["Home_Score"] != played["Away_Score"]]
+    ids : pd.Series = pd.concat([remaining["Home_id"], remaining["Away_id"], played["Home_id"], played["Away_id"]])
+    team_ids : np.ndarray = np.unique(ids.to_numpy(dtype=np.int64))
+    n_teams : int = len(team_ids)
+
+    home_won : np.ndarray = (played["Home_Score"] > played["Away_Score"]).to_numpy(dtype=bool)
+    home : np.ndarray = _lookup(team_ids, played["Home_id"])
+    away : np.ndarray = _lookup(team_ids, played["Away_id"])
+    wins_now : np.ndarray = np.bincount(np.where(home_won, home, away), minlength=n_teams)
+    losses_now : np.ndarray = np.bincount(np.where(home_won, away, home), minlength=n_teams)
+
+    chances : np.ndarray = predict(remaining, ratings, tempos, margin_sd)["Home_Win_Prob"].to_numpy(dtype=np.float64)
+    chances = np.nan_to_num(chances, nan=.5).astype(np.float32)
+    home, away = _lookup(team_ids, remaining["Home_id"]), _lookup(team_ids, remaining["Away_id"])
+    counts : np.ndarray = _fan_out(_season_chunk, (chances, home, away, n_teams), simulations, seed, processes)
+    left : np.ndarray = np.bincount(np.concatenate([home, away]), minlength=n_teams)
+
+    won : np.ndarray = np.arange(counts.shape[1])
+    expected : np.ndarray = counts @ won / simulations
+    spread : np.ndarray = np.cumsum(counts, axis=1) / simulations
+    low : np.ndarray = (spread < .05).sum(axis=1)
+    high : np.ndarray = (spread < .95).sum(axis=1)
+    names : pd.Series = pd.concat([
+        pd.Series(frame[f"{side}_Team"].to_numpy(), index=frame[f"{side}_id"].to_numpy(dtype=np.int64))
+        for frame in [remaining, played] for side in ["Home", "Away"]])
+    names = names[~names.index.duplicated()]
+
+    season : pd.DataFrame = pd.DataFrame({
+        "Team_id": team_ids, "Team": names.reindex(team_ids).to_numpy(),
+        "Wins": wins_now, "Losses": losses_now, "Left": left,
+        "Exp_Wins": np.round(wins_now + expected, 2),
+        "Exp_Losses": np.round(losses_now + left - expected, 2),
+        "Wins_Low": wins_now + low, "Wins_High": wins_now + high
+    })
+    season = season.sort_values(["Exp_Wins", "Team"], ascending=[False, True], kind="stable")
+    return season.reset_index(drop=True)
@@ -0,0 +1,219 @@
+import argparse
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from game_store import COLUMNS
+from rank_engine import Schedule, Ratings, solve, normalize, HOME_ADJ, ROUND_PRECISION
+
+POSSESSIONS : float = 68.0 # average possessions per team in a game, only used for the scores
+NEUTRAL_SITE : str = "Neutral Site"
+SIZES : List[int] = [90, 180, 360, 730, 1090, 2180] # 1090 is about all three men's divisions
+
+
+'''
+A league with known true ratings, the answer the ranking engine should find. Offense
+and defense are points per possession against an average team, the same scale ADJO and
+ADJD are on. Every team belongs to a conference, and a conference shares part of its
+strength, which is what makes real schedules hard: most games are played inside a
+cluster and only the nonconference games tie the clusters together
+'''
+class League:
+    def __init__(self, team_ids : np.ndarray, names : List[str], conference : np.ndarray,
+                 adj_o : np.ndarray, adj_d : np.ndarray):
+        self.team_ids = team_ids
+        self.names = names
+        self.conference = conference
+        self.adj_o = adj_o
+        self.adj_d = adj_d
+
+    def __len__(self) -> int:
+        return len(self.team_ids)
+
+
+'''
+teams spread over conferences of about conference_size. spread is the log scale spread
+of a team's offense and defense around 1 ppp, conference_spread how much of that is
+shared by the whole conference
+'''
+def make_league(teams : int, conference_size : int = 12, spread : float = .08,
+                conference_spread : float = .05, seed : int = 0) -> League:
+    rng : np.random.Generator = np.random.default_rng(seed)
+    conferences : int = max(1, round(teams / conference_size))
+    conference : np.ndarray = rng.permutation(np.arange(teams) % conferences)
+    shared : np.ndarray = rng.normal(0, conference_spread, (conferences, 2))[conference]
+    own : np.ndarray = rng.normal(0, spread, (teams, 2))
+    adj_o : np.ndarray = np.exp(shared[:, 0] + own[:, 0])
+    adj_d : np.ndarray = np.exp(-shared[:, 1] + own[:, 1]) # a strong conference allows less
+    team_ids : np.ndarray = np.arange(teams, dtype=np.int64) * 7 + 100 # ids aren't contiguous on the site either
+    return League(team_ids, [f"Team {n}" for n in range(teams)], conference, adj_o, adj_d)
+
+
+# Pairs up teams at random, leftovers (an odd team out) sit the round out
+def _pairs(teams : np.ndarray, rng : np.random.Generator) -> np.ndarray:
+    shuffled : np.ndarray = rng.permutation(teams)
+    return shuffled[:len(shuffled) // 2 * 2].reshape(-1, 2)
+
+
+'''
+A season of games_per_team rounds in the schema _filter_games returns. Each round is a
+conference round (teams paired inside their conference, leftovers across) with
+probability conference_share, otherwise every team is paired with anyone. neutral_share
+of the games are at a neutral site, the rest at the home team. Each side's ppp is
+    true offense * opponent's true defense * location factor * lognormal(noise)
+which is exactly the model the engine fits, so with noise=0 it should get the ratings back
+'''
+def make_season(league : League, games_per_team : int = 30, conference_share : float = .6,
+                neutral_share : float = .1, noise : float = .1, start : date = date(2024, 11, 4),
+                seed : int = 0, first_game_id : int = 5000000) -> pd.DataFrame:
+    rng : np.random.Generator = np.random.default_rng(seed)
+    teams : np.ndarray = np.arange(len(league))
+    rounds : List[np.ndarray] = []
+    days : List[np.ndarray] = []
+    for n in range(games_per_team):
+        if rng.random() < conference_share:
+            pairs : List[np.ndarray] = []
+            leftover : List[np.ndarray] = []
+            for conference in np.unique(league.conference):
+                members : np.ndarray = teams[league.conference == conference]
+                paired : np.ndarray = _pairs(members, rng)
+                pairs.append(paired)
+                leftover.append(np.setdiff1d(members, paired.ravel()))
+            pairs.append(_pairs(np.concatenate(leftover), rng))
+            matchups : np.ndarray = np.concatenate(pairs)
+        else:
+            matchups = _pairs(teams, rng)
+        rounds.append(matchups)
+        days.append(np.full(len(matchups), n * 4)) # about two games a week
+    games : np.ndarray = np.concatenate(rounds)
+    day : np.ndarray = np.concatenate(days)
+    home : np.ndarray = games[:, 1]
+    away : np.ndarray = games[:, 0]
+    neutral : np.ndarray = rng.random(len(games)) < neutral_share
+    loc : np.ndarray = np.where(neutral, 1.0, HOME_ADJ)
+
+    home_ppp : np.ndarray = league.adj_o[home] * league.adj_d[away] * loc * np.exp(rng.normal(0, noise, len(games)))
+    away_ppp : np.ndarray = league.adj_o[away] * league.adj_d[home] * (2 - loc) * np.exp(rng.normal(0, noise, len(games)))
+    home_ppp = np.round(home_ppp, ROUND_PRECISION)
+    away_ppp = np.round(away_ppp, ROUND_PRECISION)
+    possessions : np.ndarray = np.round(rng.normal(POSSESSIONS, 4, len(games))).clip(min=50)
+    names : np.ndarray = np.array(league.names, dtype=object)
+
+    season : pd.DataFrame = pd.DataFrame({
+        "Date": [start + timedelta(days=int(n)) for n in day],
+        "Time": "07:00 PM",
+        "Event": "Regular Season",
+        "Division": 1,
+        "Status": "Finished",
+        "Attendance": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Location": np.where(neutral, NEUTRAL_SITE, names[home]),
+        "Away_Seed": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Away_Team": names[away],
+        "Away_Score": pd.array(np.round(away_ppp * possessions), dtype="Int64"),
+        "Home_Seed": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Home_Team": names[home],
+        "Home_Score": pd.array(np.round(home_ppp * possessions), dtype="Int64"),
+        "Away_Wins": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Away_Losses": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Home_Wins": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Home_Losses": pd.array([pd.NA] * len(games), dtype="Int64"),
+        "Away_id": pd.array(league.team_ids[away], dtype="Int64"),
+        "Home_id": pd.array(league.team_ids[home], dtype="Int64"),
+        "Game_id": pd.array(np.arange(len(games)) + first_game_id, dtype="Int64"),
+        "Home_ppp": home_ppp,
+        "Away_ppp": away_ppp
+    })
+    return season[COLUMNS].sort_values("Date", kind="stable").reset_index(drop=True)
+
+
+# Several seasons pooled into one table, every season its own draw of games over the same teams
+def make_seasons(league : League, seasons : int, seed : int = 0, **options) -> pd.DataFrame:
+    pooled : List[pd.DataFrame] = []
+    for n in range(seasons):
+        pooled.append(make_season(league, start=date(2024 - seasons + 1 + n, 11, 4), seed=seed + n,
+                                  first_game_id=5000000 + 1000000 * n, **options))
+    return pd.concat(pooled, ignore_index=True)
+
+
+'''
+How far the solved ratings are from the truth. The true ratings are pinned to the same
+scale the engine uses first (average offense = average defense, weighted by games), so
+the errors are only what the schedule and noise cost. em_rank is the Spearman correlation
+between the true and solved efficiency margins
+'''
+def recovery(league : League, schedule : Schedule, ratings : Ratings) -> Dict[str, float]:
+    index : np.ndarray = np.searchsorted(league.team_ids, ratings.team_ids)
+    played : np.ndarray = np.bincount(np.concatenate([schedule.home, schedule.away]),
+                                      minlength=len(ratings.team_ids)).astype(np.float64)
+    true_o : np.ndarray = league.adj_o[index].copy()
+    true_d : np.ndarray = league.adj_d[index].copy()
+    normalize(true_o, true_d, played)
+    true_em : np.ndarray = true_o - true_d
+    em : np.ndarray = ratings.adj_o - ratings.adj_d
+    ranks = lambda values: np.argsort(np.argsort(values)).astype(np.float64)
+    return {
+        "o_rmse": float(np.sqrt(np.mean((ratings.adj_o - true_o) ** 2))),
+        "d_rmse": float(np.sqrt(np.mean((ratings.adj_d - true_d) ** 2))),
+        "em_rmse": float(np.sqrt(np.mean((em - true_em) ** 2))),
+        "em_max": float(np.abs(em - true_em).max()),
+        "em_rank": float(np.corrcoef(ranks(em), ranks(true_em))[0, 1])
+    }
+
+
+'''
+Solves leagues of every size in sizes and reports, for each: games, the time to build the
+schedule, a cold solve and its iterations, a warm solve from the ratings before the last
+round (what the daily job does), the peak memory the build and cold solve allocate, and
+how well the ratings were recovered. Extra keyword options go to make_season
+'''
+def scaling(sizes : List[int] = SIZES, seasons : int = 1, seed : int = 0, **options) -> pd.DataFrame:
+    rows : List[Dict[str, float]] = []
+    for teams in sizes:
+        league : League = make_league(teams, seed=seed)
+        games : pd.DataFrame = make_seasons(league, seasons, seed=seed, **options)
+        last_day : date = games["Date"].max()
+
+        tracemalloc.start()
+        began : float = time.perf_counter()
+        schedule : Schedule = Schedule.from_games(games)
+        built : float = time.perf_counter()
+        ratings : Ratings = solve(schedule)
+        solved : float = time.perf_counter()
+        peak : int = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        before : Ratings = solve(Schedule.from_games(games[games["Date"] < last_day]))
+        warm_began : float = time.perf_counter()
+        warm : Ratings = solve(schedule, start=before)
+        warm_solved : float = time.perf_counter()
+
+        row : Dict[str, float] = {
+            "teams": teams, "games": len(games), "build_seconds": built - began, "solve_seconds": solved - built,
+            "iterations": ratings.iterations, "warm_seconds": warm_solved - warm_began,
+            "warm_iterations": warm.iterations, "peak_mb": peak / 1024 ** 2
+        }
+        row.update(recovery(league, schedule, ratings))
+        rows.append(row)
+        print(f"{teams} teams, {len(games)} games: {row['solve_seconds']:.4f}s, {ratings.iterations} iterations")
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser : argparse.ArgumentParser = argparse.ArgumentParser(description="Ranking engine scaling on synthetic leagues")
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--games", type=int, default=30, help="games per team per season")
+    parser.add_argument("--noise", type=float, default=.1)
+    parser.add_argument("--neutral", type=float, default=.1, help="share of games at neutral sites")
+    parser.add_argument("--conference", type=float, default=.6, help="share of rounds played in conference")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="", help="also write the results to this json file")
+    args = parser.parse_args()
+    results : pd.DataFrame = scaling(args.sizes, args.seasons, args.seed, games_per_team=args.games,
+                                     noise=args.noise, neutral_share=args.neutral,
+                                     conference_share=args.conference)
+    print(results.to_string(index=False))
+    if args.out:
+        results.to_json(args.out, orient="records", indent=2)
@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Dict, List, Tuple
+from game_store import GameStore
+from rank_engine import Schedule, Ratings, solve
+
+# per team totals kept for every day, in the order the prefix sums hold them
+TOTALS : List[str] = ["Games", "Home", "Away", "Neutral", "Scored", "Allowed"]
+
+
+'''
+Every ranked game of one division's season, in date order, as the same edge arrays a
+Schedule holds, plus the day each game was on. Since the games are sorted by day, a date
+range is two binary searches and a slice of those arrays, no games are read or filtered.
+Per team totals for each day (games, home/away/neutral games, ppp scored and allowed) are
+kept as running sums over the days, so any range's totals are one subtraction.
+
+Teams are indexed in the order they first showed up (it's appended to) and names are kept
+per game, so a slice gets the same team order and names Schedule.from_games would give for
+those games. It's saved next to the store and brought up to date from the days written
+since (see open_days), a day that was written again is read again from that day on
+'''
+class TeamDays:
+    def __init__(self, season : str, division : int):
+        self.season = season
+        self.division = division
+        self.team_ids : np.ndarray = np.empty(0, dtype=np.int64)
+        self.names : List[str] = []
+        self.day : np.ndarray = np.empty(0, dtype=np.int32) # date ordinals, sorted
+        self.home : np.ndarray = np.empty(0, dtype=np.int32)
+        self.away : np.ndarray = np.empty(0, dtype=np.int32)
+        self.home_ppp : np.ndarray = np.empty(0, dtype=np.float64)
+        self.away_ppp : np.ndarray = np.empty(0, dtype=np.float64)
+        self.home_loc : np.ndarray = np.empty(0, dtype=np.float64)
+        self.home_name : np.ndarray = np.empty(0, dtype=np.int32) # index into names
+        self.away_name : np.ndarray = np.empty(0, dtype=np.int32)
+        self.stamps : Dict[date, int] = {} # day_stamps of the days in here
+        self._prefix : Tuple[np.ndarray, np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    # Where the games of [start, end] sit in the arrays
+    def _slice(self, start : date = None, end : date = None) -> slice:
+        first : int = 0 if start is None else int(np.searchsorted(self.day, start.toordinal(), "left"))
+        last : int = len(self.day) if end is None else int(np.searchsorted(self.day, end.toordinal(), "right"))
+        return slice(first, max(first, last))
+
+    # Drops every game from day on
+    def _cut(self, day : date) -> None:
+        keep : slice = self._slice(end=date.fromordinal(day.toordinal() - 1))
+        for name in ["day", "home", "away", "home_ppp", "away_ppp", "home_loc", "home_name", "away_name"]:
+            setattr(self, name, getattr(self, name)[keep])
+        self.stamps = {found: stamp for found, stamp in self.stamps.items() if found < day}
+        self._prefix = None
+
+    # games as read from the store, in date order and all after what's already in here
+    def _append(self, games : pd.DataFrame) -> None:
+        games = games.dropna(subset=["Home_ppp", "Away_ppp"])
+        if games.empty:
+            return
+        schedule : Schedule = Schedule.from_games(games)
+        known : Dict[int, int] = {int(team_id): n for n, team_id in enumerate(self.team_ids)}
+        new : List[int] = [int(team_id) for team_id in schedule.team_ids if int(team_id) not in known]
+        for team_id in new:
+            known[team_id] = len(known)
+        self.team_ids = np.concatenate([self.team_ids, np.array(new, dtype=np.int64)])
+        index : np.ndarray = np.array([known[int(team_id)] for team_id in schedule.team_ids], dtype=np.int32)
+
+        name_index : Dict[str, int] = {name: n for n, name in enumerate(self.names)}
+        def codes(column : pd.Series) -> np.ndarray:
+            found : List[int] = []
+            for name in column.tolist():
+                if name not in name_index:
+                    name_index[name] = len(self.names)
+                    self.names.append(name)
+                found.append(name_index[name])
+            return np.array(found, dtype=np.int32)
+
+        self.day = np.concatenate([self.day, np.array([day.toordinal() for day in games["Date"]], dtype=np.int32)])
+        self.home = np.concatenate([self.home, index[schedule.home]])
+        self.away = np.concatenate([self.away, index[schedule.away]])
+        self.home_ppp = np.concatenate([self.home_ppp, schedule.home_ppp])
+        self.away_ppp = np.concatenate([self.away_ppp, schedule.away_ppp])
+        self.home_loc = np.concatenate([self.home_loc, schedule.home_loc])
+        self.home_name = np.concatenate([self.home_name, codes(games["Home_Team"])])
+        self.away_name = np.concatenate([self.away_name, codes(games["Away_Team"])])
+        self._prefix = None
+
+    '''
+    Catches up with the store, only the days from the first one written (or removed) since
+    the last refresh are read. Returns how many days had changed
+    '''
+    def refresh(self, store : GameStore) -> int:
+        stamps : Dict[date, int] = store.day_stamps(self.season, self.division)
+        changed : List[date] = [day for day, stamp in stamps.items() if self.stamps.get(day) != stamp]
+        changed += [day for day in self.stamps if day not in stamps] # gone from the store
+        if not changed:
+            return 0
+        first : date = min(changed)
+        self._cut(first)
+        self._append(store.read(season=self.season, start=first, division=self.division, ranked_only=True))
+        self.stamps.update({day: stamp for day, stamp in stamps.items() if day >= first})
+        return len(set(changed))
+
+    # The games of [start, end] (None for open ended), same as Schedule.from_games on those games
+    def schedule(self, start : date = None, end : date = None) -> Schedule:
+        games : slice = self._slice(start, end)
+        home : np.ndarray = self.home[games]
+        away : np.ndarray = self.away[games]
+        played, index = np.unique(self.team_ids[np.concatenate([home, away])], return_inverse=True)
+        # a team keeps the first name it was listed under in the range, away teams are listed first
+        listed_ids : np.ndarray = self.team_ids[np.column_stack([away, home]).ravel()]
+        listed_names : np.ndarray = np.column_stack([self.away_name[games], self.home_name[games]]).ravel()
+        _, first = np.unique(listed_ids, return_index=True)
+        names : List[str] = [self.names[code] for code in listed_names[first]]
+        return Schedule(played, names, index[:len(home)], index[len(home):], self.home_ppp[games],
+                        self.away_ppp[games], self.home_loc[games])
+
+    def rank(self, start : date = None, end : date = None) -> pd.DataFrame:
+        ratings : Ratings = solve(self.schedule(start, end))
+        return ratings.to_frame()
+
+    # (days, sums) where sums[n] is every team's TOTALS over the games before days[n]
+    def _prefix_sums(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._prefix is None:
+            days, day_index = np.unique(self.day, return_inverse=True)
+            n_teams : int = len(self.team_ids)
+            neutral : np.ndarray = self.home_loc == 1.0
+            cells : np.ndarray = np.concatenate([day_index * n_teams + self.home, day_index * n_teams + self.away])
+            ones : np.ndarray = np.ones(len(self.day))
+            columns : List[np.ndarray] = [
+                np.concatenate([ones, ones]),
+                np.concatenate([~neutral, np.zeros(len(self.day))]),
+                np.concatenate([np.zeros(len(self.day)), ~neutral]),
+                np.concatenate([neutral, neutral]),
+                np.concatenate([self.home_ppp, self.away_ppp]),
+                np.concatenate([self.away_ppp, self.home_ppp])
+            ]
+            daily : np.ndarray = np.stack([np.bincount(cells, column.astype(np.float64), len(days) * n_teams)
+                                           .reshape(len(days), n_teams) for column in columns], axis=2)
+            sums : np.ndarray = np.zeros((len(days) + 1, n_teams, len(TOTALS)))
+            np.cumsum(daily, axis=0, out=sums[1:])
+            self._prefix = (days, sums)
+        return self._prefix
+
+    '''
+    Every team's totals over [start, end]: games, where they were played, and the ppp
+    scored and allowed summed over them (divide by Games for raw averages). Teams without
+    a game in the range are left out
+    '''
+    def totals(self, start : date = None, end : date = None) -> pd.DataFrame:
+        days, sums = self._prefix_sums()
+        first : int = 0 if start is None else int(np.searchsorted(days, start.toordinal(), "left"))
+        last : int = len(days) if end is None else int(np.searchsorted(days, end.toordinal(), "right"))
+        found : np.ndarray = sums[max(first, last)] - sums[first]
+        schedule : Schedule = self.schedule(start, end)
+        order : np.ndarray = np.argsort(self.team_ids)
+        teams : np.ndarray = order[np.searchsorted(self.team_ids, schedule.team_ids, sorter=order)]
+        results : pd.DataFrame = pd.DataFrame(found[teams], columns=TOTALS)
+        results[TOTALS[:4]] = results[TOTALS[:4]].astype(np.int64)
+        results.insert(0, "Team", schedule.names)
+        results.insert(0, "Team_id", schedule.team_ids)
+        return results
+
+    def save(self, file : str) -> None:
+        stamp_days : List[date] = sorted(self.stamps)
+        np.savez(file, season=self.season, division=self.division, team_ids=self.team_ids,
+                 names=np.array(self.names, dtype=str), day=self.day, home=self.home, away=self.away,
+                 home_ppp=self.home_ppp, away_ppp=self.away_ppp, home_loc=self.home_loc,
+                 home_name=self.home_name, away_name=self.away_name,
+                 stamp_days=np.array([day.toordinal() for day in stamp_days], dtype=np.int32),
+                 stamps=np.array([self.stamps[day] for day in stamp_days], dtype=np.int64))
+
+    @classmethod
+    def load(cls, file : str) -> "TeamDays":
+        with np.load(file) as saved:
+            days : TeamDays = cls(str(saved["season"]), int(saved["division"]))
+            days.team_ids = saved["team_ids"]
+            days.names = saved["names"].tolist()
+            for name in ["day", "home", "away", "home_ppp", "away_ppp", "home_loc", "home_name", "away_name"]:
+                setattr(days, name, saved[name])
+            days.stamps = {date.fromordinal(int(day)): int(stamp)
+                           for day, stamp in zip(saved["stamp_days"], saved["stamps"])}
+        return days
+
+
+'''
+The TeamDays of a division's season, kept in the store as _days_<season>_d<division>.npz.
+It's built the first time (one read of the season) and after that only the days written
+since are read before it's handed back
+'''
+def open_days(store : GameStore, season : str, division : int) -> TeamDays:
+    file : str = os.path.join(store.root, f"_days_{season}_d{division}.npz")
+    days : TeamDays = None
+    if os.path.exists(file):
+        try:
+            days = TeamDays.load(file)
+        except (OSError, ValueError, KeyError):
+            days = None # unreadable just means building it again
+    if days is None:
+        days = TeamDays(season, division)
+    if days.refresh(store) and os.path.isdir(store.root):
+        days.save(file + ".tmp.npz") # swapped in so a crash never leaves half a file
+        os.replace(file + ".tmp.npz", file)
+    return days
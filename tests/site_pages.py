@@ -0,0 +1,285 @@
+import html
+import http.server
+import random
+import sys
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+from day_trawler import _set_url
+from get_site import site_url
+from page_cache import PageCache
+
+FIRST : List[str] = ["John", "Mike", "Chris", "Dave", "Tom", "Alex", "Sam", "Ben", "Luke", "Matt", "Nick", "Joe",
+                     "Ryan", "Kyle", "Evan"]
+LAST : List[str] = ["Smith", "Jones", "Brown", "Davis", "Miller", "Wilson", "Moore", "Taylor", "Clark", "Lewis",
+                    "Young", "King", "Hill", "Green", "Baker"]
+DAYS : Tuple[date, date] = (date(2024, 12, 7), date(2024, 12, 8))
+DIVISIONS : List[int] = [1, 2, 3]
+
+
+'''
+Made up pages in the layout stats.ncaa.org serves, since the tests can't reach the site.
+A site is a dict of page path -> html for the game pages plus ("sb", day, division) ->
+html for the scoreboards. Every scoreboard has its games' play_by_play, individual_stats
+and team_stats pages, and division 1's boards have the odd games in them: one in overtime,
+one in the old play by play format, a blowout (so there's garbage time), one at a neutral
+site, a seeded team, a non NCAA opponent in division 2 and a game listed under two
+divisions. The benchmark corpus, benchmark_pages.sqlite, is write_corpus's output and
+can be rebuilt with
+    PYTHONPATH=. python tests/site_pages.py benchmark_pages.sqlite
+'''
+def make_site(seed : int = 0, women : bool = False, days : Tuple[date, ...] = DAYS, games : int = 6) -> Dict:
+    rng : random.Random = random.Random(seed)
+    pages : Dict = {}
+    game_id : int = 5700000 + seed * 1000
+    teams : List[Tuple[str, int, List[Tuple[str, str]]]] = [(f"Team{i} U", 1000 + i, _roster(rng)) for i in range(40)]
+    boards : Dict[Tuple[date, int], List[Dict]] = {}
+    for day in days:
+        for division in DIVISIONS:
+            listed : List[Dict] = []
+            for k in range(games if division == 1 else 2):
+                away, home = rng.sample(teams, 2)
+                game_id += 1
+                periods, score = _game_events(rng, away[2], home[2], women, overtime=int(k == 1),
+                                              old=k == 2 and division == 1, blowout=.6 if k == 3 else 0)
+                game : Dict = {"away": away[0], "home": home[0], "away_id": away[1], "home_id": home[1],
+                               "game_id": game_id, "away_score": score[0], "home_score": score[1]}
+                if k == 4:
+                    game["location"] = "@ Neutral Arena, Las Vegas, NV (Holiday Classic)"
+                if k == 5 and division == 1:
+                    game["away_seed"] = 5
+                if k == 0 and division == 2:
+                    game["away_id"] = None # non NCAA opponent
+                listed.append(game)
+                pages[f"/contests/{game_id}/play_by_play"] = _play_by_play(away[0], home[0], periods, score)
+                pages[f"/contests/{game_id}/individual_stats"] = _individual_stats(away[2], home[2])
+                pages[f"/contests/{game_id}/team_stats"] = _team_stats(away[0], home[0], score)
+            boards[(day, division)] = listed
+        boards[(day, 1)].append(boards[(day, 2)][1]) # crossover, on both division's boards
+    for (day, division), listed in boards.items():
+        pages[("sb", day, division)] = _scoreboard(day, listed)
+    return pages
+
+
+def _roster(rng : random.Random, players : int = 10) -> List[Tuple[str, str]]:
+    names : set = set()
+    while len(names) < players:
+        names.add(f"{rng.choice(FIRST)} {rng.choice(LAST)}{rng.randint(1, 99)}")
+    return [(name, rng.choice("GGFFC")) for name in sorted(names)]
+
+
+def _table(columns : List, rows : List) -> str:
+    page : str = "<table><tr>" + "".join(f"<th>{html.escape(str(column))}</th>" for column in columns) + "</tr>"
+    for row in rows:
+        page += "<tr>" + "".join(f"<td>{'' if value is None else html.escape(str(value))}</td>" for value in row) + "</tr>"
+    return page + "</table>"
+
+
+def _clock(seconds : float) -> str:
+    hundredths : int = int(round((seconds - int(seconds)) * 100)) % 100
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}:{hundredths:02d}"
+
+
+'''
+The rows of every period of one game as (time, away event, score, home event), and the
+final score. Possessions are shots, free throws, turnovers and substitutions, with the
+assists, steals, blocks, fouls and rebounds that go with them logged at the same time
+in whatever order the site would. blowout makes the home team that much better
+'''
+def _game_events(rng : random.Random, away : List[Tuple[str, str]], home : List[Tuple[str, str]], women : bool,
+                 overtime : int = 0, old : bool = False, blowout : float = 0) -> Tuple[List[List[Tuple]], List[int]]:
+    lengths : List[int] = [600 if women else 1200] * (4 if women else 2) + [300] * overtime
+    score : List[int] = [0, 0]
+    on : List[List[str]] = [[name for name, _ in away[:5]], [name for name, _ in home[:5]]]
+    bench : List[List[str]] = [[name for name, _ in away[5:]], [name for name, _ in home[5:]]]
+    strength : List[float] = [1.0, 1.0 + blowout]
+    side : int = 0
+    periods : List[List[Tuple]] = []
+    for period, clock in enumerate(lengths):
+        rows : List[Tuple] = [(_clock(clock), "period start", "period start", None)]
+
+        def add(by : int, text : str) -> None:
+            rows.append((_clock(clock), text if by == 0 else None, f"{score[0]}-{score[1]}", text if by == 1 else None))
+
+        if period == 0:
+            add(0, f"{on[0][0]}, jumpball won")
+            add(1, f"{on[1][0]}, jumpball lost")
+        while True:
+            clock -= rng.uniform(8, 24)
+            if clock <= 1:
+                break
+            player : str = rng.choice(on[side])
+            roll : float = rng.random()
+            if rng.random() < .08:
+                team : int = rng.randrange(2)
+                out : int = rng.randrange(5)
+                sub : int = rng.randrange(len(bench[team]))
+                add(team, f"{on[team][out]}, substitution out")
+                add(team, f"{bench[team][sub]}, substitution in")
+                on[team][out], bench[team][sub] = bench[team][sub], on[team][out]
+                continue
+            if roll < .15:
+                add(1 - side, f"{rng.choice(on[1 - side])}, steal")
+                add(side, f"{player}, turnover badpass")
+                side = 1 - side
+                continue
+            if roll < .22:
+                add(1 - side, f"{rng.choice(on[1 - side])}, foul personal shooting;2freethrow")
+                add(side, f"{player}, foulon")
+                for shot in (1, 2):
+                    made : bool = rng.random() < .72 * strength[side]
+                    score[side] += made
+                    fastbreak : str = "fastbreak " if rng.random() < .1 else ""
+                    add(side, f"{player}, freethrow {shot}of2 {fastbreak}{'made' if made else 'missed'}")
+                if made:
+                    side = 1 - side
+                else:
+                    rebounder : int = side if rng.random() < .3 else 1 - side
+                    add(rebounder, f"{rng.choice(on[rebounder] + ['Team'])}, rebound "
+                                   f"{'offensive' if rebounder == side else 'defensive'}")
+                    side = rebounder
+                continue
+            three : bool = rng.random() < .35
+            made = rng.random() < (.36 if three else .5) * strength[side]
+            kind : str = "jumpshot" if three else rng.choice(["jumpshot", "layup", "dunk", "hookshot"])
+            tags : List[str] = []
+            if rng.random() < .15:
+                tags.append(rng.choice(["fastbreak", "fromturnover"]))
+            if kind != "jumpshot":
+                tags.append("pointsinthepaint")
+            if rng.random() < .1:
+                tags.append("2ndchance")
+            shot_text : str = f"{player}, {'3' if three else '2'}pt {kind} {''.join(tag + ' ' for tag in tags)}" \
+                              f"{'made' if made else 'missed'}"
+            if made:
+                score[side] += 3 if three else 2
+                add(side, shot_text)
+                if rng.random() < .5:
+                    add(side, f"{rng.choice([other for other in on[side] if other != player])}, assist")
+                side = 1 - side
+            else:
+                if rng.random() < .06:
+                    add(1 - side, f"{rng.choice(on[1 - side])}, block")
+                add(side, shot_text)
+                rebounder = side if rng.random() < .3 else 1 - side
+                add(rebounder, f"{rng.choice(on[rebounder] + (['Team'] if rng.random() < .1 else []))}, rebound "
+                               f"{'offensive' if rebounder == side else 'defensive'}")
+                side = rebounder
+            if rng.random() < .02:
+                add(side, "Team, timeout full")
+        rows.append((_clock(0), "period end", "end of period", None))
+        if old:
+            rows[0] = (rows[0][0], rows[0][1], "0-0", rows[0][3]) # old format games have a score from the first row
+        periods.append(rows)
+    return periods, score
+
+
+def _play_by_play(away : str, home : str, periods : List[List[Tuple]], score : List[int]) -> str:
+    page : str = "<html><body>" + _table(["a"], [["nav"]])
+    page += _table(["Team", "1st", "2nd", "Total"], [[home, 0, 0, 0], [away, 0, 0, score[0]], [home, 0, 0, score[1]]])
+    page += _table(["b"], [["x"]])
+    for rows in periods:
+        page += _table(["Time", away, "Score", home], rows)
+    return page + "</body></html>"
+
+
+def _individual_stats(away : List[Tuple[str, str]], home : List[Tuple[str, str]]) -> str:
+    page : str = "<html><body>" + _table(["a"], [["x"]]) * 3
+    for roster in (away, home):
+        page += _table(["#", "Name", "P", "MP", "PTS"], [[i, name, spot, "20:00", 5] for i, (name, spot) in enumerate(roster)])
+    return page + "</body></html>"
+
+
+def _team_stats(away : str, home : str, score : List[int]) -> str:
+    rows : List[List] = [["FGA", 60, 62], ["ORebs", 10, 9], ["TO", 12, 11], ["FTA", 20, 18], ["PTS", score[0], score[1]]]
+    return "<html><body>" + _table(["a"], [["x"]]) * 3 + _table(["Stat", away, home], rows) + "</body></html>"
+
+
+# Every game is listed twice like on the site, day_scores keeps every other box
+def _scoreboard(day : date, games : List[Dict]) -> str:
+    boxes : List[str] = []
+    for game in games:
+        rows : List[str] = [f"<tr><td>{day.strftime('%m/%d/%Y')} 07:00 PM Attend: 1,234</td></tr>"]
+        if game.get("location"):
+            rows.append(f"<tr><td colspan=3>{html.escape(game['location'])}</td></tr>")
+        rows.append(_team_row(game["away"], game["away_id"], game["away_score"], game.get("away_seed"), "3-2"))
+        rows += ["<tr><td></td></tr>", "<tr><td></td></tr>"]
+        rows.append(_team_row(game["home"], game["home_id"], game["home_score"], None, "4-1"))
+        rows.append(f'<tr><td><a href="/contests/{game["game_id"]}/box_score">Box Score</a></td></tr>')
+        boxes += ["<table>" + "".join(rows) + "</table>"] * 2
+    return "<html><body>" + "".join(boxes) + "</body></html>"
+
+
+def _team_row(name : str, team_id : int, points : int, seed : int, record : str) -> str:
+    team : str = f"{html.escape(name)} ({record})"
+    if team_id:
+        team = f'<a href="/teams/{team_id}">{team}</a>'
+    return f"<tr><td><img/></td><td>{f'#{seed} ' if seed else ''}{team}</td><td>{points}</td></tr>"
+
+
+# The men's and women's sites the tests and the benchmark corpus use
+def make_sites() -> Dict[str, Dict]:
+    return {"MBB": make_site(seed=0), "WBB": make_site(seed=5, women=True)}
+
+
+'''
+Serves sites (sport code -> site) on localhost, point get_site.BASE_URL at the url it
+returns. Pages that aren't there are 404s. hits counts the requests for every path
+'''
+class StubSite:
+    def __init__(self, sites : Dict[str, Dict]):
+        self.sites = sites
+        self.hits : Dict[str, int] = {}
+        stub : StubSite = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                body : str = stub.page(self.path)
+                data : bytes = b"" if body is None else body.encode("utf-8")
+                self.send_response(404 if body is None else 200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self, path : str) -> str:
+        self.hits[path] = self.hits.get(path, 0) + 1
+        parts = urlsplit(path)
+        if parts.path == "/contests/livestream_scoreboards":
+            query : Dict[str, List[str]] = parse_qs(parts.query)
+            day : date = datetime.strptime(query["game_date"][0], "%m/%d/%Y").date()
+            return self.sites[query["sport_code"][0]].get(("sb", day, int(query["division"][0])), "<html></html>")
+        for site in self.sites.values():
+            if parts.path in site:
+                return site[parts.path]
+        return None
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Saves sites as a PageCache under the urls get_site would have fetched them from,
+# the same file a recorded benchmark corpus is
+def write_corpus(path : str, sites : Dict[str, Dict]) -> None:
+    cache : PageCache = PageCache(path, ttl=float("inf"))
+    for sport, site in sites.items():
+        for key, page in site.items():
+            if isinstance(key, tuple):
+                cache.put(_set_url(key[1], sport, key[2]), page, final=True)
+            else:
+                cache.put(site_url(key), page, final=True)
+    cache.close()
+
+
+if __name__ == '__main__':
+    write_corpus(sys.argv[1], make_sites())
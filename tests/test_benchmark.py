@@ -0,0 +1,56 @@
+import os
+import shutil
+from typing import Set
+import pytest
+import benchmark
+from page_cache import CacheMiss, PageCache
+from site_pages import DAYS, make_site, write_corpus
+
+CORPUS : str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), benchmark.CORPUS)
+
+
+def test_corpus_has_every_kind_of_game(tmp_path):
+    corpus : benchmark.Corpus = benchmark.Corpus(shutil.copy(CORPUS, tmp_path))
+    tags : Set[str] = {tag for game_id in corpus.games for tag in corpus.tags(game_id)}
+    assert tags == {"men", "women", "old_format", "overtime"}
+    assert all(set(pages) == set(benchmark.PAGES) for pages in corpus.games.values())
+    assert {sport for sport, _, _, _ in corpus.boards} == {"MBB", "WBB"}
+
+
+def test_run_needs_a_corpus(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        benchmark.run(str(tmp_path / "missing.sqlite"))
+    PageCache(str(tmp_path / "empty.sqlite")).close()
+    with pytest.raises(ValueError):
+        benchmark.run(str(tmp_path / "empty.sqlite"))
+
+
+def test_run_leaves_the_corpus_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "REPEAT", 1)
+    path : str = str(tmp_path / "corpus.sqlite")
+    write_corpus(path, {"MBB": make_site(days=DAYS[:1], games=3)})
+    with open(path, "rb") as file:
+        before : bytes = file.read()
+    results = benchmark.run(path)
+    with open(path, "rb") as file:
+        assert file.read() == before
+    assert results["end_to_end"]["scrape_game"]["games"] == results["corpus"]["games"] == 7
+    assert set(results["by_tag"]) == {"men", "old_format", "overtime"}
+    assert results["end_to_end"]["scrape_game"]["rejected"] == 0
+
+
+# A page the corpus doesn't have is an error in the corpus, not a fast parse
+def test_run_raises_for_missing_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "REPEAT", 1)
+    site = make_site(days=DAYS[:1], games=2)
+    del site[next(path for path in site if str(path).endswith("individual_stats"))]
+    path : str = str(tmp_path / "corpus.sqlite")
+    write_corpus(path, {"MBB": site})
+    with pytest.raises(CacheMiss):
+        benchmark.run(path)
+
+
+def test_compare_shows_rejections():
+    old = {"end_to_end": {"scrape_game": {"games": 10, "rejected": 0, "seconds": 2, "games_per_second": 5}}}
+    new = {"end_to_end": {"scrape_game": {"games": 10, "rejected": 3, "seconds": 1, "games_per_second": 10}}}
+    assert benchmark.compare(old, new) == {"end_to_end.scrape_game": 2, "end_to_end.scrape_game.rejected": 3}
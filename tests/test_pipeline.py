@@ -0,0 +1,44 @@
+from datetime import date
+from typing import Dict
+import pandas as pd
+import pytest
+import get_site
+from full_ranking import _all_games
+from game_store import GameStore
+from site_pages import StubSite, make_sites
+
+START : date = date(2024, 12, 6)
+END : date = date(2024, 12, 9)
+
+
+@pytest.fixture(scope="module")
+def site():
+    stub : StubSite = StubSite(make_sites())
+    yield stub
+    stub.close()
+
+
+# get_site pointed at the stub site, with no sleeping and a rate limit the stub doesn't need
+@pytest.fixture
+def local(site, monkeypatch):
+    monkeypatch.setattr(get_site, "BASE_URL", site.url)
+    monkeypatch.setattr(get_site, "SLEEP_DELAY", 0)
+    get_site.set_rate_limit(rate=1000, burst=100, per_host=8)
+    yield site
+    get_site.set_rate_limit(rate=0)
+
+
+def _scraped(root : str, women : bool, **options) -> pd.DataFrame:
+    store : GameStore = GameStore(root)
+    _all_games(START, END, store, w=women, **options)
+    return store.read()
+
+
+# The threaded scraper and the fetch/parse/write pipeline have to leave the store exactly
+# as the one game at a time scrape does
+@pytest.mark.parametrize("women", [False, True])
+@pytest.mark.parametrize("options", [{"workers": 2}, {"workers": 2, "processes": 1}], ids=["threads", "pipeline"])
+def test_store_matches_sequential_scrape(local, tmp_path, women, options : Dict[str, int]):
+    expected : pd.DataFrame = _scraped(str(tmp_path / "sequential"), women)
+    assert len(expected) and expected["Home_ppp"].notna().any()
+    pd.testing.assert_frame_equal(_scraped(str(tmp_path / "parallel"), women, **options), expected)
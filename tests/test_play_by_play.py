@@ -0,0 +1,86 @@
+import copy
+import random
+from typing import Callable, Dict, List, Tuple
+import pandas as pd
+import pytest
+import play_by_play
+import reference
+from site_pages import make_sites
+
+# the functions under test, kept here since _inputs swaps them out while it parses
+event_sorter : Callable = play_by_play._event_sorter
+poss_former : Callable = play_by_play._poss_former
+
+# events a same time group can hold, the last few match no priority
+EVENTS : List[str] = [
+    " period start", " jumpball won", " jumpball lost", " assist", " steal", " turnover badpass",
+    " foul personal shooting;2freethrow", " foulon", " block", " 2pt layup made", " 2pt tipin made",
+    " 3pt jumpshot missed", " freethrow 1of2 made", " freethrow 2of2 missed", " rebound defensive",
+    " rebound offensive", " timeout full", "end of period", " substitution in", " substitution out", " challenge"
+]
+
+
+# game id -> {page name: html} for every game on the test sites
+@pytest.fixture(scope="module")
+def games() -> Dict[int, Dict[str, str]]:
+    found : Dict[int, Dict[str, str]] = {}
+    for site in make_sites().values():
+        for path, page in site.items():
+            if isinstance(path, str):
+                _, _, game_id, name = path.split("/")
+                found.setdefault(int(game_id), {})[name] = page
+    return found
+
+
+# Copies of everything play_by_play.name was called with while every game was parsed in both modes
+def _inputs(monkeypatch, games : Dict[int, Dict[str, str]], name : str) -> List[Tuple]:
+    calls : List[Tuple] = []
+    function : Callable = getattr(play_by_play, name)
+
+    def keep(*args):
+        calls.append(copy.deepcopy(args))
+        return function(*args)
+
+    monkeypatch.setattr(play_by_play, name, keep)
+    for game_id, pages in games.items():
+        for mode in ("full", "possessions"):
+            play_by_play.parse_game(game_id, pages, mode=mode)
+    assert calls
+    return calls
+
+
+def test_event_sorter_matches_old_sorter(monkeypatch, games):
+    for game, in _inputs(monkeypatch, games, "_event_sorter"):
+        pd.testing.assert_frame_equal(event_sorter(game.copy()), reference.event_sorter(game.copy()))
+
+
+# Groups of repeated times and lone events, with events that match no priority mixed in,
+# which is where the old sorter drops rows and picks the tail of a group up again
+@pytest.mark.parametrize("seed", range(200))
+def test_event_sorter_matches_old_sorter_on_random_games(seed):
+    rng : random.Random = random.Random(seed)
+    times : List[str] = []
+    for clock in range(rng.randint(1, 40), 0, -1):
+        times += [f"{clock:02d}:00:00"] * rng.choice([1, 1, 2, 3, 5])
+    game : pd.DataFrame = pd.DataFrame({
+        "Time": times,
+        "Event": [rng.choice(EVENTS[:-3] if rng.random() < .8 else EVENTS) for _ in times],
+        "Row": range(len(times))
+    })
+    pd.testing.assert_frame_equal(event_sorter(game.copy()), reference.event_sorter(game.copy()))
+
+
+def test_poss_former_matches_old_loop(monkeypatch, games):
+    for game, teams in _inputs(monkeypatch, games, "_poss_former"):
+        pd.testing.assert_frame_equal(poss_former(game.copy(), teams), reference.poss_former(game.copy(), teams))
+
+
+# The ranking scraper only keeps the possessions mode columns, they have to match a full scrape
+def test_possessions_mode_matches_full_scrape(games):
+    for game_id, pages in games.items():
+        full : pd.DataFrame = play_by_play.parse_game(game_id, pages)
+        possessions : pd.DataFrame = play_by_play.parse_game(game_id, pages, mode="possessions")
+        if full.empty:
+            assert possessions.empty
+            continue
+        pd.testing.assert_frame_equal(possessions, full[possessions.columns])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+import reference
+from rank_engine import Schedule, solve, normalize
+from synthetic_league import make_league, make_season
+
+# The old loop rounds every average to 4 places and stops after 10 sweeps, so it only
+# gets this close to the converged ratings
+TOLERANCE : float = 1e-3
+
+
+# The old loop's ratings lined up with the schedule's teams, on the scale solve pins
+def _old_ratings(games : pd.DataFrame, schedule : Schedule) -> pd.DataFrame:
+    old : pd.DataFrame = reference.rank_them(games).set_index("Team").loc[schedule.names]
+    adj_o : np.ndarray = old["ADJO"].to_numpy(dtype=np.float64, copy=True)
+    adj_d : np.ndarray = old["ADJD"].to_numpy(dtype=np.float64, copy=True)
+    played : np.ndarray = np.bincount(np.concatenate([schedule.home, schedule.away]),
+                                      minlength=len(schedule.team_ids)).astype(np.float64)
+    normalize(adj_o, adj_d, played)
+    return pd.DataFrame({"ADJO": adj_o, "ADJD": adj_d}, index=schedule.names)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_solve_matches_old_loop(seed):
+    league = make_league(40, seed=seed)
+    games : pd.DataFrame = make_season(league, games_per_team=12, seed=seed)
+    schedule : Schedule = Schedule.from_games(games)
+    ratings = solve(schedule)
+    old : pd.DataFrame = _old_ratings(games, schedule)
+    assert np.abs(ratings.adj_o - old["ADJO"].to_numpy()).max() < TOLERANCE
+    assert np.abs(ratings.adj_d - old["ADJD"].to_numpy()).max() < TOLERANCE
+
+
+def test_warm_start_lands_on_cold_solve():
+    league = make_league(40, seed=3)
+    games : pd.DataFrame = make_season(league, games_per_team=12, seed=3)
+    earlier = solve(Schedule.from_games(games.iloc[:len(games) // 2]))
+    schedule : Schedule = Schedule.from_games(games)
+    cold = solve(schedule)
+    warm = solve(schedule, start=earlier)
+    assert warm.iterations <= cold.iterations
+    assert np.abs(warm.adj_o - cold.adj_o).max() < 1e-5
+    assert np.abs(warm.adj_d - cold.adj_d).max() < 1e-5